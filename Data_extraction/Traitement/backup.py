@@ -5,6 +5,8 @@ from datetime import datetime
 import pandas as pd
 import re
 
+from data_extraction.Websites.storage import list_datasets, read_dataset
+
 # Répertoires possibles pour scraping_output/
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
 CANDIDATE_DIRS = [
@@ -29,28 +31,24 @@ def infer_source_from_filename(fname):
 
 def load_and_annotate():
     all_offers = []
-    json_files = sorted(f for f in os.listdir(SCRAPING_DIR) if f.lower().endswith(".json"))
-    if not json_files:
+    datasets = list_datasets(SCRAPING_DIR)
+    if not datasets:
         print(f"[WARN] Aucun JSON dans {SCRAPING_DIR}")
         return all_offers
 
-    for fname in json_files:
-        full = os.path.join(SCRAPING_DIR, fname)
+    for full in datasets:
+        fname = os.path.basename(full)
         via = infer_source_from_filename(fname)
         try:
-            with open(full, "r", encoding="utf-8") as f:
-                offers = json.load(f)
+            offers = list(read_dataset(full))
         except Exception as e:
             print(f"[ERROR] Impossible de charger {fname}: {e}")
             continue
 
-        if isinstance(offers, list):
-            for off in offers:
-                off["via"] = via
-            all_offers.extend(offers)
-            print(f"[OK] {len(offers)} offres depuis {fname} (via={via})")
-        else:
-            print(f"[WARN] Contenu non-list dans {fname}")
+        for off in offers:
+            off["via"] = via
+        all_offers.extend(offers)
+        print(f"[OK] {len(offers)} offres depuis {fname} (via={via})")
 
     print(f"[INFO] Total offres chargées : {len(all_offers)}")
     return all_offers
@@ -1,10 +1,14 @@
+import argparse
 import concurrent.futures
+import importlib
 import os
-import re
-import subprocess
 import sys
+import time
+from dataclasses import dataclass, field
 
 from data_extraction.Websites import setup_logger
+from data_extraction.Websites.crawler import SITE_MODULES
+from data_extraction.Websites.health import SelectorCircuitOpen
 
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
@@ -14,76 +18,115 @@ sys.path.insert(0, parent_dir)
 # Configuration du logging
 logger = setup_logger("main.log")
 
+# Sites parcourus en même temps, chacun peut démarrer son navigateur
+MAX_WORKERS = 4
 
-def execute_script(file_path):
+
+@dataclass
+class SiteResult:
+    """Résultat du parcours d'un site par run_scrapers
+
+    offers: nombre de nouvelles offres enregistrées, y compris avant une erreur
+
+    seconds: durée du parcours
+
+    error: message de l'exception qui a arrêté le parcours, None s'il s'est terminé
+
+    health_report: rapport des sélecteurs quand le disjoncteur a interrompu le site (voir health.SelectorHealth)
+    """
+
+    site: str
+    offers: int = 0
+    seconds: float = 0.0
+    error: str | None = None
+    health_report: dict | None = field(default=None, repr=False)
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+
+def run_site(site: str, **options) -> SiteResult:
+    """Importe le module du site et lance son main dans ce processus, ne lève jamais d'exception"""
+    start = time.perf_counter()
+    result = SiteResult(site)
     try:
-        python_exe = (
-            sys.executable
-        )  # Path to the Python executable in the virtual environment
-        result = subprocess.run(
-            [python_exe, file_path], check=True, capture_output=True, text=True
+        module = importlib.import_module(
+            f"data_extraction.Websites.{SITE_MODULES[site]}"
+        )
+        result.offers = len(module.main(**options) or [])
+    except SelectorCircuitOpen as e:
+        result.offers, result.error, result.health_report = (
+            len(e.offers),
+            str(e),
+            e.report,
         )
-        if result.stdout:
-            logger.info(f"Output from {file_path}:\n{result.stdout}")
-            # Check for "Nombre d'offres:" in the output
-            match = re.search(r"Nombre d'offres:\s*(\d+)", result.stdout)
-            if match:
-                offres_script = int(match.group(1))
-                logger.info(f"Offers extracted by {file_path}: {offres_script}")
-                return offres_script
-            else:
-                logger.warning(f"No offers found in the output of {file_path}.")
-        return 0
-    except subprocess.CalledProcessError as e:
-        logger.error(f"Error executing {file_path}: Code {e.returncode} - {e.stderr}")
-        return 0
     except Exception as e:
-        logger.exception(f"Unexpected error with {file_path}: {str(e)}")
-        return 0
+        logger.exception(f"Erreur lors du parcours de {site}: {e}")
+        result.error = f"{type(e).__name__}: {e}"
+    result.seconds = time.perf_counter() - start
+    return result
+
+
+def run_scrapers(sites=None, max_workers=MAX_WORKERS, **options) -> list:
+    """Parcourt les sites en parallèle dans ce processus, au plus max_workers à la fois.
+    Retourne un SiteResult par site, dans l'ordre de sites.
+
+    sites: clés des sites (voir SITE_MODULES), tous par défaut
+
+    options: arguments passés au main de chaque site (incremental, resume, keywords)
+    """
+    sites = list(sites or SITE_MODULES)
+    logger.info(f"Démarrage du processus d'extraction des données: {', '.join(sites)}")
+    results = {}
+    with concurrent.futures.ThreadPoolExecutor(
+        max_workers=max(1, min(max_workers, len(sites))), thread_name_prefix="site"
+    ) as executor:
+        futures = {executor.submit(run_site, site, **options): site for site in sites}
+        for future in concurrent.futures.as_completed(futures):
+            result = future.result()
+            results[result.site] = result
+            if result.ok:
+                logger.info(
+                    f"{result.site} terminé: {result.offers} offres en {result.seconds:.1f}s"
+                )
+            else:
+                logger.error(
+                    f"{result.site} interrompu après {result.seconds:.1f}s "
+                    f"({result.offers} offres): {result.error}"
+                )
+    total = sum(result.offers for result in results.values())
+    logger.info(f"Nombre total d'offres extraites: {total}")
+    return [results[site] for site in sites]
 
 
 def run_data_extraction_scripts():
-    total_offres = 0
-    logger.info("Démarrage du processus d'extraction des données.")
-    traitement_dir = os.path.dirname(__file__)
-    parent_dir = os.path.dirname(traitement_dir)
-
-    extraction_dir = os.path.join(parent_dir, "Websites")
-
-    if not os.path.exists(extraction_dir):
-        logger.error(f"Le dossier {extraction_dir} n'existe pas!")
-        return total_offres
-
-    py_files = [f for f in os.listdir(extraction_dir) if f.endswith(".py")]
-    logger.info(f"Scripts trouvés: {py_files}")
-
-    # Create a ThreadPoolExecutor to run scripts concurrently
-    with concurrent.futures.ProcessPoolExecutor(max_workers=5) as executor:
-        # Submit each script to the executor
-        futures = {
-            executor.submit(
-                execute_script, os.path.join(extraction_dir, py_file)
-            ): py_file
-            for py_file in py_files
-        }
-
-        for future in concurrent.futures.as_completed(futures):
-            py_file = futures[future]
-            try:
-                offres_script = future.result()
-                total_offres += offres_script
-                logger.info(f"Le script {py_file} est terminé")
-                logger.info(f"Total offers so far: {total_offres}")
-            except Exception as e:
-                logger.error(f"Error with {py_file}: {str(e)}")
-
-    logger.info("Fin du traitement de tous les scripts.")
-    logger.info(f"Nombre total d'offres extraites: {total_offres}")
-    return total_offres
+    """Parcourt tous les sites, retourne le nombre total d'offres extraites"""
+    return sum(result.offers for result in run_scrapers())
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Extraction des offres de tous les sites"
+    )
+    parser.add_argument("--sites", nargs="+", choices=sorted(SITE_MODULES))
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS)
+    parser.add_argument(
+        "--full", action="store_true", help="parcourt toutes les pages de résultats"
+    )
+    parser.add_argument(
+        "--resume", action="store_true", help="reprend les parcours interrompus"
+    )
+    args = parser.parse_args()
+
     print("Début de l'extraction des données...")
-    total = run_data_extraction_scripts()
-    print("\nTous les scripts d'extraction ont été traités!")
-    print(f"Nombre total d'offres extraites: {total}")
\ No newline at end of file
+    results = run_scrapers(
+        args.sites, args.workers, incremental=not args.full, resume=args.resume
+    )
+    for result in results:
+        status = "ok" if result.ok else f"erreur: {result.error}"
+        print(
+            f"{result.site:<15}{result.offers:>6} offres {result.seconds:>8.1f}s  {status}"
+        )
+    print(f"Nombre total d'offres extraites: {sum(r.offers for r in results)}")
+    sys.exit(0 if all(result.ok for result in results) else 1)
@@ -1,63 +1,73 @@
-import re
+import argparse
+from urllib.parse import quote_plus, urljoin
 
-from selenium import webdriver
-from selenium.common.exceptions import (
-    NoSuchElementException,
-    TimeoutException,
-    WebDriverException,
-)
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-
-from data_extraction.Websites import (
-    check_duplicate,
-    init_driver,
-    load_json,
-    save_json,
-    setup_logger,
-    validate_json,
-)
+from data_extraction.Websites import load_json, setup_logger
+from data_extraction.Websites.crawler import SiteAdapter, crawl, register
+from data_extraction.Websites.http_fetch import block_text, node_text, parse_html
+from data_extraction.Websites.sections import SectionParser
+from data_extraction.Websites.waits import WaitStats
 
 logger = setup_logger("maroc_ann.log")
+wait_stats = WaitStats("marocannonces")
+
+# Recherche d'un mot-clé (kw) et numéro de la page de résultats (pge)
+BASE_URL = "https://www.marocannonces.com/maroc/offres-emploi-b309.html?kw={}&pge={}"
 
 
-def extract_offers(driver: webdriver.Chrome):
-    """Extrait les offres sur la page actuelle du site."""
+def parse_listing(html, base_url=BASE_URL):
+    """Lit les offres d'une page de résultats, téléchargée en HTTP ou lue dans le navigateur (page_source).
+    Fonction pure, sans driver : elle est testée et mesurée sur les pages de benchmarks/fixtures"""
     offers = []
-    try:
-        holders = driver.find_elements(
-            By.CSS_SELECTOR, "li:not(.adslistingpos) div.holder"
-        )
-        logger.info(f"{len(holders)} offres trouvées.")
-    except (NoSuchElementException, TimeoutException) as e:
-        logger.warning(f"Erreur lors de l'extraction des offres : {e}")
-        return offers
-
-    for holder in holders:
-        try:
-            job_url = holder.find_element(By.XPATH, "./..").get_attribute("href")
-            job_title = holder.find_element(By.TAG_NAME, "h3").text.strip()
-            location = holder.find_element(By.CLASS_NAME, "location").text.strip()
-
-            offers.append(
-                {
-                    "titre": job_title,
-                    "region": location,
-                    "job_url": job_url,
-                }
-            )
-        except NoSuchElementException as e:
-            logger.exception(f"Élément manquant dans une offre : {e}")
+    for holder in parse_html(html).select("li:not(.adslistingpos) div.holder"):
+        href = holder.parent.get("href") if holder.parent is not None else None
+        title, location = holder.find("h3"), holder.select_one(".location")
+        if not href or title is None or location is None:
+            logger.warning(f"Élément manquant dans une offre : {node_text(holder)}")
             continue
+        offers.append(
+            {
+                "job_url": urljoin(base_url, href),
+                "titre": node_text(title),
+                "region": node_text(location),
+            }
+        )
+    logger.info(f"{len(offers)} offres trouvées.")
     return offers
 
 
+# Blocs et champs du texte d'une annonce
+SECTIONS = SectionParser(
+    headers={
+        "missions": ["Missions :", "Missions:"],
+        "profil": ["Profil requis :", "Profil requis:"],
+        "domaine": ["Domaine :", "Domaine:"],
+    },
+    fields={
+        "domaine": "Domaine",
+        "fonction": "Fonction",
+        "contrat": "Contrat",
+        "companie": "companie",
+        "salaire": "Salaire",
+        "niveau_etudes": "Niveau_etudes",
+        "ville": "Ville",
+    },
+    line_labels={"annonceur": "Annonceur :", "telephone": "Téléphone :"},
+)
+FIELDS = ["domaine", "fonction", "contrat", "companie", "salaire", "niveau_etudes", "ville"]
+
+
+def block_lines(section):
+    """Lignes d'un bloc sans sa ligne de titre"""
+    return section.split("\n")[1:]
+
+
 def parse_details_text(text):
     """Analyse et structure le texte de l'offre d'emploi."""
     details = {"via": "Maroc_annonces"}
     lines = [line.strip() for line in text.split("\n") if line.strip()]
     text_joined = "\n".join(lines)
+    sections = SECTIONS.sections(text_joined)
+    fields = SECTIONS.fields(text_joined)
 
     if len(lines) >= 2:
         details["titre"] = lines[0]
@@ -67,139 +77,142 @@ def parse_details_text(text):
         if line.startswith("Publiée le:"):
             details["publication_date"] = line.split("Publiée le:")[1].strip()
 
-    def extract_block(pattern):
-        match = re.search(pattern, text_joined, re.DOTALL)
-        return match.group(1).strip().split("\n") if match else []
-
-    description = re.search(r"Annonce N°:.*\n(.*?)\nMissions :", text_joined, re.DOTALL)
-    if description:
-        details["description"] = description.group(1).strip()
-
-    missions = extract_block(r"Missions\s*:\s*\n(.*?)\nProfil requis\s*:")
-    profil = extract_block(r"Profil requis\s*:\s*\n(.*?)(Domaine\s*:|$)")
+    # La description est la ligne qui précède les missions, après le numéro de l'annonce
+    intro = sections[SECTIONS.intro].split("\n")
+    if "missions" in sections and any("Annonce N°:" in line for line in intro[:-1]):
+        details["description"] = intro[-1]
 
+    # Les missions ne sont lues que si le profil requis les suit
+    missions = block_lines(sections["missions"]) if "profil" in sections else []
+    profil = block_lines(sections.get("profil", ""))
     details["extra"] = [
         item.strip("- ").strip() for item in missions + profil if item.strip()
     ]
 
-    fields = [
-        "Domaine",
-        "Fonction",
-        "Contrat",
-        "companie",
-        "Salaire",
-        "Niveau_etudes",
-        "Ville",
-    ]
-    for field in fields:
-        match = re.search(rf"{field}\s*:\s*(.+)", text_joined)
-        if match:
-            key = field.lower().replace(" ", "_")
-            details[key] = match.group(1).strip()
-
-    def get_next_line_value(label):
-        try:
-            idx = lines.index(label)
-            return lines[idx + 1] if idx + 1 < len(lines) else None
-        except ValueError:
-            return None
-
-    annonceur = get_next_line_value("Annonceur :")
-    telephone = get_next_line_value("Téléphone :")
-
-    if annonceur:
-        details["extra"].append(annonceur)
-    if telephone:
-        details["extra"].append(telephone)
+    details |= {field: fields[field] for field in FIELDS if field in fields}
+
+    for label in ("annonceur", "telephone"):
+        if fields.get(label):
+            details["extra"].append(fields[label])
 
     return details
 
 
-def extract_offer_details(driver, offer_url):
-    """Accède à une offre et en extrait les détails."""
-    try:
-        driver.set_page_load_timeout(60)
-        driver.get(offer_url)
+def parse_details_texts(texts):
+    """parse_details_text d'un lot de textes (rejeu des snapshots, benchmarks)"""
+    return [parse_details_text(text) for text in texts]
 
-        container = WebDriverWait(driver, 15).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div.used-cars"))
-        )
-        return parse_details_text(container.text.strip())
-    except TimeoutException:
-        logger.exception(f"Timeout pour l'URL {offer_url}")
-    except WebDriverException as we:
-        logger.exception(f"WebDriverException pour {offer_url}: {we}")
-    except Exception as e:
-        logger.exception(f"Erreur inattendue pour {offer_url}: {e}")
-    return {}
-
-
-def change_page(driver, base_url, page_num):
-    """Navigue vers la page indiquée."""
-    try:
-        driver.get(base_url.format(page_num))
-        WebDriverWait(driver, 5).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div.holder"))
-        )
-        logger.info(f"Page {page_num} chargée.")
+
+def parse_detail(html):
+    """Détails d'une offre à partir du html de sa page, None si la page n'a pas le bloc de l'annonce.
+    Fonction pure comme parse_listing, utilisée par le téléchargement HTTP et par le navigateur"""
+    container = parse_html(html).select_one("div.used-cars")
+    if container is None:
+        return None
+    return parse_details_text(block_text(container))
+
+
+@register
+class MarocAnnAdapter(SiteAdapter):
+    """MarocAnnonces : pages de résultats lues dans l'ordre jusqu'à une page vide, détails sur la page de chaque offre"""
+
+    site = "marocannonces"
+    dataset = "offres_marocannonces.json"
+    pagination = "until_empty"
+    has_details = True
+    listing_ready = "div.holder"
+    detail_ready = "div.used-cars"
+    ready_timeout = 15
+    wait_stats = wait_stats
+    logger = logger
+
+    def open(self, fetcher, cursor):
+        # Une annonce republiée change d'url mais garde sa date de publication
+        offers = load_json(self.dataset, self.output_directory)
+        self.old_dates = {offer.get("publication_date") for offer in offers}
+
+    def share(self, cursor):
+        # Les sous-tâches ne relisent pas le jeu de données
+        cursor["old_dates"] = sorted(date for date in self.old_dates if date)
+
+    def attach(self, cursor):
+        self.old_dates = set(cursor["old_dates"])
+
+    def listing_url(self, keyword, page):
+        return BASE_URL.format(quote_plus(keyword), page)
+
+    def accept(self, offer):
+        pub_date = offer.get("publication_date")
+        if pub_date and pub_date in self.old_dates:
+            logger.info(f"Offre déjà existante (date: {pub_date}), ignorée.")
+            return False
         return True
-    except Exception as e:
-        logger.exception(f"Erreur chargement page {page_num}: {e}")
-        return False
-
-
-def main(logger=setup_logger("maroc_ann.log")):
-    driver = init_driver()
-    old_data = load_json("offres_marocannonces.json")
-    all_offers, new_data = [], []
-
-    try:
-        base_url = "https://www.marocannonces.com/maroc/offres-emploi-b309.html?kw=data+&pge={}"
-        page = 1
-
-        while change_page(driver, base_url, page):
-            offers = extract_offers(driver)
-            if not offers:
-                logger.info("Fin de la pagination.")
-                break
-            all_offers.extend(offers)
-            page += 1
-
-        logger.info(f"{len(all_offers)} offres collectées (sans détails)")
-
-        for offer in all_offers:
-            url = offer.get("job_url")
-            if not url or check_duplicate(old_data, url):
-                continue
-
-            logger.info(f"Détails en cours pour : {url}")
-            offer.update(extract_offer_details(driver, url))
-
-            pub_date = offer.get("publication_date")
-            if pub_date and any(
-                pub_date == o.get("publication_date") for o in old_data
-            ):
-                logger.info(f"Offre déjà existante (date: {pub_date}), ignorée.")
-                continue
-
-            try:
-                validate_json(offer)
-                new_data.append(offer)
-            except Exception as e:
-                logger.exception(f"Offre invalide : {url} - {e}")
-
-    finally:
-        driver.quit()
-        logger.info(f"{len(new_data)} nouvelles offres collectées.")
-        save_json(new_data, "offres_marocannonces.json")
-        logger.info("Scraping terminé.")
-
-    return new_data
-
-
-<<<<<<< HEAD
-main()
-=======
+
+    parse_listing = staticmethod(parse_listing)
+    parse_detail = staticmethod(parse_detail)
+
+
+def main(
+    driver=None,
+    fetch_mode=None,
+    incremental=True,
+    known_streak=20,
+    detail_workers=4,
+    queue_size=50,
+    flush_every=20,
+    resume=False,
+    keywords=None,
+    lease_driver=None,
+):
+    """Parcourt les offres Data de MarocAnnonces.
+
+    Les pages de résultats alimentent une file bornée, les pages de détail sont lues en même temps
+    par `detail_workers` workers et les offres sont enregistrées au fil de l'eau.
+
+    driver: driver prêté par le pool du worker, il n'est pas fermé à la fin. Par défaut un driver est créé au besoin
+
+    lease_driver: fonction qui prête un driver du pool quand un worker du parcours a besoin du navigateur
+
+    fetch_mode: "http" ou "browser" pour les pages de résultats et de détail, par défaut celui de SITE_FETCH_MODES
+
+    incremental: arrête la pagination dès que les offres déjà collectées sont atteintes (voir EarlyStop),
+    False pour un parcours complet
+
+    known_streak: nombre d'offres connues consécutives qui arrête le parcours incrémental
+
+    detail_workers: nombre de pages de détail lues en parallèle, chaque worker a sa session et son driver
+
+    queue_size: nombre maximum d'offres en attente de leurs détails
+
+    flush_every: nombre d'offres par segment enregistré
+
+    resume: reprend le parcours interrompu, les offres déjà enregistrées ou rejetées ne sont pas relues
+
+    keywords: mots-clés recherchés, par défaut ceux de SITE_KEYWORDS. Une offre trouvée par
+    plusieurs mots-clés n'est lue qu'une fois
+    """
+    return crawl(
+        MarocAnnAdapter(),
+        driver=driver,
+        fetch_mode=fetch_mode,
+        incremental=incremental,
+        known_streak=known_streak,
+        detail_workers=detail_workers,
+        queue_size=queue_size,
+        flush_every=flush_every,
+        resume=resume,
+        keywords=keywords,
+        lease_driver=lease_driver,
+    )
+
+
 if __name__ == "__main__":
-    main()
->>>>>>> 06572de2b55ec9ee969bebf9f33ea25d80aa546d
+    parser = argparse.ArgumentParser(description="Extraction des offres de MarocAnnonces")
+    parser.add_argument(
+        "--resume", action="store_true", help="reprend le dernier parcours interrompu"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="parcourt toutes les pages de résultats"
+    )
+    args = parser.parse_args()
+    main(resume=args.resume, incremental=not args.full)
@@ -1,168 +1,119 @@
-import time
+import argparse
+from urllib.parse import urljoin
 
-from selenium.common.exceptions import NoSuchElementException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
 
-from data_extraction.Websites import (
-    check_duplicate,
-    init_driver,
-    load_json,
-    save_json,
-    setup_logger,
-    validate_json,
-)
+from data_extraction.Websites import setup_logger
+from data_extraction.Websites.crawler import SiteAdapter, crawl, register
+from data_extraction.Websites.http_fetch import node_text, parse_html
+from data_extraction.Websites.waits import WaitStats, wait_until
 
 logger = setup_logger("Rekrute.log")
+wait_stats = WaitStats("rekrute")
+
+BASE_URL = "https://www.rekrute.com"
+
+
+def parse_details(li_texts):
+    """Analyse les lignes <li> des détails complémentaires d'une offre"""
+    details = {
+        "secteur": "",
+        "niveau_experience": "",
+        "niveau_etudes": "",
+        "contrat": "",
+    }
+    for txt in li_texts:
+        if "Secteur d'activité" in txt:
+            details["secteur"] = txt.split(":", 1)[1].strip()
+        elif "Fonction" in txt:
+            details["secteur"] = txt.split(":", 1)[1].strip()
+        elif "Expérience requise" in txt:
+            details["niveau_experience"] = txt.split(":", 1)[1].strip()
+        elif "Niveau d'étude demandé" in txt:
+            details["niveau_etudes"] = txt.split(":", 1)[1].strip()
+        elif "Type de contrat proposé" in txt:
+            details["contrat"] = txt.split(":", 1)[1].strip()
+    return details
+
+
+def parse_listing(html, base_url=BASE_URL):
+    """Lit les cartes d'une page de résultats, téléchargée en HTTP ou lue dans le navigateur (page_source).
+    Fonction pure, sans driver : elle est testée et mesurée sur les pages de benchmarks/fixtures"""
+
+    def field_next_to(holder, icon):
+        field = holder.select_one(icon)
+        parent = field.find_parent("div") if field is not None else None
+        return node_text(parent.find("span")) if parent is not None else ""
+
+    cards = []
+    for holder in parse_html(html).select("div.holder")[1:]:
+        parent = holder.find_parent("div")
+        link = parent.select_one("a.titreJob") if parent is not None else None
+        infos = holder.select("div.info")
+        cards.append(
+            {
+                "job_url": urljoin(base_url, link.get("href", ""))
+                if link is not None
+                else "",
+                "titre": node_text(link),
+                "info_count": len(infos),
+                "competences": field_next_to(holder, "i.fa.fa-search"),
+                "companie": field_next_to(holder, "i.fa.fa-industry"),
+                "description": field_next_to(holder, "i.fa.fa-binoculars"),
+                "publication_date": node_text(holder.select_one("em.date span")),
+                "details": [node_text(li) for li in infos[-1].select("li")]
+                if infos
+                else [],
+            }
+        )
+    return cards
 
 
-# --- Fonction d'extraction des offres sur la page courante ---
-def extract_offers(driver):
-    try:
-        data = load_json("offres_emploi_rekrute.json")
-    except FileNotFoundError:
-        data = []
-    offers_list = []
-
-    holders = driver.find_elements(By.CSS_SELECTOR, "div.holder")
-
-    ("Offres trouvées sur cette page :", len(holders) - 1)
-
-    for holder in holders[1:]:  # Ignorer le premier conteneur qui est un filtre
-        try:
-            info_divs = holder.find_elements(By.CSS_SELECTOR, "div.info")
-        except NoSuchElementException:
-            info_divs = []
-
-        titre = ""
-        try:
-            parent_div = holder.find_element(By.XPATH, "./ancestor::div[1]")
-
-            titre = parent_div.find_element(By.CSS_SELECTOR, "a.titreJob")
-            job_url = titre.get_attribute("href")
-            if check_duplicate(data, job_url):
-                continue
-
-            titre = titre.text.strip()
-
-        # 1. Récupérer les prerequis du poste
-        except NoSuchElementException:
-            titre = ""
-
-        competences = ""
-        if len(info_divs) >= 1:
-            try:
-                field = holder.find_element(By.CSS_SELECTOR, "i.fa.fa-search")
-
-                parent_div = field.find_element(By.XPATH, "./ancestor::div[1]")
-
-                competences = parent_div.find_element(By.TAG_NAME, "span").text.strip()
-            except NoSuchElementException:
-                competences = ""
-        # 2. Récupérer la description de la societe
-        companie = ""
-        if len(info_divs) >= 2:
-            try:
-                field = holder.find_element(By.CSS_SELECTOR, "i.fa.fa-industry")
-
-                parent_div = field.find_element(By.XPATH, "./ancestor::div[1]")
-
-                companie = parent_div.find_element(By.TAG_NAME, "span").text.strip()
-
-            except NoSuchElementException:
-                companie = ""
-
-        # 3. Récupérer la description de la mission
-        description = ""
-        if len(info_divs) >= 2:
-            try:
-                field = holder.find_element(By.CSS_SELECTOR, "i.fa.fa-binoculars")
-
-                parent_div = field.find_element(By.XPATH, "./ancestor::div[1]")
-
-                description = parent_div.find_element(By.TAG_NAME, "span").text.strip()
-            except NoSuchElementException:
-                description = ""
-        # 4. Récupérer les dates de publication et le nombre de postes (<em class="date">)
-        pub_start = ""
-        try:
-            date_elem = holder.find_element(By.CSS_SELECTOR, "em.date")
-
-            spans = date_elem.find_elements(By.TAG_NAME, "span")
-            pub_start = spans[0].text.strip() if len(spans) > 0 else ""
-
-        except NoSuchElementException:
-            pass
-
-        # 5. Récupérer les détails complémentaires (dernière div.info contenant une liste <li>)
-        secteur = secteur = niveau_experience = niveau_etudes = contrat = ""
-        if len(info_divs) >= 3:
-            try:
-                details_div = info_divs[-1]
-                li_items = details_div.find_elements(By.TAG_NAME, "li")
-                for li in li_items:
-                    txt = li.text.strip()
-                    if "Secteur d'activité" in txt:
-                        secteur = txt.split(":", 1)[1].strip()
-                    elif "Fonction" in txt:
-                        secteur = txt.split(":", 1)[1].strip()
-                    elif "Expérience requise" in txt:
-                        niveau_experience = txt.split(":", 1)[1].strip()
-                    elif "Niveau d'étude demandé" in txt:
-                        niveau_etudes = txt.split(":", 1)[1].strip()
-                    elif "Type de contrat proposé" in txt:
-                        contrat = txt.split(":", 1)[1].strip()
-            except Exception:
-                pass
-
-        offer = {
-            "titre": titre,
-            "publication_date": pub_start,
-            "competences": competences,
-            "companie": companie,
-            "description": description,
-            "secteur": secteur,
-            "niveau_experience": niveau_experience,
-            "niveau_etudes": niveau_etudes,
-            "contrat": contrat,
-            "via": "Rekrute",
-            "job_url": job_url,
-        }
-        try:
-            validate_json(offer)
-            if not check_duplicate(data, offer["job_url"]):
-                offers_list.append(offer)
-
-        except Exception as e:
-            logger.exception(f"Erreur de validation JSON : {e}")
-
-            continue
-
-    return offers_list
-
-
-def access_rekrute(driver):
+def build_offer(card):
+    """Construit une offre à partir des champs d'une carte lus par parse_listing"""
+    info_count = card["info_count"]
+    offer = {
+        "titre": card["titre"],
+        "publication_date": card["publication_date"],
+        "competences": card["competences"] if info_count >= 1 else "",
+        "companie": card["companie"] if info_count >= 2 else "",
+        "description": card["description"] if info_count >= 2 else "",
+    }
+    offer |= parse_details(card["details"] if info_count >= 3 else [])
+    offer |= {"via": "Rekrute", "job_url": card["job_url"]}
+    return offer
+
+
+def access_rekrute(driver, keyword="data"):
     # Accéder à la page de base
     base_url = "https://www.rekrute.com/offres-emploi-maroc.html"
     driver.get(base_url)
 
-    # Attendre que la barre de recherche soit disponible, puis saisir "DATA"
-    search_input = WebDriverWait(driver, 15).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, "#keywordSearch"))
+    # Attendre que la barre de recherche soit disponible, puis saisir le mot-clé
+    search_input = wait_until(
+        driver,
+        EC.presence_of_element_located((By.CSS_SELECTOR, "#keywordSearch")),
+        15,
+        wait_stats,
+        "#keywordSearch",
     )
     search_input.clear()
-    search_input.send_keys("DATA" + Keys.RETURN)
+    search_input.send_keys(keyword + Keys.RETURN)
 
 
 def get_pages_url(driver):
     try:
         # Sélecteur adapté pour la nouvelle structure
-        pagination = WebDriverWait(driver, 10).until(
+        pagination = wait_until(
+            driver,
             EC.presence_of_element_located(
                 (By.CSS_SELECTOR, "div.slide-block div.pagination")
-            )
+            ),
+            10,
+            wait_stats,
+            "div.slide-block div.pagination",
         )
         amount_of_offers = pagination.find_element(
             By.CSS_SELECTOR, "ul.amount"
@@ -172,10 +123,14 @@ def get_pages_url(driver):
             "href"
         )
         driver.get(page_link)
-        pagination = WebDriverWait(driver, 10).until(
+        pagination = wait_until(
+            driver,
             EC.presence_of_element_located(
                 (By.CSS_SELECTOR, "div.slide-block div.pagination select")
-            )
+            ),
+            10,
+            wait_stats,
+            "div.slide-block div.pagination select",
         )
         page_options = pagination.find_elements(By.TAG_NAME, "option")
         total_pages = len(page_options)
@@ -190,54 +145,93 @@ def get_pages_url(driver):
     return page_urls
 
 
-def change_page(driver, page_url):
-    if page_url:
-        # Si l'URL est relative, on complète avec le domaine
-        if not page_url.startswith("http"):
-            page_url = "https://www.rekrute.com" + page_url
-            logger.info(f"accessing the page url: {page_url}")
-        logger.info(f"Navigation vers la page : {page_url}")
-        driver.get(page_url)
-        WebDriverWait(driver, 15).until(
-            EC.presence_of_element_located((By.CSS_SELECTOR, "div.holder"))
-        )
-
-
-def main(logger=setup_logger("Rekrute.log")):
+@register
+class RekruteAdapter(SiteAdapter):
+    """Rekrute : les cartes des pages de résultats contiennent les offres complètes"""
+
+    site = "rekrute"
+    dataset = "offres_emploi_rekrute.json"
+    listing_ready = "div.holder"
+    link_selector = "a.titreJob"
+    ready_timeout = 15
+    wait_stats = wait_stats
+    logger = logger
+
+    def list_pages(self, fetcher, cursor, keyword):
+        # La recherche passe par le formulaire du site, seules les pages de résultats sont téléchargées en HTTP
+        page_urls = cursor.setdefault("page_urls", {})
+        if page_urls.get(keyword) is None:
+            access_rekrute(fetcher.driver, keyword)
+            logger.info(f"Accès à la recherche {keyword!r} réussi.")
+            # Une recherche d'une seule page n'a pas de pagination, sa page est la page courante
+            page_urls[keyword] = get_pages_url(fetcher.driver) or [
+                fetcher.driver.current_url
+            ]
+        return page_urls[keyword]
+
+    def listing_url(self, keyword, page):
+        return urljoin(BASE_URL, page)
+
+    parse_listing = staticmethod(parse_listing)
+    build_offer = staticmethod(build_offer)
+
+
+def main(
+    driver=None,
+    fetch_mode=None,
+    workers=4,
+    incremental=True,
+    known_streak=20,
+    resume=False,
+    flush_every=5,
+    keywords=None,
+    lease_driver=None,
+):
     """Cette fonction permet de parcourir le site rekrute et d'en extraire les offres d'emploi.
     L'utilisation par defaut recherche des offres liées au domaine de la Data.
-    """
-    start_time = time.time()
 
-    logger.info("Début de l'extraction des offres d'emploi sur Rekrute")
-    try:
-        # --- Initialisation du driver Chrome ---
-        driver = init_driver()
-        data = []  # Liste qui contiendra toutes les offres
-        access_rekrute(driver)
-        logger.info("Accès à la page de recherche réussi.")
-        page_urls = get_pages_url(driver)
-        for page_number in range(1, len(page_urls) + 1):
-            change_page(driver, page_urls[page_number - 1])
-            data.extend(extract_offers(driver))
-            logger.info(
-                f"Page {page_number} traitée, total offres cumulées :{len(data)}"
-            )
-        # Boucle pour parcourir toutes les pages
-    except Exception as e:
-        logger.exception(f"Erreur lors de l'extraction :{e}")
-    finally:
-        if driver:
-            driver.quit()
-        save_json(data, filename="offres_emploi_rekrute.json")
-        logger.info(f"Nouvelles offres extraites : {len(data)}")
-        logger.info(f"Extraction terminée en {time.time() - start_time} secondes.")
-    return data
+    driver: driver prêté par le pool du worker, il n'est pas fermé à la fin. Par défaut un driver est créé au besoin
+
+    lease_driver: fonction qui prête un driver du pool quand un worker du parcours a besoin du navigateur
 
+    fetch_mode: "http" ou "browser" pour les pages de résultats, par défaut celui de SITE_FETCH_MODES
+
+    workers: nombre de pages de résultats chargées en parallèle, chaque worker a sa session et son driver
+
+    incremental: arrête la pagination dès que les offres déjà collectées sont atteintes (voir EarlyStop),
+    False pour un parcours complet
+
+    known_streak: nombre d'offres connues consécutives qui arrête le parcours incrémental
+
+    resume: reprend le parcours interrompu à partir de son checkpoint
+
+    flush_every: les offres sont enregistrées toutes les flush_every pages
+
+    keywords: mots-clés recherchés, par défaut ceux de SITE_KEYWORDS
+    """
+    return crawl(
+        RekruteAdapter(),
+        driver=driver,
+        fetch_mode=fetch_mode,
+        workers=workers,
+        incremental=incremental,
+        known_streak=known_streak,
+        resume=resume,
+        flush_every=flush_every,
+        keywords=keywords,
+        lease_driver=lease_driver,
+    )
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Extraction des offres de Rekrute")
+    parser.add_argument(
+        "--resume", action="store_true", help="reprend le dernier parcours interrompu"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="parcourt toutes les pages de résultats"
+    )
+    args = parser.parse_args()
 
     logger = setup_logger("Rekrute.log")
-    main()
-
+    main(resume=args.resume, incremental=not args.full)
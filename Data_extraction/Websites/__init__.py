@@ -1,12 +1,20 @@
+import functools
 import json
 import logging
 import os
+import shutil
 import sys
 import tempfile
 import undetected_chromedriver as uc
-from jsonschema import ValidationError, validate
+from jsonschema.exceptions import best_match
+from jsonschema.validators import validator_for
 from selenium.webdriver.chrome.options import Options
 
+from .browser_profile import PROFILE, configure_options
+from .proxies import assign_proxy, release_proxy
+from .storage import NdjsonSink, read_dataset
+from .url_index import UrlIndex, normalize_url
+
 
 current_path = os.path.abspath(__file__)
 current_dir = os.path.dirname(current_path)
@@ -41,48 +49,12 @@ def init_driver():
 
         # Ensure correct ChromeDriver version
         driver = uc.Chrome(version_main=136, options=chrome_options, use_subprocess=True)
-        driver.implicitly_wait(2)
+        driver.implicitly_wait(0)
         return driver
     except Exception as e:
         logger.error(f"Failed to initialize WebDriver: {str(e)}")
         return None
 
-# Validate JSON
-def validate_json(data, schema_path=os.path.join(current_dir, "Job_schema.json")):
-    try:
-        with open(schema_path) as f:
-            schema = json.load(f)
-        validate(data, schema)
-    except ValidationError as e:
-        logger.error(f"Validation error: {e.message}")
-        return e
-
-# Check for duplicates
-def check_duplicate(data, job_url):
-    for job in data:
-        if job.get("job_url") == job_url:
-            logger.warning(f"Duplicate found: {job_url}")
-            return True
-    return False
-
-# Save JSON data
-def save_json(data, filename="default.json", output_directory="scraping_output"):
-    output_path = os.path.join(os.path.dirname(current_dir), output_directory)
-    os.makedirs(output_path, exist_ok=True)
-
-    file_path = os.path.join(output_path, filename)
-    
-    existing_data = []
-    if os.path.exists(file_path):
-        with open(file_path, "r", encoding="utf-8") as js_file:
-            existing_data = json.load(js_file)
-
-    merged_data = existing_data + data
-    logger.info(f"Saving {len(merged_data)} jobs to {filename}, {len(data)} new jobs")
-    
-    with open(file_path, "w", encoding="utf-8") as js_file:
-        json.dump(merged_data, js_file, ensure_ascii=False, indent=4)
-
 # Main execution with proper cleanup
 if __name__ == "__main__":
     logger.info("Starting the WebDriver initialization.")
@@ -104,8 +76,10 @@ if __name__ == "__main__":
             driver.quit()
 
 
-def init_driver():
+def init_driver(proxy=None, profile=None):
     # Creation et configuration du Driver, pour pointer sur le driver changez le chemin executable_path
+    # proxy: "host:port" du proxy HTTP du navigateur, par défaut un proxy du pool si SCRAPER_PROXIES=1
+    # profile: "light" ou "full", par défaut SCRAPER_BROWSER_PROFILE (voir browser_profile)
     current_path = os.path.abspath(__file__)
     current_dir = os.path.dirname(current_path)
     executable_path = os.path.join(current_dir, "chromedriver-linux64/chromedriver")
@@ -118,8 +92,17 @@ def init_driver():
         "--disable-dev-shm-usage"
     )  # évite les erreurs liées à /dev/shm
     chrome_options.add_argument("--disable-gpu")
-    chrome_options.add_argument("--remote-debugging-port=9222")
+    # Pas de port de debug fixe: undetected_chromedriver en choisit un libre, ce qui
+    # permet de lancer plusieurs navigateurs en parallèle (pool de drivers des workers)
     # chrome_options.add_argument("--start-maximized")
+    # Un proxy pris dans le pool par init_driver y est rendu par quit_driver
+    pooled_proxy = None if proxy else assign_proxy()
+    proxy = proxy or pooled_proxy
+    if proxy:
+        chrome_options.add_argument(f"--proxy-server=http://{proxy}")
+    # Chargement "eager" et journal réseau, les ressources sont bloquées par site (apply_profile)
+    profile = profile or PROFILE
+    configure_options(chrome_options, profile)
 
     temp_dir = tempfile.mkdtemp(prefix="profile_")
     driver = uc.Chrome(
@@ -129,13 +112,29 @@ def init_driver():
         user_data_dir=temp_dir,
     )
 
-    driver.implicitly_wait(
-        2
-    )  # Time before the program exits in case of exception in seconds, will not wait if the program runs normally
+    # No implicit wait: a missing element fails immediately, page-ready points use
+    # explicit waits (waits.wait_until)
+    driver.implicitly_wait(0)
+    # Les sessions HTTP créées à partir du driver passent par le même proxy (voir session_from_driver)
+    driver.proxy = proxy
+    driver.pooled_proxy = pooled_proxy
+    driver.profile = profile
 
     return driver
 
 
+def quit_driver(driver):
+    """Closes the browser and removes its temporary profile directory (created by `init_driver`)"""
+    profile_dir = getattr(driver, "user_data_dir", None)
+    try:
+        driver.quit()
+    except Exception as e:
+        logging.warning(f"Error while closing the WebDriver: {e}")
+    if profile_dir and os.path.basename(profile_dir).startswith("profile_"):
+        shutil.rmtree(profile_dir, ignore_errors=True)
+    release_proxy(getattr(driver, "pooled_proxy", None))
+
+
 def highlight(
     element, effect_time=0.1, color="yellow", border="2px solid red", active=True
 ):
@@ -191,24 +190,48 @@ def highlight(
         )
 
 
-def load_json(filename="default.json", encoding="utf-8"):
-    current_path = os.path.abspath(__file__)
-    current_dir = os.path.dirname(current_path)  # Websites directory
-    parent_dir = os.path.dirname(current_dir)  # Data extraction directory
-    filename = os.path.join(parent_dir, "scraping_output", filename)
-    try:
-        data = json.load(open(filename, "r", encoding=encoding))
-    except FileNotFoundError:
-        logging.info("Json file not found creating new one")
-        data = []
-        with open(filename, "w", encoding="utf-8") as js_file:
-            json.dump(data, js_file, ensure_ascii=False, indent=4)
-    return data
+def output_path(output_directory="scraping_output"):
+    """Absolute path of an output directory, given relative to Data_extraction or absolute"""
+    return os.path.join(os.path.dirname(current_dir), output_directory)
+
+
+def load_json(filename="default.json", output_directory="scraping_output"):
+    """Loads all the offers saved under the filename, i.e the legacy json file followed by the ndjson segments appended by `save_json`
+
+    filename: name of the dataset file
+
+    output_directory: the directory where all json outputs are stored
+    """
+    output_path = os.path.join(os.path.dirname(current_dir), output_directory)
+    return list(read_dataset(os.path.join(output_path, filename)))
+
+
+def open_sink(
+    filename="default.json",
+    batch_size=100,
+    output_directory="scraping_output",
+    on_flush=None,
+):
+    """Opens an NdjsonSink on the dataset, for scrapers saving their offers while they run instead of at the end
+
+    filename: name of the dataset file
+
+    batch_size: number of offers per segment
+
+    output_directory: the directory where all json outputs are stored
+
+    on_flush: function called with the offers of each segment once it is saved
+    """
+    output_path = os.path.join(os.path.dirname(current_dir), output_directory)
+    return NdjsonSink(
+        os.path.join(output_path, filename), batch_size=batch_size, on_flush=on_flush
+    )
 
 
 def save_json(data: list, filename="default.json", output_directory="scraping_output"):
     """
-    Saves the json data to the specified file in the output directory. Note that if the same filename exists, the data will be apended instead of being overwritten
+    Saves the json data to the specified file in the output directory. The data is appended as a new ndjson segment
+    next to the file, old offers are never rewritten, use `load_json` to read the whole dataset back
 
     data: list of items to be saved as json
 
@@ -217,65 +240,74 @@ def save_json(data: list, filename="default.json", output_directory="scraping_ou
     output_directory: the directory where all json outputs are stored
 
     """
-    # --- Sauvegarde locale en JSON (pour vérification) --
+    with open_sink(filename, len(data) or 1, output_directory) as sink:
+        sink.write_many(data)
+    logging.info(f"Saving {len(data)} new jobs to {filename}")
 
-    # Get the absolute path of the current script
-    current_path = os.path.abspath(__file__)
-    current_dir = os.path.dirname(current_path)
-    parent_dir = os.path.dirname(current_dir)
 
-    # Constructing the output path
-    output_path = os.path.join(parent_dir, output_directory)
-    os.makedirs(output_path, exist_ok=True)
+SCHEMA_PATH = os.path.join(current_dir, "Job_schema.json")
 
-    # Change the current working directory
-    os.chdir(output_path)
 
-    existing_data = []
-    try:
-        if os.path.exists(output_path):
-            with open(filename, "r", encoding="utf-8") as js_file:
-                existing_data = json.load(js_file)
-    except FileNotFoundError:
-        logging.error("File not found, creating new one")
-        json.dump
-    with open(filename, "w", encoding="utf-8") as js_file:
-        merged_data = existing_data + data
-        logging.info(
-            f"Saving {len(merged_data)} jobs to {filename}, {len(data)} new jobs"
-        )
-        json.dump(merged_data, js_file, ensure_ascii=False, indent=4)
-
-
-def validate_json(
-    data,
-    schema_path=os.path.join(
-        os.path.dirname(os.path.abspath(__file__)), "Job_schema.json"
-    ),
-):
-    """Validates the json data according to the schema provided in arguments"""
+@functools.cache
+def get_validator(schema_path=SCHEMA_PATH):
+    """Returns the validator of the schema, the schema is read and compiled only once per process"""
     with open(schema_path) as f:
         schema = json.load(f)
-    try:
-        validate(data, schema)
-    except ValidationError as e:
-        logging.error(f"Validation error: {e.message}")
-        return e
+    validator_class = validator_for(schema)
+    validator_class.check_schema(schema)
+    return validator_class(schema)
+
+
+def validate_json(data, schema_path=SCHEMA_PATH):
+    """Validates the json data according to the schema provided in arguments. Returns the most relevant error, None if the data is valid"""
+    error = best_match(get_validator(schema_path).iter_errors(data))
+    if error is not None:
+        logging.error(f"Validation error: {error.message}")
+        return error
+
+
+def validate_many(records: list, schema_path=SCHEMA_PATH):
+    """Validates a batch of job offers in one pass. Returns one list of errors per record, empty when the record is valid
+
+    records: the job offers to be validated
+    """
+    validator = get_validator(schema_path)
+    return [list(validator.iter_errors(record)) for record in records]
 
 
 def check_duplicate(data, job_url):
     """A function to check if a job offer is already present in the old data. Returns true if there is a duplicate offer found
 
-    data: the old job offers data
+    data: the url index of the scraper (see `open_url_index`) or a list of old job offers
 
     job_url: the current job_url to be matched
     """
-    # Check if the job URL already exists in the data
-    for job in data[:][:]:
-        if job.get("job_url") == job_url:
-            logging.warning(f"Duplicate found: {job_url}")
-            return True
-    return False
+    if isinstance(data, UrlIndex):
+        duplicate = job_url in data
+    else:
+        key = normalize_url(job_url)
+        duplicate = any(normalize_url(job.get("job_url", "")) == key for job in data)
+    if duplicate:
+        logging.warning(f"Duplicate found: {job_url}")
+    return duplicate
+
+
+def open_url_index(source, filename, output_directory="scraping_output"):
+    """Opens the persistent url index of a scraper, to be loaded once per run.
+    The first time a source is used its index is built from the offers already saved in `filename`.
+
+    source: name of the website, e.g "rekrute"
+
+    filename: the json output of the scraper in the output directory
+
+    output_directory: the directory of the json outputs, the index is stored next to them
+    """
+    index = UrlIndex(
+        source, os.path.join(output_path(output_directory), "url_index.sqlite3")
+    )
+    if not len(index):
+        index.seed(load_json(filename, output_directory))
+    return index
 
 
 # Set up a logger
@@ -1,210 +1,255 @@
-import datetime
+import argparse
 import re
-import time
+from urllib.parse import urljoin
 
-from jsonschema import ValidationError
+import requests
 from selenium import webdriver
 from selenium.common.exceptions import (
     ElementClickInterceptedException,
     ElementNotInteractableException,
-    NoSuchElementException,
     TimeoutException,
 )
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-
-from data_extraction.Websites import (
-    check_duplicate,
-    init_driver,
-    load_json,
-    save_json,
-    setup_logger,
-    validate_json,
-)
-
 
-def extract_date_from_text(text: str):
-    try:
-        text = text.lower().strip()
-        # Chechking for string "yesterday"
-        if match := re.search(r"\s*yesterday", text):
-            days = 1
-        # Chechking for string "00 days ago"
-        elif match := re.search(r"(\d+)\s*\+\s*days\s*ago", text):
-            days = int(match.group(1))
-        # Chechking for string "00 days"
-        elif match := re.search(r"(\d+)\s*days", text):
-            days = int(match.group(1))
-        # Chechking for string "00 hours ago"
-        elif match := re.search(r"(\d+)\s*hours\s*ago", text):
-            days = int(match.group(1)) / 24
-        elif match := re.search(r"(\d+)\s*hour\s*ago", text):
-            days = int(match.group(1)) / 24
-        else:
-            days = None
-        if days is not None:
-            date_publication = datetime.datetime.now() - datetime.timedelta(days=days)
-            return date_publication.strftime("%d-%m-%Y")
-        else:
-            logger.warning(f"Time format not recognised: {text}")
-    except Exception as e:
-        logger.warning(f"Exception during time formatting {e}")
-
-
-def normalize_header(header, header_keywords):
-    header = header.lower().strip()
-    for norm, variations in header_keywords.items():
-        if any(header.startswith(v) for v in variations):
-            return norm
-    return header
+from data_extraction.Websites import setup_logger
+from data_extraction.Websites.crawler import SiteAdapter, crawl, register
+from data_extraction.Websites.dates import normalize_date
+from data_extraction.Websites.http_fetch import (
+    BLOCKED_STATUS,
+    block_text,
+    browser_state,
+    is_challenge,
+    node_text,
+    parse_html,
+    session_from_browser,
+)
+from data_extraction.Websites.proxies import report_proxy
+from data_extraction.Websites.ratelimit import SITE_DOMAINS, rate_limiter, retry_after
+from data_extraction.Websites.sections import SectionParser
+from data_extraction.Websites.snapshots import save_snapshot
+from data_extraction.Websites.waits import WaitStats, wait_until
+
+logger = setup_logger("bayt.log")
+wait_stats = WaitStats("bayt")
+# Format des dates de publication du jeu de données
+DATE_FORMAT = "%d-%m-%Y"
+
+
+def extract_date_from_text(text: str, reference=None):
+    """Convertit une date relative ("3 days ago") en date jj-mm-aaaa, comptée à partir de reference (par défaut maintenant)"""
+    return normalize_date(text, reference, fmt=DATE_FORMAT)
+
+
+# Sections de la description d'une offre, un titre en début de ligne ouvre sa section
+SECTIONS = SectionParser(
+    headers={
+        "description": ["job description", "description"],
+        "competences": ["competences", "skills", "required skills"],
+    },
+    flags=re.IGNORECASE,
+)
 
 
 def text_segmentation(job_offer_details):
-    # headers
-    header_keywords = {
-        "description": ["Job description", "job description", "description"],
-        "competences": ["Competences", "competences", "skills", "required skills"],
-    }
+    """Découpe la description d'une offre en intro, description et competences"""
+    return SECTIONS.sections(job_offer_details)
 
-    # Flatten all possible headers
-    all_keywords = [kw for group in header_keywords.values() for kw in group]
-    regex_pattern = r"\n(?=({}))".format("|".join(map(re.escape, all_keywords)))
 
-    # Split using regex
-    sections = re.split(regex_pattern, job_offer_details, flags=re.IGNORECASE)
+def text_segmentation_many(texts):
+    """text_segmentation d'un lot de descriptions (rejeu des snapshots, benchmarks)"""
+    return [SECTIONS.sections(text) for text in texts]
 
-    parsed_sections = {}
-    parsed_sections["intro"] = sections[0].strip()
 
-    # Parse remaining sections into normalized keys
-    for i in range(1, len(sections), 2):
-        header = sections[i]
-        content = sections[i + 1] if i + 1 < len(sections) else ""
-        key = normalize_header(header, header_keywords)
-        parsed_sections[key] = content.strip()
-    return parsed_sections
+SEARCH_PAGE = "https://www.bayt.com/en/morocco/"
 
 
-def access_bayt(driver: webdriver.Chrome):
+def access_bayt(driver: webdriver.Chrome, keyword="data"):
     # Accéder à la page de base
-    base_url = "https://www.bayt.com/en/morocco/"
+    base_url = SEARCH_PAGE
     driver.get(base_url)
-    # Attendre que la barre de recherche soit disponible, puis saisir "DATA"
-    search_input = WebDriverWait(driver, 5).until(
-        EC.presence_of_element_located((By.CSS_SELECTOR, "input#text_search"))
+    # Attendre que la barre de recherche soit disponible, puis saisir le mot-clé
+    search_input = wait_until(
+        driver,
+        EC.presence_of_element_located((By.CSS_SELECTOR, "input#text_search")),
+        5,
+        wait_stats,
+        "input#text_search",
     )
     search_input.clear()
     while driver.current_url == base_url:
-        search_input.send_keys("DATA" + Keys.RETURN)
-
+        search_input.send_keys(keyword + Keys.RETURN)
 
-def extract_job_info(driver: webdriver.Chrome):
-    try:
-        data = load_json("offres_emploi_bayt.json")
-    except FileNotFoundError:
-        data = []
-    job_urls = WebDriverWait(driver, 5).until(
-        EC.presence_of_all_elements_located(
-            (By.CSS_SELECTOR, "div.row.is-compact.is-m.no-wrap > h2 > a")
-        )
-    )
-    job_urls = [job_url.get_attribute("href") for job_url in job_urls]
-    offers = []
-    # results_inner_card > ul > li.has-pointer-d.is-active > div.row.is-compact.is-m.no-wrap > h2 > a
-    logger.info(f"Found {len(job_urls)} job offers.")
-    for i in range(len(job_urls)):
-        try:
-            job_url = job_urls[i]
-            if check_duplicate(data, job_url):
-                continue
-            driver.get(job_url)
-            try:
-                pop_up = WebDriverWait(driver, 5).until(
-                    EC.presence_of_element_located(
-                        (
-                            By.CSS_SELECTOR,
-                            "body > div.cky-consent-container.cky-box-bottom-left > div > button > img",
-                        )
-                    )
-                )
-                pop_up.click()
-                logger.info("Popup found and clicked.")
-            except (ElementClickInterceptedException, ElementNotInteractableException):
-                logger.info("No popup found — continuing without action.")
 
-            offer = extract_job_details(driver)
-            offer["job_url"] = job_url
+BASE_URL = "https://www.bayt.com"
+DOMAIN = SITE_DOMAINS["bayt"]
+LISTING_SELECTOR = "div.row.is-compact.is-m.no-wrap > h2 > a"
+POSTED_SELECTOR = 'span[id="jb-posted-date"]'
 
-            try:
-                validate_json(offer)
-                offers.append(offer)
-            except ValidationError as e:
-                logger.exception(f"Erreur lors de validation JSON : {e}")
-                continue
-
-        except (
-            ElementClickInterceptedException,
-            ElementNotInteractableException,
-            NoSuchElementException,
-        ):
-            logger.exception("An error occurred while extracting the job details")
-    return offers
 
+# Bandeau de cookies affiché à la première page d'offre d'une session
+CONSENT_SELECTOR = (
+    "body > div.cky-consent-container.cky-box-bottom-left > div > button > img"
+)
+# Sessions du navigateur où le bandeau a déjà été traité, avec leur nombre de remises à zéro
+# par le pool (DriverPool.reset efface les cookies, le bandeau revient)
+_consent_sessions = {}
 
-def extract_job_details(driver: webdriver.Chrome):
-    try:
-        titre = driver.find_element(By.CSS_SELECTOR, 'h1[id="job_title"]').text.strip()
 
-    except NoSuchElementException:
-        titre = ""
+def accept_consent(driver: webdriver.Chrome):
+    """Ferme le bandeau de cookies, une seule fois par session du navigateur"""
+    resets = getattr(driver, "resets", 0)
+    if _consent_sessions.get(driver.session_id) == resets:
+        return
     try:
-        publication_date = (
-            WebDriverWait(driver, 5)
-            .until(
-                EC.presence_of_element_located(
-                    (By.CSS_SELECTOR, 'span[id="jb-posted-date"]')
-                )
-            )
-            .text
+        pop_up = wait_until(
+            driver,
+            EC.presence_of_element_located((By.CSS_SELECTOR, CONSENT_SELECTOR)),
+            5,
+            wait_stats,
+            "consent pop-up",
         )
-        publication_date = extract_date_from_text(publication_date)
-    except NoSuchElementException:
-        publication_date = ""
-    try:
-        companie = driver.find_element(
-            By.CSS_SELECTOR, 'a[class="t-default t-bold"]>span'
-        ).text.strip()
+        pop_up.click()
+        logger.info("Popup found and clicked.")
+    except (
+        ElementClickInterceptedException,
+        ElementNotInteractableException,
+        TimeoutException,
+    ):
+        logger.info("No popup found — continuing without action.")
+    _consent_sessions[driver.session_id] = resets
+
+
+def parse_listing(html, base_url=BASE_URL):
+    """Liens des offres d'une page de résultats, les cartes de Bayt n'ont pas d'autre champ utile.
+    Fonction pure, sans driver : elle est testée et mesurée sur les pages de benchmarks/fixtures"""
+    return [
+        urljoin(base_url, link["href"])
+        for link in parse_html(html).select(LISTING_SELECTOR)
+        if link.get("href")
+    ]
+
+
+def parse_detail(html):
+    """Lit les champs d'une page d'offre, téléchargée en HTTP ou lue dans le navigateur (page_source)"""
+    soup = parse_html(html)
+    return {
+        "titre": node_text(soup.select_one('h1[id="job_title"]')),
+        "posted": node_text(soup.select_one(POSTED_SELECTOR)),
+        "companie": node_text(soup.select_one('a[class="t-default t-bold"]>span')),
+        "details": block_text(soup.select_one('div[class="t-break"]')),
+    }
 
-    except NoSuchElementException:
-        companie = ""
 
-    try:
-        job_details = driver.find_element(
-            By.CSS_SELECTOR, 'div[class="t-break"]'
-        ).text.strip()
-        job_details = text_segmentation(job_details)
+class DetailFetcher:
+    """Télécharge les pages d'offres en parallèle avec une session HTTP qui reprend les cookies du navigateur.
 
-    except NoSuchElementException:
-        job_details = ""
+    Les pages refusées (anti-bot, page incomplète) sont rendues à l'appelant qui les lit avec
+    le navigateur, et le téléchargement est abandonné pour le reste du parcours.
+
+    browser: état du navigateur déjà passé par Bayt (voir browser_state), ses cookies et son user agent sont copiés
+
+    workers: nombre de workers de détail qui partagent la session
+    """
+
+    def __init__(self, browser: dict, workers=4):
+        self.session = session_from_browser(browser, pool_size=workers)
+        self.proxy = browser["proxy"]
+        self.use_http = True
+
+    def fetch(self, job_url):
+        """Retourne les champs de la page d'offre, None si elle doit être lue avec le navigateur"""
+        if not self.use_http:
+            return None
+        with rate_limiter().slot(DOMAIN) as slot:
+            try:
+                response = self.session.get(job_url, timeout=20)
+            except requests.RequestException as e:
+                slot.failed()
+                report_proxy(self.proxy, False)
+                logger.warning(f"Download failed for {job_url}: {e}")
+                return None
+            refused = response.status_code in BLOCKED_STATUS or is_challenge(
+                response.text
+            )
+            if refused:
+                slot.throttled(retry_after(response))
+            report_proxy(self.proxy, not refused, response.elapsed.total_seconds())
+        if (
+            response.status_code in BLOCKED_STATUS
+            or 'id="job_title"' not in response.text
+        ):
+            if self.use_http:
+                logger.warning(
+                    f"Job page refused over HTTP ({response.status_code}), using the browser"
+                )
+            self.use_http = False
+            return None
+        save_snapshot("bayt", "detail", job_url, response.text)
+        return parse_detail(response.text)
+
+    def close(self):
+        self.session.close()
+
+
+def browse_job_page(fetcher, job_url):
+    """Ouvre la page d'offre dans le navigateur du fetcher et retourne son html"""
+    driver = fetcher.driver
+    with fetcher.timed("browser") as slot:
+        driver.get(job_url)
+        accept_consent(driver)
+        wait_for_posted_date(driver)
+        html = driver.page_source
+        if is_challenge(html):
+            slot.throttled()
+    save_snapshot("bayt", "detail", job_url, html)
+    return html
+
+
+def build_job_details(card, reference=None):
+    """Construit une offre à partir des champs d'une page d'offre lus par parse_detail
+
+    reference: date de lecture de la page, les dates relatives sont comptées à partir d'elle
+    """
     offer = {
-        "titre": titre,
-        "publication_date": publication_date,
-        "companie": companie,
+        "titre": card["titre"],
+        "publication_date": extract_date_from_text(card["posted"], reference)
+        if card["posted"]
+        else "",
+        "companie": card["companie"],
         "via": "Bayt",
     }
-    offer |= job_details
-
+    if card["details"]:
+        offer |= text_segmentation(card["details"])
     return offer
 
 
+def wait_for_posted_date(driver: webdriver.Chrome):
+    """Attend la date de publication, le dernier élément rendu de la page d'offre. Retourne son texte"""
+    try:
+        return wait_until(
+            driver,
+            EC.presence_of_element_located((By.CSS_SELECTOR, POSTED_SELECTOR)),
+            5,
+            wait_stats,
+            "span#jb-posted-date",
+        ).text
+    except TimeoutException:
+        logger.warning("Posted date not found on the job page.")
+        return ""
+
+
 def find_number_of_pages(driver: webdriver.Chrome):
     try:
-        num_of_pages = WebDriverWait(driver, 5).until(
+        num_of_pages = wait_until(
+            driver,
             EC.presence_of_element_located(
                 (By.CSS_SELECTOR, "ul.pagination li.pagination-last-d a")
-            )
+            ),
+            5,
+            wait_stats,
+            "ul.pagination li.pagination-last-d a",
         )
         num_of_pages = num_of_pages.get_attribute("href").split("page=")[1]
         logger.info(f"Number of pages found :  {num_of_pages}")
@@ -213,68 +258,142 @@ def find_number_of_pages(driver: webdriver.Chrome):
         logger.exception("Couldnt find number of pages.")
 
 
-def change_page(
-    driver: webdriver.Chrome, main_page: str, current_page: int, max_pages: int
+@register
+class BaytAdapter(SiteAdapter):
+    """Bayt.com : recherche saisie dans le navigateur, pages de résultats numérotées et détails
+    sur la page de chaque offre, téléchargée en HTTP avec les cookies du navigateur si possible
+
+    detail_workers: taille de la session HTTP des pages d'offres, 0 pour les ouvrir dans le navigateur
+    """
+
+    site = "bayt"
+    dataset = "offres_emploi_bayt.json"
+    has_details = True
+    listing_ready = LISTING_SELECTOR
+    detail_ready = POSTED_SELECTOR
+    ready_timeout = 5
+    wait_stats = wait_stats
+    logger = logger
+
+    def __init__(self, detail_workers=4):
+        self.detail_workers = detail_workers
+        self.details = None
+        self.browser = None
+
+    def open(self, fetcher, cursor):
+        driver = fetcher.driver
+        driver.get(SEARCH_PAGE)
+        # Le bandeau de cookies est traité avant de copier les cookies dans la session HTTP
+        accept_consent(driver)
+        self.browser = browser_state(driver)
+        if self.detail_workers:
+            self.details = DetailFetcher(self.browser, workers=self.detail_workers)
+        # Page de résultats de chaque recherche, la même d'un parcours à sa reprise
+        self.main_pages = cursor.setdefault("main_pages", {})
+
+    def share(self, cursor):
+        cursor["browser"] = self.browser
+
+    def attach(self, cursor):
+        # Les sous-tâches reprennent les cookies de la découverte, sans ouvrir le navigateur
+        self.main_pages = cursor["main_pages"]
+        if self.detail_workers and cursor.get("browser"):
+            self.details = DetailFetcher(cursor["browser"], workers=self.detail_workers)
+
+    def list_pages(self, fetcher, cursor, keyword):
+        max_pages = cursor.setdefault("max_pages", {})
+        if max_pages.get(keyword) is None:
+            access_bayt(fetcher.driver, keyword)
+            self.main_pages[keyword] = fetcher.driver.current_url
+            logger.info(f"accessed search page {self.main_pages[keyword]}")
+            max_pages[keyword] = find_number_of_pages(fetcher.driver) or 1
+        return list(range(1, max_pages[keyword] + 1))
+
+    def listing_url(self, keyword, page):
+        return f"{self.main_pages[keyword]}?page={page}"
+
+    def parse_listing(self, html):
+        job_urls = parse_listing(html)
+        logger.info(f"Found {len(job_urls)} job offers.")
+        return [{"job_url": job_url} for job_url in job_urls]
+
+    def parse_detail(self, html):
+        # Une page refusée ou incomplète n'a pas le titre de l'offre
+        if 'id="job_title"' not in html:
+            return None
+        return build_job_details(parse_detail(html))
+
+    def fetch_detail(self, fetcher, card):
+        job_url = card["job_url"]
+        if self.details is not None:
+            fields = self.details.fetch(job_url)
+            if fields is not None:
+                return build_job_details(fields)
+        # Une page anti-bot ou bloquée par le bandeau n'est pas une offre: None, la page sera relue
+        return self.parse_detail(browse_job_page(fetcher, job_url))
+
+    def close(self):
+        if self.details is not None:
+            self.details.close()
+
+
+def main(
+    driver=None,
+    workers=1,
+    detail_workers=4,
+    incremental=True,
+    known_streak=20,
+    resume=False,
+    flush_every=20,
+    keywords=None,
+    lease_driver=None,
 ):
-    try:
-        next_page = main_page + "?page=" + str(current_page)
-        logger.info(f"Next page: {next_page}")
-    except (IndexError, ValueError) as e:
-        logger.exception(e)
-        next_page = 1
-    if current_page <= max_pages:
-        try:
-            driver.get(next_page)
-            # WebDriverWait(driver, 5).until(EC.url_to_be(next_page))
-            return True
-        except TimeoutException:
-            logger.exception("No more pages to load.")
-            return False
-    else:
-        logger.info("No more pages to load.")
-        return False
-
-
-def main():
-    start_time = time.time()
-
-    logger.info("Début de l'extraction des offres d'emploi sur Bayt.com")
-    # Initialiser le driver
-    try:
-        driver = init_driver()
-        data = []
-        # Accéder à la page de base
-        access_bayt(driver)
-        main_page = driver.current_url
-        print(f"The main page url is {main_page}")
-        logger.info("accessed search page")
-        # trouver le nombre de pages
-        max_pages = find_number_of_pages(driver)
-        current_page = 1
-        while change_page(driver, main_page, current_page, max_pages):
-            # Accéder aux offres d'emploi
-            logger.info(f"Going to page with url: {driver.current_url}")
-            data.extend(extract_job_info(driver))
-            logger.info(
-                f"Page number {current_page} done, cumulated offers: {len(data)}"
-            )
-            current_page += 1
-        logger.info("All pages done.")
-    except Exception as e:
-        logger.exception(f"An error occurred during extraction:{e}")
-    finally:
-        if driver:
-            driver.quit()
-        save_json(data, filename="offres_emploi_bayt.json")
-        logger.info(f"Nouvelles offres extraites : {len(data)}")
-        logger.info(f"Extraction terminée en {time.time() - start_time} secondes.")
-    return data
-
-
-<<<<<<< HEAD
-main()
-=======
+    """Parcourt les offres Data de Bayt.com.
+
+    Les pages de résultats alimentent une file bornée, les pages d'offres sont lues en même temps
+    par `detail_workers` workers et les offres sont enregistrées au fil de l'eau.
+
+    driver: driver prêté par le pool du worker, il n'est pas fermé à la fin. Par défaut un nouveau driver est créé
+
+    lease_driver: fonction qui prête un driver du pool quand un worker du parcours a besoin du navigateur
+
+    workers: nombre de navigateurs parcourant les pages de résultats en parallèle, le premier est `driver`
+
+    detail_workers: nombre de pages d'offres lues en parallèle, 0 pour les ouvrir une à une dans le navigateur
+
+    incremental: arrête la pagination dès que les offres déjà collectées sont atteintes (voir EarlyStop),
+    False pour un parcours complet
+
+    known_streak: nombre d'offres connues consécutives qui arrête le parcours incrémental
+
+    resume: reprend le parcours interrompu, les offres déjà enregistrées ou rejetées ne sont pas relues
+
+    flush_every: nombre d'offres par segment enregistré
+
+    keywords: mots-clés recherchés, par défaut ceux de SITE_KEYWORDS. Une offre trouvée par
+    plusieurs mots-clés n'est lue qu'une fois
+    """
+    return crawl(
+        BaytAdapter(detail_workers=detail_workers),
+        driver=driver,
+        workers=workers,
+        detail_workers=detail_workers,
+        incremental=incremental,
+        known_streak=known_streak,
+        resume=resume,
+        flush_every=flush_every,
+        keywords=keywords,
+        lease_driver=lease_driver,
+    )
+
+
 if __name__ == "__main__":
-    logger = setup_logger("bayt.log")
-    main()
->>>>>>> 06572de2b55ec9ee969bebf9f33ea25d80aa546d
+    parser = argparse.ArgumentParser(description="Extraction des offres de Bayt.com")
+    parser.add_argument(
+        "--resume", action="store_true", help="reprend le dernier parcours interrompu"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="parcourt toutes les pages de résultats"
+    )
+    args = parser.parse_args()
+    main(resume=args.resume, incremental=not args.full)
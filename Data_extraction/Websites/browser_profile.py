@@ -0,0 +1,107 @@
+"""Lightweight profile of the scraping browser: what Chrome waits for and downloads for a page.
+
+The scrapers only read the html of the pages. With the "light" profile (default) Chrome
+hands a page over once its DOM is parsed (eager page load strategy) instead of after
+every image and script, and the images, media, fonts and ad or tracking domains of
+BLOCKED_URLS are blocked at the network level (Chrome DevTools protocol). A site keeps
+the patterns of SITE_ALLOWED_URLS it cannot do without. SCRAPER_BROWSER_PROFILE=full
+drives Chrome as before, to compare the two: the bytes and time of each browser page are
+reported by the PageFetcher of the crawl.
+"""
+
+import json
+import logging
+import os
+
+PROFILE = os.environ.get("SCRAPER_BROWSER_PROFILE", "light")
+
+# Seconds before a page that never finishes loading raises TimeoutException (light profile)
+PAGE_LOAD_TIMEOUT = 30
+
+# Url patterns of Network.setBlockedURLs, "*" matches any text
+BLOCKED_URLS = (
+    # images
+    "*.png",
+    "*.jpg",
+    "*.jpeg",
+    "*.gif",
+    "*.webp",
+    "*.avif",
+    "*.svg",
+    "*.ico",
+    # media
+    "*.mp4",
+    "*.webm",
+    "*.mp3",
+    "*.m3u8",
+    # fonts
+    "*.woff",
+    "*.woff2",
+    "*.ttf",
+    "*.otf",
+    "*.eot",
+    # advertising and tracking
+    "*doubleclick.net*",
+    "*googlesyndication.com*",
+    "*googleadservices.com*",
+    "*google-analytics.com*",
+    "*googletagmanager.com*",
+    "*adservice.google.*",
+    "*facebook.net*",
+    "*connect.facebook.com*",
+    "*hotjar.com*",
+    "*criteo.*",
+    "*taboola.com*",
+    "*outbrain.com*",
+    "*scorecardresearch.com*",
+    "*clarity.ms*",
+)
+
+# Patterns of BLOCKED_URLS a site needs
+SITE_ALLOWED_URLS = {
+    # The close button of the cookie banner, clicked by bayt.accept_consent, is an svg image
+    "bayt": ("*.svg",),
+}
+
+
+def configure_options(options, profile: str | None = None):
+    """Sets the Chrome options of the profile, before the driver is started"""
+    if (profile or PROFILE) == "light":
+        options.page_load_strategy = "eager"
+    # Network events of the pages, read back by page_traffic
+    options.set_capability("goog:loggingPrefs", {"performance": "ALL"})
+
+
+def blocked_urls(site: str) -> list:
+    allowed = set(SITE_ALLOWED_URLS.get(site, ()))
+    return [pattern for pattern in BLOCKED_URLS if pattern not in allowed]
+
+
+def apply_profile(driver, site: str):
+    """Blocks the resources the site does not need in the driver, once it is started.
+    The blocked urls follow the site: a pooled driver gets those of the site leasing it"""
+    if getattr(driver, "profile", None) != "light":
+        return
+    try:
+        driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+        driver.execute_cdp_cmd("Network.enable", {})
+        driver.execute_cdp_cmd("Network.setBlockedURLs", {"urls": blocked_urls(site)})
+    except Exception as e:
+        logging.warning(f"{site}: light browser profile not applied: {e}")
+
+
+def page_traffic(driver) -> tuple:
+    """Bytes received and requests blocked by the driver since the last call, from its
+    performance log. (0, 0) when the driver does not log its network events"""
+    try:
+        entries = driver.get_log("performance")
+    except Exception:
+        return 0, 0
+    received = blocked = 0
+    for entry in entries:
+        message = json.loads(entry["message"])["message"]
+        if message["method"] == "Network.loadingFinished":
+            received += message["params"].get("encodedDataLength", 0)
+        elif message["method"] == "Network.loadingFailed":
+            blocked += bool(message["params"].get("blockedReason"))
+    return int(received), blocked
@@ -0,0 +1,152 @@
+import datetime
+import json
+import logging
+import os
+import threading
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+CHECKPOINT_DIR = os.path.join(
+    os.path.dirname(current_dir), "scraping_output", "checkpoints"
+)
+
+
+class Checkpoint:
+    """Durable progress of the crawl of a site, to resume it after the worker is killed.
+
+    The offers of the finished pages are kept until every `flush_every` pages they are
+    written to the sink, then the url index is committed and the checkpoint saved, in that
+    order: a page is only recorded as done once its offers are on disk. The checkpoint file is
+    removed when the crawl completes, a checkpoint left on disk means the last run died.
+
+    site: name of the website, one checkpoint file per site
+
+    sink: NdjsonSink receiving the offers of the crawl, see `open_sink`. The checkpoint
+    becomes its on_flush hook, offers written directly to the sink are recorded the same way
+
+    url_index: the url index of the scraper, committed with the offers
+
+    flush_every: number of pages between two flushes
+
+    resume: continue from the checkpoint left by the previous run, if any
+
+    max_age_hours: an older checkpoint is ignored and the crawl starts over
+    """
+
+    def __init__(
+        self,
+        site: str,
+        sink,
+        url_index,
+        flush_every=5,
+        resume=False,
+        max_age_hours=24,
+        directory=CHECKPOINT_DIR,
+    ):
+        self.site = site
+        self.sink = sink
+        self.url_index = url_index
+        self.flush_every = flush_every
+        self.path = os.path.join(directory, f"{site}.json")
+        self.cursor = {}
+        self.pages_done = set()
+        self.details_done = set()
+        self.flushed = 0
+        self.started = datetime.datetime.now().isoformat(timespec="seconds")
+        self.completed = False
+        self._offers = []
+        self._pages = []
+        self._lock = threading.RLock()
+        sink.on_flush = self._offers_saved
+        os.makedirs(directory, exist_ok=True)
+        if resume:
+            self._load(max_age_hours)
+
+    def _load(self, max_age_hours):
+        try:
+            with open(self.path, encoding="utf-8") as f:
+                state = json.load(f)
+        except FileNotFoundError:
+            logging.info(f"{self.site}: no checkpoint to resume, starting from page 1")
+            return
+        except (OSError, ValueError) as e:
+            logging.warning(f"{self.site}: unreadable checkpoint ignored: {e}")
+            return
+        started = datetime.datetime.fromisoformat(state["started"])
+        if datetime.datetime.now() - started > datetime.timedelta(hours=max_age_hours):
+            logging.info(f"{self.site}: checkpoint from {started} too old, ignored")
+            return
+        self.started = state["started"]
+        self.cursor = state.get("cursor", {})
+        self.pages_done = set(state.get("pages_done", []))
+        self.details_done = set(state.get("details_done", []))
+        self.flushed = state.get("flushed", 0)
+        logging.info(
+            f"{self.site}: resuming the crawl of {self.started}, "
+            f"{len(self.pages_done)} pages and {self.flushed} offers already saved"
+        )
+
+    def is_page_done(self, page) -> bool:
+        return str(page) in self.pages_done
+
+    def is_detail_done(self, job_url: str) -> bool:
+        return job_url in self.details_done
+
+    def mark_detail(self, job_url: str):
+        """Records a detail page processed without an offer to save (rejected or already known)"""
+        with self._lock:
+            self.details_done.add(job_url)
+
+    def page_done(self, page, offers: list):
+        """Records a finished page and its offers, they are saved with the next flush"""
+        with self._lock:
+            self._offers.extend(offers)
+            self._pages.append(str(page))
+            if len(self._pages) >= self.flush_every:
+                self.flush()
+
+    def flush(self):
+        """Saves the offers of the finished pages, then the url index and the checkpoint"""
+        with self._lock:
+            offers, self._offers = self._offers, []
+            pages, self._pages = self._pages, []
+            self.sink.write_many(offers)
+            self.sink.flush()
+            self.pages_done.update(pages)
+            self.save()
+
+    def _offers_saved(self, offers):
+        # Called by the sink once a segment is on disk. Only the urls of the saved offers
+        # are committed, the offers still running keep theirs pending
+        with self._lock:
+            self.url_index.commit(offer["job_url"] for offer in offers)
+            self.flushed += len(offers)
+            self.save()
+
+    def save(self):
+        """Writes the checkpoint atomically: temporary file, fsync then rename"""
+        with self._lock:
+            if self.completed:
+                return
+            state = {
+                "site": self.site,
+                "started": self.started,
+                "updated": datetime.datetime.now().isoformat(timespec="seconds"),
+                "cursor": self.cursor,
+                "pages_done": sorted(self.pages_done),
+                "details_done": sorted(self.details_done),
+                "flushed": self.flushed,
+            }
+            tmp_path = self.path + ".tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(state, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+    def complete(self):
+        """Flushes the last offers and removes the checkpoint, the crawl does not need to be resumed"""
+        self.flush()
+        self.completed = True
+        if os.path.exists(self.path):
+            os.remove(self.path)
+        logging.info(f"{self.site}: crawl complete, {self.flushed} offers saved")
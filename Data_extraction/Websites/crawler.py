@@ -0,0 +1,545 @@
+"""Crawl engine shared by the job sites, each site only describes itself with a SiteAdapter.
+
+    python -m data_extraction.Websites.crawler --site rekrute [--full] [--resume] [--keyword data ...]
+
+The engine owns everything that is the same from one site to the other: the HTTP
+fetcher and its browser fallback, the workers, the retries, the url index and the
+incremental stop, the validation, the checkpoint and the dataset, and the reports.
+A new site is a module with a registered adapter, listed in SITE_MODULES.
+
+Each site is searched with several keywords (SITE_KEYWORDS) in the same crawl. Their
+result sets overlap: an offer is claimed by the first listing page showing it, so its
+detail page is fetched once whatever the number of keywords matching it.
+
+The selectors of the site are watched during the crawl (see health.SelectorHealth):
+once one keeps missing, the layout of the site has probably changed and the crawl is
+aborted with SelectorCircuitOpen instead of timing out on every remaining page.
+"""
+
+import argparse
+import importlib
+import logging
+import os
+import threading
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support import expected_conditions as EC
+
+from data_extraction.Websites import (
+    check_duplicate,
+    open_sink,
+    open_url_index,
+    output_path,
+    validate_json,
+)
+from data_extraction.Websites.checkpoint import Checkpoint
+from data_extraction.Websites.health import SelectorCircuitOpen, SelectorHealth
+from data_extraction.Websites.http_fetch import PageFetcher
+from data_extraction.Websites.incremental import EarlyStop
+from data_extraction.Websites.pagination import crawl_pages
+from data_extraction.Websites.pipeline import PipelineStats, run_pipeline
+from data_extraction.Websites.snapshots import save_snapshot
+from data_extraction.Websites.url_index import normalize_url
+from data_extraction.Websites.waits import wait_until
+
+# Module of each site, imported on demand: importing it registers its adapter
+SITE_MODULES = {
+    "rekrute": "Rekrute",
+    "emploi": "emploi",
+    "marocannonces": "MarocAnn",
+    "bayt": "bayt",
+}
+
+# Search keywords of each site, SCRAPER_KEYWORDS="data,bi" replaces them for every site
+SITE_KEYWORDS = {
+    "rekrute": ("data", "business intelligence", "machine learning"),
+    "emploi": ("data", "business intelligence", "machine learning"),
+    "marocannonces": ("data", "bi", "machine learning"),
+    "bayt": ("data", "business intelligence", "machine learning"),
+}
+DEFAULT_KEYWORDS = ("data",)
+
+RETRIES = 2  # new attempts of a page that raised, network and driver errors
+RETRY_BACKOFF = 2.0  # seconds before the first new attempt, doubled each time
+
+ADAPTERS = {}
+
+
+def register(adapter_class):
+    """Class decorator registering the adapter of a site under its `site` key"""
+    ADAPTERS[adapter_class.site] = adapter_class
+    return adapter_class
+
+
+def site_keywords(site: str) -> list:
+    """Search keywords of the site, from SCRAPER_KEYWORDS (comma separated) when it is set"""
+    override = os.environ.get("SCRAPER_KEYWORDS", "")
+    keywords = [keyword.strip() for keyword in override.split(",") if keyword.strip()]
+    return keywords or list(SITE_KEYWORDS.get(site, DEFAULT_KEYWORDS))
+
+
+def get_adapter(site: str):
+    """Adapter class of the site, its module is imported on first use"""
+    if site not in ADAPTERS:
+        importlib.import_module(f"data_extraction.Websites.{SITE_MODULES[site]}")
+    return ADAPTERS[site]
+
+
+class SiteAdapter:
+    """Description of a job site for the crawl engine, one subclass per site.
+
+    The listing pages are read with `parse_listing`, a pure function of the html giving
+    one card per offer with at least its job_url (and its publication_date when shown,
+    for the incremental stop). The listing methods get the keyword of the search, the
+    site builds its search url or fills its search form with it. A site whose cards hold the whole offer implements
+    `build_offer`, a site that needs the page of each offer sets has_details and
+    implements `parse_detail`. The fetch methods download the pages over HTTP and fall
+    back to the browser, a site with a different navigation overrides them.
+
+    site: key of the site in SITE_FETCH_MODES, SITE_DOMAINS and the url index
+
+    dataset: json file of the offers in output_directory
+
+    output_directory: directory of the dataset, the url index and the checkpoints,
+    relative to Data_extraction or absolute (the benchmarks crawl into a temporary one)
+
+    pagination: "listed" when `list_pages` gives every page of a search up front, the pages
+    of all the keywords are then shared between the workers, or "until_empty" for pages
+    first_page, first_page + 1... read in order until one has no card, one worker per keyword
+
+    listing_ready, detail_ready: css selector the browser waits for before reading a page,
+    also the names of the listing and detail pages in the selector health report
+
+    link_selector: css selector of the url of an offer in its card, for the health report
+
+    wait_stats: WaitStats of the site module, reported at the end of the crawl
+
+    logger: logger of the site module
+    """
+
+    site = None
+    dataset = None
+    output_directory = "scraping_output"
+    pagination = "listed"
+    first_page = 1
+    has_details = False
+    listing_ready = None
+    detail_ready = None
+    link_selector = None
+    ready_timeout = 10
+    wait_stats = None
+    logger = logging
+
+    def open(self, fetcher, cursor: dict):
+        """Prepares the crawl with the fetcher of the run (search form, cookies).
+        cursor: the checkpoint cursor, kept between a crawl and its resume"""
+
+    def share(self, cursor: dict):
+        """Adds to the cursor of a split crawl what its subtasks need from `open` (see attach), as plain json"""
+
+    def attach(self, cursor: dict):
+        """Prepares a subtask of a split crawl from the cursor of its discovery, in place of `open`:
+        the site is opened once per crawl, not once per subtask"""
+
+    def list_pages(self, fetcher, cursor: dict, keyword: str) -> list:
+        """Every listing page of the search of keyword, for the "listed" pagination"""
+        raise NotImplementedError
+
+    def listing_url(self, keyword: str, page) -> str:
+        raise NotImplementedError
+
+    def parse_listing(self, html) -> list:
+        raise NotImplementedError
+
+    def build_offer(self, card) -> dict:
+        """Offer of a listing card, for the sites without detail pages"""
+        return card
+
+    def parse_detail(self, html):
+        """Fields of an offer read on its page, None when the page is incomplete"""
+        raise NotImplementedError
+
+    def accept(self, offer) -> bool:
+        """False to drop an offer the url index does not know about (e.g. already saved under another url)"""
+        return True
+
+    def browse(self, fetcher, url, ready=None, kind="listing"):
+        """Html of the page loaded in the browser of the fetcher, None if it did not load"""
+        with fetcher.timed("browser"):
+            driver = fetcher.driver
+            try:
+                driver.get(url)
+                if ready:
+                    wait_until(
+                        driver,
+                        EC.presence_of_element_located((By.CSS_SELECTOR, ready)),
+                        self.ready_timeout,
+                        self.wait_stats,
+                        ready,
+                    )
+            except TimeoutException:
+                self.logger.warning(f"{self.site}: {url} did not load in time")
+                return None
+            html = driver.page_source
+        save_snapshot(self.site, kind, url, html)
+        return html
+
+    def fetch_listing(self, fetcher, keyword, page):
+        """Html of a listing page, over HTTP when the site allows it, None if it did not load"""
+        url = self.listing_url(keyword, page)
+        html = fetcher.fetch_html(url)
+        if html is None:
+            html = self.browse(fetcher, url, self.listing_ready)
+        return html
+
+    def fetch_detail(self, fetcher, card):
+        """Fields of the page of an offer, None when it could not be read"""
+        url = card["job_url"]
+        html = fetcher.fetch_html(url, kind="detail")
+        if html is not None:
+            details = self.parse_detail(html)
+            if details is not None:
+                return details
+            fetcher.fall_back(f"{url} is incomplete")
+        html = self.browse(fetcher, url, self.detail_ready, kind="detail")
+        return self.parse_detail(html) if html is not None else None
+
+    def close(self):
+        """Releases what `open` created"""
+
+
+def with_retries(function, *args, what="", retries=RETRIES, logger=logging):
+    """Result of function(*args), called again after an exception up to `retries` times"""
+    for attempt in range(retries + 1):
+        try:
+            return function(*args)
+        except Exception as e:
+            if attempt == retries:
+                raise
+            delay = RETRY_BACKOFF * 2**attempt
+            logger.warning(f"{what} failed ({e}), new attempt in {delay:.0f}s")
+            time.sleep(delay)
+
+
+def read_listing_page(adapter: SiteAdapter, fetcher, keyword, page):
+    """Cards of a listing page, None if it could not be read, retried after an exception"""
+    html = with_retries(
+        adapter.fetch_listing,
+        fetcher,
+        keyword,
+        page,
+        what=f"{adapter.site} {keyword!r} page {page}",
+        logger=adapter.logger,
+    )
+    return adapter.parse_listing(html) if html is not None else None
+
+
+def read_details(adapter: SiteAdapter, fetcher, card):
+    """Fields of the page of the offer of a card, None if it could not be read, retried after an exception"""
+    details = with_retries(
+        adapter.fetch_detail,
+        fetcher,
+        card,
+        what=f"{adapter.site} offer {card['job_url']}",
+        logger=adapter.logger,
+    )
+    if details is None:
+        adapter.logger.warning(f"{adapter.site}: details missing for {card['job_url']}")
+    return details
+
+
+def check_listing(adapter: SiteAdapter, health, keyword, page, cards):
+    """Records the cards of a listing page and their links in the selector health of the crawl"""
+    url = adapter.listing_url(keyword, page)
+    # The first page of a search always lists offers, the others unless past the last one
+    if adapter.pagination == "listed" or page == adapter.first_page:
+        health.record("cards", adapter.listing_ready or "listing", bool(cards), url)
+    for card in cards:
+        health.record(
+            "link", adapter.link_selector or "job_url", bool(card.get("job_url")), url
+        )
+
+
+def check_details(adapter: SiteAdapter, health, card, details):
+    """Records the detail page of the offer of a card in the selector health of the crawl"""
+    health.record(
+        "detail", adapter.detail_ready or "detail", details is not None, card["job_url"]
+    )
+
+
+def crawl(
+    adapter: SiteAdapter,
+    driver=None,
+    fetch_mode=None,
+    workers=4,
+    detail_workers=4,
+    incremental=True,
+    known_streak=20,
+    resume=False,
+    flush_every=5,
+    queue_size=50,
+    keywords=None,
+    lease_driver=None,
+):
+    """Collects the new offers of a site and appends them to its dataset. Returns the new offers.
+    Raises SelectorCircuitOpen when the selector breaker aborted the crawl, and the error
+    that stopped a failed crawl once what it finished is saved.
+
+    The listing pages of the keywords are shared between `workers` workers ("listed"
+    pagination) or each keyword is read in order by one of them. A site without
+    detail pages has the offers of its pages saved with the checkpoint every
+    `flush_every` pages. A site with detail pages has them read by `detail_workers`
+    workers while its listing goes on (see run_pipeline), the offers are saved
+    `flush_every` at a time.
+
+    driver: driver leased by the caller, it is not quit at the end. By default a driver is started when needed
+
+    lease_driver: function leasing a driver when a fetcher of the crawl needs the browser,
+    e.g. from the DriverPool of a Celery worker (see PageFetcher)
+
+    fetch_mode: "http" or "browser", by default the mode of the site in SITE_FETCH_MODES
+
+    incremental: stops the pagination of a keyword once the offers already collected are
+    reached (see EarlyStop), False for a full crawl
+
+    known_streak: number of consecutive known offers ending the pagination of a keyword
+
+    resume: continues the crawl left by a killed run from its checkpoint
+
+    queue_size: maximum number of offers waiting for their detail page
+
+    keywords: the searches of the crawl, by default those of the site (see site_keywords)
+    """
+    site, logger = adapter.site, adapter.logger
+    keywords = list(dict.fromkeys(keywords or site_keywords(site)))
+    start = time.perf_counter()
+    logger.info(f"{site}: crawl started, keywords {', '.join(keywords)}")
+    fetcher = PageFetcher(
+        site, mode=fetch_mode, driver=driver, lease_driver=lease_driver
+    )
+    url_index = open_url_index(site, adapter.dataset, adapter.output_directory)
+    # Normalized urls claimed by a keyword in this run, new for the incremental stop of the others
+    claimed = set()
+    claimed_lock = threading.Lock()
+    early_stops = {
+        keyword: EarlyStop(url_index, known_streak, enabled=incremental, fresh=claimed)
+        for keyword in keywords
+    }
+    listed = dict.fromkeys(keywords, 0)
+    fresh = dict.fromkeys(keywords, 0)
+    # Offers of a listing are saved by pages, offers read on their page as they come
+    sink = open_sink(
+        adapter.dataset,
+        batch_size=flush_every if adapter.has_details else 100,
+        output_directory=adapter.output_directory,
+    )
+    checkpoint = Checkpoint(
+        site,
+        sink,
+        url_index,
+        flush_every=flush_every,
+        resume=resume,
+        directory=os.path.join(output_path(adapter.output_directory), "checkpoints"),
+    )
+    stats = PipelineStats(site, queue_size)
+    health = SelectorHealth(site)
+    if adapter.wait_stats is not None:
+        adapter.wait_stats.reset()
+        adapter.wait_stats.health = health
+    detail_fetchers = []
+    offers = []
+    failure = None
+
+    def claim(keyword, cards):
+        """Cards of the offers neither collected yet nor claimed by another page or keyword"""
+        with claimed_lock:
+            new = []
+            for card in cards:
+                url = card.get("job_url")
+                if (
+                    url
+                    and normalize_url(url) not in claimed
+                    and not check_duplicate(url_index, url)
+                    and not checkpoint.is_detail_done(url)
+                ):
+                    claimed.add(normalize_url(url))
+                    new.append(card)
+            listed[keyword] += len(cards)
+            fresh[keyword] += len(new)
+        return new
+
+    def read_listing(worker, keyword, page):
+        """Cards of a listing page and those it claimed, None if the page could not be read"""
+        cards = read_listing_page(adapter, worker, keyword, page)
+        if cards is None:
+            return None
+        check_listing(adapter, health, keyword, page, cards)
+        early_stops[keyword].observe(cards)
+        return cards, claim(keyword, cards)
+
+    def crawl_listings(on_page):
+        """Reads the listing pages of every keyword. on_page(keyword, page, cards) gets the
+        cards claimed by a page and returns its offers, returns the offers of all the pages"""
+
+        def read_page(worker, search):
+            keyword, page = search
+            if early_stops[keyword].stopped or health.tripped:
+                return []
+            listing = read_listing(worker, keyword, page)
+            return on_page(keyword, page, listing[1] if listing else [])
+
+        def paginate(worker, keyword):
+            found, page = [], adapter.first_page
+            while not early_stops[keyword].stopped and not health.tripped:
+                listing = read_listing(worker, keyword, page)
+                if listing is None:
+                    break
+                cards, new = listing
+                if not cards:
+                    logger.info(
+                        f"{site}: {keyword!r} page {page} is empty, end of the pagination"
+                    )
+                    break
+                logger.info(f"{site}: {keyword!r} page {page}, {len(new)} new offers")
+                found += on_page(keyword, page, new)
+                page += 1
+            return found
+
+        if adapter.pagination == "listed":
+            # The searches are opened one after the other, their pages are read together
+            searches = []
+            for keyword in keywords:
+                if health.tripped:
+                    break
+                searches += [
+                    (keyword, page)
+                    for page in adapter.list_pages(fetcher, checkpoint.cursor, keyword)
+                    if not checkpoint.is_page_done((keyword, page))
+                ]
+            read, stop = (
+                read_page,
+                lambda: health.tripped or all(s.stopped for s in early_stops.values()),
+            )
+        else:
+            searches, read, stop = keywords, paginate, lambda: health.tripped
+
+        return crawl_pages(
+            fetcher.domain,
+            searches,
+            read,
+            workers=workers,
+            shared=fetcher,
+            open_worker=fetcher.spawn,
+            close_worker=lambda worker: worker.close(),
+            stop=stop,
+        )
+
+    def keep(offer):
+        """The offer if it is new, added to the url index"""
+        if not adapter.accept(offer):
+            checkpoint.mark_detail(offer["job_url"])
+            return None
+        # Schema errors are logged, the offers are kept as they always were
+        validate_json(offer)
+        # An offer listed on two pages is only kept by the first worker reading it
+        return offer if url_index.add(offer["job_url"]) else None
+
+    def save_page(keyword, page, cards):
+        kept = [offer for offer in map(keep, map(adapter.build_offer, cards)) if offer]
+        checkpoint.page_done((keyword, page), kept)
+        return kept
+
+    def produce(put):
+        def queue_cards(keyword, page, cards):
+            for card in cards:
+                put(card)
+            return []
+
+        crawl_listings(queue_cards)
+
+    def consume(worker, card):
+        if health.tripped:
+            # The queued offers are dropped, not in the url index they are read by the next crawl
+            return None
+        details = read_details(adapter, worker, card)
+        check_details(adapter, health, card, details)
+        if details is None:
+            # Neither saved nor indexed: the offer is read again by the next crawl
+            return None
+        return keep({**card, **details})
+
+    try:
+        adapter.open(fetcher, checkpoint.cursor)
+        if adapter.has_details:
+            detail_fetchers = [fetcher.spawn() for _ in range(max(1, detail_workers))]
+            offers = run_pipeline(
+                site,
+                produce,
+                consume,
+                detail_fetchers,
+                sink=sink,
+                queue_size=queue_size,
+                stats=stats,
+            )
+        else:
+            offers = crawl_listings(save_page)
+        if not health.tripped:
+            checkpoint.complete()
+    except Exception as e:
+        logger.exception(f"{site}: crawl failed: {e}")
+        failure = e
+    finally:
+        for worker in detail_fetchers:
+            worker.close()
+        adapter.close()
+        fetcher.close()
+        # Saves what is finished, the checkpoint stays for --resume if the crawl failed
+        checkpoint.flush()
+        for early_stop in early_stops.values():
+            early_stop.save()
+        url_index.close()
+        if adapter.wait_stats is not None:
+            adapter.wait_stats.health = None
+            adapter.wait_stats.log_report(logger)
+        health.log_report(logger)
+        fetcher.log_report(logger)
+        if adapter.has_details:
+            stats.log_report(logger)
+        for keyword in keywords:
+            logger.info(
+                f"{site}: {keyword!r} listed {listed[keyword]} offers, "
+                f"{fresh[keyword]} new to this crawl"
+            )
+        logger.info(
+            f"{site}: {len(offers)} new offers in {time.perf_counter() - start:.1f}s"
+        )
+    if health.tripped:
+        raise SelectorCircuitOpen(health.report(), offers) from failure
+    if failure is not None:
+        raise failure
+    return offers
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Collect the new offers of a site")
+    parser.add_argument("--site", choices=sorted(SITE_MODULES), required=True)
+    parser.add_argument(
+        "--resume", action="store_true", help="continue the last interrupted crawl"
+    )
+    parser.add_argument("--full", action="store_true", help="read every listing page")
+    parser.add_argument(
+        "--keyword",
+        action="append",
+        dest="keywords",
+        help="search keyword, repeat it for several (default: SITE_KEYWORDS)",
+    )
+    args = parser.parse_args()
+    crawl(
+        get_adapter(args.site)(),
+        resume=args.resume,
+        incremental=not args.full,
+        keywords=args.keywords,
+    )
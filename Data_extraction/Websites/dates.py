@@ -0,0 +1,241 @@
+"""Publication dates of the offers, normalized the same way by the scrapers and the processing scripts.
+
+The sites show absolute dates ("13-05-2025", "2025-05-09", "12 May-16:35") or
+relative ones ("3 days ago", "il y a 2 semaines", "yesterday"). Relative dates and
+dates without a year are resolved against the collect date of the offer, the time
+the page was read (see NdjsonSink.write), so processing an old dataset gives the same
+dates as processing it on the day it was scraped.
+"""
+
+import datetime
+import logging
+import re
+import unicodedata
+from functools import lru_cache
+
+ISO_FORMAT = "%Y-%m-%d"
+
+MONTHS = {
+    "janvier": 1,
+    "fevrier": 2,
+    "mars": 3,
+    "avril": 4,
+    "mai": 5,
+    "juin": 6,
+    "juillet": 7,
+    "aout": 8,
+    "septembre": 9,
+    "octobre": 10,
+    "novembre": 11,
+    "decembre": 12,
+    "january": 1,
+    "february": 2,
+    "march": 3,
+    "april": 4,
+    "may": 5,
+    "june": 6,
+    "july": 7,
+    "august": 8,
+    "september": 9,
+    "october": 10,
+    "november": 11,
+    "december": 12,
+}
+MONTHS.update({name[:3]: number for name, number in MONTHS.items()})
+MONTHS["sept"] = 9
+
+# Length of the units of the relative dates, a month counts 30 days
+UNITS = {
+    "minute": datetime.timedelta(minutes=1),
+    "min": datetime.timedelta(minutes=1),
+    "hour": datetime.timedelta(hours=1),
+    "heure": datetime.timedelta(hours=1),
+    "day": datetime.timedelta(days=1),
+    "jour": datetime.timedelta(days=1),
+    "week": datetime.timedelta(weeks=1),
+    "semaine": datetime.timedelta(weeks=1),
+    "month": datetime.timedelta(days=30),
+    "mois": datetime.timedelta(days=30),
+    "year": datetime.timedelta(days=365),
+    "an": datetime.timedelta(days=365),
+}
+
+TODAY = re.compile(r"\b(?:today|aujourd|just now|a l'instant)")
+YESTERDAY = re.compile(r"\b(?:yesterday|hier)\b")
+# "3 days ago", "30+ days ago", "il y a 2 semaines", "5 hours"
+RELATIVE = re.compile(r"(\d+)\s*\+?\s*({})s?\b".format("|".join(UNITS)))
+YEAR_FIRST = re.compile(r"\b(\d{4})[-/.](\d{1,2})[-/.](\d{1,2})\b")
+DAY_FIRST = re.compile(r"\b(\d{1,2})[-/.](\d{1,2})[-/.](\d{4})\b")
+# "12 may-16:35", "5 mai 2025", "13 mai, 2025"
+DAY_MONTH = re.compile(r"\b(\d{1,2})\s+([a-z]+)\.?,?(?:\s+(\d{4})\b)?")
+# "may 13, 2025", "may 13"
+MONTH_DAY = re.compile(r"\b([a-z]+)\.?\s+(\d{1,2})\b,?(?:\s*(\d{4})\b)?")
+
+
+def _key(text: str) -> str:
+    """Lowercased text without accents, the form the patterns are written for"""
+    text = unicodedata.normalize("NFKD", text.strip().lower())
+    return text.encode("ascii", "ignore").decode()
+
+
+def _calendar(year, month, day):
+    try:
+        return datetime.date(year, month, day)
+    except ValueError:
+        return None
+
+
+@lru_cache(maxsize=8192)
+def parse_date_text(text: str):
+    """Parsed form of a date as shown by a site, independent of the collect date:
+    ("date", date), ("ago", timedelta) or ("day_month", (month, day)) when the year is
+    not shown. None when the text is not a date.
+
+    Cached: a dataset repeats the same few hundred strings, each is parsed once per process.
+    """
+    key = _key(text)
+    if not key:
+        return None
+    if TODAY.search(key):
+        return "ago", datetime.timedelta(0)
+    if YESTERDAY.search(key):
+        return "ago", datetime.timedelta(days=1)
+    if match := RELATIVE.search(key):
+        return "ago", int(match.group(1)) * UNITS[match.group(2)]
+    if match := YEAR_FIRST.search(key):
+        year, month, day = map(int, match.groups())
+        date = _calendar(year, month, day)
+        return ("date", date) if date else None
+    if match := DAY_FIRST.search(key):
+        day, month, year = map(int, match.groups())
+        date = _calendar(year, month, day)
+        return ("date", date) if date else None
+    for pattern, day_group, month_group in ((DAY_MONTH, 1, 2), (MONTH_DAY, 2, 1)):
+        for match in pattern.finditer(key):
+            month = MONTHS.get(match.group(month_group))
+            if month is None:
+                continue
+            day = int(match.group(day_group))
+            if match.group(3):
+                date = _calendar(int(match.group(3)), month, day)
+                return ("date", date) if date else None
+            if _calendar(2000, month, day):  # leap year, accepts the 29th of February
+                return "day_month", (month, day)
+            return None
+    return None
+
+
+def as_datetime(collect_date) -> datetime.datetime:
+    """Collect date as a datetime: datetime, date, ISO string, or now when missing or invalid"""
+    if isinstance(collect_date, datetime.datetime):
+        return collect_date
+    if isinstance(collect_date, datetime.date):
+        return datetime.datetime.combine(collect_date, datetime.time())
+    if isinstance(collect_date, str) and collect_date:
+        try:
+            return datetime.datetime.fromisoformat(collect_date)
+        except ValueError:
+            pass
+    return datetime.datetime.now()
+
+
+def resolve(parsed, collect_date=None):
+    """Calendar date of a result of parse_date_text, relative to the collect date"""
+    if parsed is None:
+        return None
+    kind, value = parsed
+    if kind == "date":
+        return value
+    reference = as_datetime(collect_date)
+    if kind == "ago":
+        return (reference - value).date()
+    # Without a year the date is the last occurrence of that day up to the collect date
+    month, day = value
+    date = _calendar(reference.year, month, day)
+    if date is None or date > reference.date():
+        date = _calendar(reference.year - 1, month, day)
+    return date
+
+
+def normalize_date(text, collect_date=None, fmt=ISO_FORMAT):
+    """Date shown by a site formatted with fmt (YYYY-MM-DD by default), None if it is not a date
+
+    collect_date: time the page was read (datetime, date or ISO string), now by default
+    """
+    if not isinstance(text, str):
+        return None
+    date = resolve(parse_date_text(text), collect_date)
+    if date is None:
+        _warn_unrecognised(text)
+        return None
+    return date.strftime(fmt)
+
+
+@lru_cache(maxsize=1024)
+def _warn_unrecognised(text):
+    """Logs a text that is not a date, once per distinct text"""
+    if text.strip():
+        logging.warning(f"Date format not recognised: {text!r}")
+
+
+def normalize_dates(texts, collect_dates=None, fmt=ISO_FORMAT):
+    """normalize_date over whole pandas columns, returns a Series of strings (None when not a date)
+
+    Each distinct text is parsed once, then the relative dates and the dates without a
+    year are resolved against their collect dates with vectorized pandas operations.
+
+    texts: Series (or list) of the dates shown by the sites
+
+    collect_dates: Series aligned on texts, a single collect date, or None for now
+    """
+    import pandas as pd  # only the processing scripts work on data frames
+
+    texts = pd.Series(texts, dtype=object)
+    texts = texts.where(texts.map(lambda text: isinstance(text, str)), None)
+    codes, uniques = pd.factorize(texts, use_na_sentinel=True)
+    parsed = [parse_date_text(text) for text in uniques]
+    for text, result in zip(uniques, parsed):
+        if result is None:
+            _warn_unrecognised(text)
+    # Parsed form of each distinct text, then of each row (code -1 for the missing texts)
+    kinds = pd.Series([p[0] if p else None for p in parsed] + [None], dtype=object)
+    absolute = pd.to_datetime(
+        pd.Series([p[1] if p and p[0] == "date" else None for p in parsed] + [None])
+    )
+    offsets = pd.to_timedelta(
+        pd.Series([p[1] if p and p[0] == "ago" else None for p in parsed] + [None])
+    )
+    month_day = [p[1] if p and p[0] == "day_month" else (1, 1) for p in parsed]
+    months = pd.Series([m for m, _ in month_day] + [1])
+    days = pd.Series([d for _, d in month_day] + [1])
+
+    def per_row(values):
+        return values.take(codes).set_axis(texts.index)
+
+    kind = per_row(kinds)
+
+    if isinstance(collect_dates, pd.Series):
+        reference = pd.to_datetime(collect_dates, errors="coerce", format="ISO8601")
+        reference = reference.fillna(pd.Timestamp.now())
+    else:
+        reference = pd.Series(
+            pd.Timestamp(as_datetime(collect_dates)), index=texts.index
+        )
+
+    relative = reference - per_row(offsets)
+
+    def in_year(years):
+        calendar = {"year": years, "month": per_row(months), "day": per_row(days)}
+        return pd.to_datetime(pd.DataFrame(calendar), errors="coerce")
+
+    # Without a year the date is the last occurrence of that day up to the collect date
+    this_year = in_year(reference.dt.year)
+    day_month = this_year.where(
+        this_year <= reference.dt.normalize(), in_year(reference.dt.year - 1)
+    )
+
+    dates = per_row(absolute).where(
+        kind == "date", relative.where(kind == "ago", day_month)
+    )
+    formatted = dates.dt.strftime(fmt).astype(object)
+    return formatted.where(kind.notna() & dates.notna(), None)
@@ -0,0 +1,181 @@
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+
+from data_extraction.Websites import init_driver, proxies, quit_driver
+
+
+def process_tree_rss_mb(pid: int) -> float:
+    """Returns the resident memory of a process and all its children in MB (Linux only, 0 elsewhere).
+    Chrome spreads a page over several renderer processes, they all count towards the browser memory.
+    """
+    if not pid or not os.path.isdir("/proc"):
+        return 0.0
+    children, rss_kb = {}, {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/status") as status:
+                fields = dict(
+                    line.split(":", 1)
+                    for line in status.read().splitlines()
+                    if ":" in line
+                )
+        except OSError:
+            continue
+        children.setdefault(int(fields.get("PPid", "0")), []).append(int(entry))
+        rss_kb[int(entry)] = int(fields.get("VmRSS", "0 kB").split()[0])
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        total += rss_kb.get(current, 0)
+        stack.extend(children.get(current, []))
+    return total / 1024
+
+
+class DriverPool:
+    """Pool of Chrome drivers owned by a worker process and leased to the scraping tasks.
+
+    Starting undetected-chromedriver costs several seconds, the pool keeps the browsers
+    alive between tasks, resets them between leases and recycles them once they are worn
+    or once the proxy pool evicted their proxy (SCRAPER_PROXIES=1).
+
+    size: number of drivers kept by the pool
+
+    max_pages: a driver is recycled after loading this many pages
+
+    max_rss_mb: a driver is recycled when its process tree uses more memory than this
+
+    factory: function creating a new driver
+    """
+
+    def __init__(self, size=1, max_pages=200, max_rss_mb=1500, factory=init_driver):
+        self.size = size
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.factory = factory
+        self._idle = queue.Queue()
+        self._lock = threading.Lock()
+        self._created = 0
+        self._closed = False
+
+    def _new_driver(self):
+        driver = self.factory()
+        driver.pages_loaded = 0
+        original_get = driver.get
+
+        # Counts the pages loaded through the driver to know when to recycle it
+        def counted_get(url):
+            driver.pages_loaded += 1
+            return original_get(url)
+
+        driver.get = counted_get
+        # Loads a page without counting it, for the resets of the pool
+        driver.uncounted_get = original_get
+        return driver
+
+    def warm(self):
+        """Starts the drivers up front, called when the worker process starts"""
+        with self._lock:
+            missing = self.size - self._created
+            self._created += missing
+        for _ in range(missing):
+            try:
+                self._idle.put(self._new_driver())
+            except Exception:
+                with self._lock:
+                    self._created -= 1
+                raise
+        logging.info(f"Driver pool warmed with {self.size} drivers")
+
+    def acquire(self, timeout=None):
+        while True:
+            with self._lock:
+                create = self._idle.empty() and self._created < self.size
+                if create:
+                    self._created += 1
+            if create:
+                try:
+                    return self._new_driver()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            driver = self._idle.get(timeout=timeout)
+            # The proxy of an idle driver may have been evicted since its release
+            if not self.proxy_evicted(driver):
+                return driver
+            self.discard(driver)
+
+    def release(self, driver):
+        if self._closed or self.is_worn(driver):
+            self.discard(driver)
+            return
+        try:
+            self.reset(driver)
+        except Exception as e:
+            logging.warning(f"Driver reset failed, recycling it: {e}")
+            self.discard(driver)
+            return
+        self._idle.put(driver)
+
+    def discard(self, driver):
+        """Quits the driver and frees its slot, a new one is started on the next lease"""
+        quit_driver(driver)
+        with self._lock:
+            self._created -= 1
+
+    @contextmanager
+    def lease(self, timeout=None):
+        driver = self.acquire(timeout=timeout)
+        try:
+            yield driver
+        finally:
+            self.release(driver)
+
+    @staticmethod
+    def proxy_evicted(driver) -> bool:
+        """True when the driver goes through a proxy the proxy pool no longer considers alive"""
+        proxy = getattr(driver, "pooled_proxy", None)
+        if not (proxies.ENABLED and proxy) or proxies.proxy_pool().is_alive(proxy):
+            return False
+        logging.info(f"Recycling driver using the evicted proxy {proxy}")
+        return True
+
+    def is_worn(self, driver) -> bool:
+        if self.proxy_evicted(driver):
+            return True
+        if driver.pages_loaded >= self.max_pages:
+            logging.info(f"Recycling driver after {driver.pages_loaded} pages")
+            return True
+        rss = process_tree_rss_mb(getattr(driver, "browser_pid", None))
+        if rss >= self.max_rss_mb:
+            logging.info(f"Recycling driver using {rss:.0f} MB")
+            return True
+        return False
+
+    @staticmethod
+    def reset(driver):
+        """Brings a leased driver back to a clean state: single blank tab, no cookies nor cache.
+        driver.resets counts the resets, what a scraper keeps about a browser session (e.g.
+        the consent banner already closed) is only valid for the same count"""
+        driver.resets = getattr(driver, "resets", 0) + 1
+        for handle in driver.window_handles[1:]:
+            driver.switch_to.window(handle)
+            driver.close()
+        driver.switch_to.window(driver.window_handles[0])
+        driver.delete_all_cookies()
+        driver.execute_cdp_cmd("Network.clearBrowserCache", {})
+        getattr(driver, "uncounted_get", driver.get)("about:blank")
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self.discard(driver)
@@ -1,253 +1,198 @@
-import re
-
-from selenium import webdriver
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.support.ui import WebDriverWait
-
-from data_extraction.Websites import (
-    check_duplicate,
-    init_driver,
-    load_json,
-    save_json,
-    setup_logger,
-    validate_json,
-)
+import argparse
+from urllib.parse import quote
+
+from data_extraction.Websites import setup_logger
+from data_extraction.Websites.crawler import SiteAdapter, crawl, register, with_retries
+from data_extraction.Websites.http_fetch import node_text, parse_html
+from data_extraction.Websites.waits import WaitStats
 
 logger = setup_logger("emploi.log")
-# Liste pour stocker les nouvelles données scrappées
-new_jobs = []
+wait_stats = WaitStats("emploi")
 
+# Recherche d'un mot-clé filtrée sur le métier informatique, les pages suivantes ajoutent &page=N
+SEARCH_URL = "https://www.emploi.ma/recherche-jobs-maroc/{}?f%5B0%5D=im_field_offre_metiers%3A31"
+PAGER_SELECTOR = "li[class='pager-item active pagination-numbers']"
 
-def access_emploi(driver: webdriver.Chrome):
-    # Accès à l'URL initiale pour soumettre la recherche "DATA AI ML"
-    driver.get(
-        "https://www.emploi.ma/recherche-jobs-maroc/data?f%5B0%5D=im_field_offre_metiers%3A31"
-    )
 
+def page_url(page, keyword="data"):
+    """URL de la page de résultats de la recherche de keyword, la première page est la page 0"""
+    search_url = SEARCH_URL.format(quote(keyword))
+    return f"{search_url}&page={page}" if page else search_url
 
-def get_number_pages(driver: webdriver.Chrome):
-    try:
-        pages = WebDriverWait(driver, 10).until(
-            EC.presence_of_all_elements_located(
-                (By.CSS_SELECTOR, "li[class='pager-item active pagination-numbers']")
-            )
-        )
-        max_pages = int(pages[-1].text.strip())
-        return max_pages
-    except (NoSuchElementException, TimeoutException) as e:
-        logger.error(f"Page number not found: {e}")
-        return 1
 
+# Libellés des informations complémentaires d'une carte et champ correspondant
+DETAIL_LABELS = [
+    (("Niveau d´études requis", "Niveau d’études requis"), "niveau_etudes"),
+    (("Niveau d'expérience",), "niveau_experience"),
+    (("Contrat proposé",), "contrat"),
+    (("Région de",), "region"),
+    (("Compétences clés",), "competences"),
+]
 
-def main(logger=setup_logger("emploi.log")):
-    # Initialisation du driver
-    driver = init_driver()
 
-    try:
-        access_emploi(driver)
-        max_pages = get_number_pages(driver)
-        logger.info(f"Nombre de pages trouvées: {max_pages}")
-        page = 0
-        # Boucle de pagination
-        data = load_json("offres_emploi_emploi.json")
-        while page < max_pages:
-            # Récupère l'URL actuelle
-            url = driver.current_url
-
-            # Si l'URL contient déjà un paramètre "page"
-            if re.search(r"page=\d+", url):
-                new_url = re.sub(r"page=\d+", f"page={page}", url)
-                new_url += "?f%5B0%5D=im_field_offre_metiers%3A31"
-            else:
-                sep = (
-                    "&" if "?" in url else "?"
-                )  # gère les cas où d'autres paramètres existent déjà
-                new_url = f"{url}{sep}page={page}"
-
-            driver.get(new_url)
-            logger.info(f"Scraping de la page {page + 1} : {new_url}")
-
-            # Attendre que les cartes d'offres soient chargées
-            try:
-                WebDriverWait(driver, 10).until(
-                    EC.presence_of_all_elements_located(
-                        (By.CSS_SELECTOR, "div.card.card-job")
-                    )
-                )
-            except TimeoutException:
-                logger.error(
-                    f"Aucune carte trouvée sur la page {page} ou temps d'attente dépassé."
-                )
+def parse_details(details):
+    """Analyse les informations complémentaires (niveau d'études, expérience, contrat, région, compétences)
+
+    details: liste de dictionnaires {"text": texte du <li>, "strong": texte de sa balise <strong>}
+    """
+    parsed = {field: "" for _, field in DETAIL_LABELS}
+    for li in details:
+        for labels, field in DETAIL_LABELS:
+            if any(label in li["text"] for label in labels):
+                parsed[field] = li["strong"]
                 break
+    return parsed
+
 
-            cards = WebDriverWait(driver, 3).until(
-                EC.presence_of_all_elements_located(
-                    (By.CSS_SELECTOR, "div.card.card-job")
-                )
+def parse_number_pages(html):
+    """Nombre de pages annoncé par la pagination d'une page téléchargée, 1 si elle est absente"""
+    pages = parse_html(html).select(PAGER_SELECTOR)
+    try:
+        return int(node_text(pages[-1]))
+    except (IndexError, ValueError):
+        logger.error("Page number not found")
+        return 1
+
+
+def parse_listing(html):
+    """Lit les cartes d'une page de résultats, téléchargée en HTTP ou lue dans le navigateur (page_source).
+    Fonction pure, sans driver : elle est testée et mesurée sur les pages de benchmarks/fixtures"""
+    cards = []
+    for card in parse_html(html).select("div.card.card-job"):
+        time_elem = card.select_one("time")
+        cards.append(
+            {
+                "job_url": (card.get("data-href") or "").strip(),
+                "titre": node_text(card.select_one("a")),
+                "companie": node_text(card.select_one("a.card-job-company")),
+                "description": node_text(
+                    card.select_one("div.card-job-description p")
+                ),
+                "details": [
+                    {"text": node_text(li), "strong": node_text(li.select_one("strong"))}
+                    for li in card.select("div.card-job-detail ul li")
+                ],
+                "publication_date": (time_elem.get("datetime") or "").strip()
+                if time_elem is not None
+                else "",
+            }
+        )
+    return cards
+
+
+def build_job(card):
+    """Construit une offre à partir des champs d'une carte lus par parse_listing"""
+    job = {
+        "job_url": card["job_url"],
+        "titre": card["titre"],
+        "companie": card["companie"],
+        "description": card["description"],
+    }
+    job |= parse_details(card["details"])
+    job |= {"publication_date": card["publication_date"], "via": "emploi.ma"}
+    return job
+
+
+@register
+class EmploiAdapter(SiteAdapter):
+    """emploi.ma : pages de résultats numérotées à partir de 0, les cartes contiennent les offres complètes"""
+
+    site = "emploi"
+    dataset = "offres_emploi_emploi.json"
+    listing_ready = "div.card.card-job"
+    link_selector = "div.card.card-job[data-href]"
+    wait_stats = wait_stats
+    logger = logger
+
+    def __init__(self):
+        # Pages déjà téléchargées, lues une seule fois
+        self.prefetched = {}
+
+    def list_pages(self, fetcher, cursor, keyword):
+        max_pages = cursor.setdefault("max_pages", {})
+        if max_pages.get(keyword) is None:
+            # La première page donne le nombre de pages, son html est gardé pour le parcours
+            html = with_retries(
+                self.fetch_listing,
+                fetcher,
+                keyword,
+                0,
+                what=f"emploi {keyword!r} page 0",
+                logger=logger,
             )
-            logger.info(f"Nombre de cartes trouvées sur la page {page} : {len(cards)}")
+            if html is None:
+                return []
+            self.prefetched[keyword, 0] = html
+            max_pages[keyword] = parse_number_pages(html)
+        logger.info(f"Nombre de pages trouvées pour {keyword!r}: {max_pages[keyword]}")
+        return list(range(max_pages[keyword]))
+
+    def fetch_listing(self, fetcher, keyword, page):
+        html = self.prefetched.pop((keyword, page), None)
+        if html is None:
+            html = super().fetch_listing(fetcher, keyword, page)
+        return html
+
+    def listing_url(self, keyword, page):
+        return page_url(page, keyword)
+
+    parse_listing = staticmethod(parse_listing)
+    build_offer = staticmethod(build_job)
+
+
+def main(
+    driver=None,
+    fetch_mode=None,
+    workers=4,
+    incremental=True,
+    known_streak=20,
+    resume=False,
+    flush_every=5,
+    keywords=None,
+    lease_driver=None,
+):
+    """Parcourt les offres Data d'emploi.ma.
+
+    driver: driver prêté par le pool du worker, il n'est pas fermé à la fin. Par défaut un driver est créé au besoin
+
+    lease_driver: fonction qui prête un driver du pool quand un worker du parcours a besoin du navigateur
+
+    fetch_mode: "http" ou "browser" pour les pages de résultats, par défaut celui de SITE_FETCH_MODES
+
+    workers: nombre de pages de résultats chargées en parallèle, chaque worker a sa session et son driver
+
+    incremental: arrête la pagination dès que les offres déjà collectées sont atteintes (voir EarlyStop),
+    False pour un parcours complet
+
+    known_streak: nombre d'offres connues consécutives qui arrête le parcours incrémental
+
+    resume: reprend le parcours interrompu à partir de son checkpoint
+
+    flush_every: les offres sont enregistrées toutes les flush_every pages
+
+    keywords: mots-clés recherchés, par défaut ceux de SITE_KEYWORDS
+    """
+    return crawl(
+        EmploiAdapter(),
+        driver=driver,
+        fetch_mode=fetch_mode,
+        workers=workers,
+        incremental=incremental,
+        known_streak=known_streak,
+        resume=resume,
+        flush_every=flush_every,
+        keywords=keywords,
+        lease_driver=lease_driver,
+    )
 
-            # Si aucune carte n'est présente, sortir de la boucle
-            if not cards:
-                logger.warning(
-                    "Aucune offre trouvée sur cette page, fin de la pagination."
-                )
-                break
 
-            for index, card in enumerate(cards, start=1):
-                # Récupérer l'URL de l'offre
-                try:
-                    job_url = (
-                        card.get_attribute("data-href").strip()
-                        if card.get_attribute("data-href")
-                        else ""
-                    )
-                    if check_duplicate(data, job_url):
-                        continue
-
-                except Exception as e:
-                    logger.error(
-                        f"[Carte {index} - page {page}] Erreur lors de la récupération de l'URL : {e}"
-                    )
-                    job_url = ""
-                # Récupérer le titre de l'offre
-                try:
-                    titre = card.find_element(By.CSS_SELECTOR, "a").text.strip()
-                except NoSuchElementException:
-                    logger.error(f"[Carte {index} - page {page}] Titre non trouvé.")
-                    titre = ""
-
-                # Récupérer le nom de l'entreprise
-                try:
-                    companie = card.find_element(
-                        By.CSS_SELECTOR, "a.card-job-company"
-                    ).text.strip()
-                except NoSuchElementException:
-                    logger.error(
-                        f"[Carte {index} - page {page}] Nom de l'entreprise non trouvé."
-                    )
-                    companie = ""
-
-                # Récupérer la description
-                try:
-                    description = card.find_element(
-                        By.CSS_SELECTOR, "div.card-job-description p"
-                    ).text.strip()
-                except NoSuchElementException:
-                    logger.error(
-                        f"[Carte {index} - page {page}] Description non trouvée."
-                    )
-                    description = ""
-
-                # Informations complémentaires (niveau d'études, expérience, contrat, région, compétences)
-                niveau_etudes = ""
-                niveau_experience = ""
-                contrat = ""
-                region = ""
-                competences = ""
-                try:
-                    ul = card.find_element(By.CSS_SELECTOR, "div.card-job-detail ul")
-                    li_elements = ul.find_elements(By.TAG_NAME, "li")
-                    for li in li_elements:
-                        txt = li.text.strip()
-                        if (
-                            "Niveau d´études requis" in txt
-                            or "Niveau d’études requis" in txt
-                        ):
-                            try:
-                                niveau_etudes = li.find_element(
-                                    By.TAG_NAME, "strong"
-                                ).text.strip()
-                            except NoSuchElementException:
-                                niveau_etudes = ""
-                        elif "Niveau d'expérience" in txt:
-                            try:
-                                niveau_experience = li.find_element(
-                                    By.TAG_NAME, "strong"
-                                ).text.strip()
-                            except NoSuchElementException:
-                                niveau_experience = ""
-                        elif "Contrat proposé" in txt:
-                            try:
-                                contrat = li.find_element(
-                                    By.TAG_NAME, "strong"
-                                ).text.strip()
-                            except NoSuchElementException:
-                                contrat = ""
-                        elif "Région de" in txt:
-                            try:
-                                region = li.find_element(
-                                    By.TAG_NAME, "strong"
-                                ).text.strip()
-                            except NoSuchElementException:
-                                region = ""
-                        elif "Compétences clés" in txt:
-                            try:
-                                competences = li.find_element(
-                                    By.TAG_NAME, "strong"
-                                ).text.strip()
-                            except NoSuchElementException:
-                                competences = ""
-                except NoSuchElementException:
-                    logger.error(
-                        f"[Carte {index} - page {page}] Section des détails complémentaires non trouvée."
-                    )
-
-                # Récupérer la date de publication
-                try:
-                    pub_date = (
-                        card.find_element(By.CSS_SELECTOR, "time")
-                        .get_attribute("datetime")
-                        .strip()
-                    )
-                except NoSuchElementException:
-                    logger.error(
-                        f"[Carte {index} - page {page}] Date de publication non trouvée."
-                    )
-                    pub_date = ""
-
-                # Création du dictionnaire de l'offre
-                job = {
-                    "job_url": job_url,
-                    "titre": titre,
-                    "companie": companie,
-                    "description": description,
-                    "niveau_etudes": niveau_etudes,
-                    "niveau_experience": niveau_experience,
-                    "contrat": contrat,
-                    "region": region,
-                    "competences": competences,
-                    "publication_date": pub_date,
-                    "via": "emploi.ma",
-                }
-
-                # Ajout de l'offre aux nouvelles offres et mémorisation de l'
-                try:
-                    validate_json(job)
-
-                    new_jobs.append(job)
-                except Exception:
-                    logger.error("Erreur lors de la validation JSON")
-
-            # Passage à la page suivante
-            page += 1
-        logger.info(f"Nombre total d'offres nouvellement extraites : {len(new_jobs)}")
-
-    except Exception as e:
-        logger.error(f"Erreur lors du scraping :{e}")
-    finally:
-        if driver:
-            driver.quit()
-        logger.info("Extraction terminée !")
-        save_json(new_jobs, "offres_emploi_emploi.json")
-    return new_jobs
-
-
-<<<<<<< HEAD
-main()
-=======
 if __name__ == "__main__":
-    main()
->>>>>>> 06572de2b55ec9ee969bebf9f33ea25d80aa546d
+    parser = argparse.ArgumentParser(description="Extraction des offres d'emploi.ma")
+    parser.add_argument(
+        "--resume", action="store_true", help="reprend le dernier parcours interrompu"
+    )
+    parser.add_argument(
+        "--full", action="store_true", help="parcourt toutes les pages de résultats"
+    )
+    args = parser.parse_args()
+    main(resume=args.resume, incremental=not args.full)
@@ -0,0 +1,174 @@
+import datetime
+import json
+import logging
+import os
+import threading
+
+# Set SCRAPER_BREAKER=0 to count the misses without ever aborting a crawl
+ENABLED = os.environ.get("SCRAPER_BREAKER", "1") != "0"
+# A selector missing this many times in a row trips the breaker of its site
+MAX_CONSECUTIVE_MISSES = int(os.environ.get("SCRAPER_BREAKER_STREAK", "8"))
+# So does a selector missing at least this share of its checks, once checked MIN_CHECKS times
+MAX_MISS_RATE = 0.5
+MIN_CHECKS = 20
+
+
+class SelectorCircuitOpen(Exception):
+    """Raised by a crawl aborted by its selector breaker, once what it collected is saved.
+
+    report: the SelectorHealth report of the crawl
+
+    offers: the new offers collected before the abort, already in the dataset
+    """
+
+    def __init__(self, report: dict, offers=None):
+        tripped = report["tripped_by"]
+        super().__init__(
+            f"{report['site']}: {tripped['check']} '{tripped['selector']}' "
+            f"tripped the selector breaker ({tripped['reason']})"
+        )
+        self.report = report
+        self.offers = offers or []
+
+
+class SelectorHealth:
+    """Hits and misses of the selectors of a site during a crawl, and its circuit breaker.
+
+    A layout change makes a selector miss on every page or every card, each miss costing
+    a wait timeout or a useless fetch. Once a selector misses MAX_CONSECUTIVE_MISSES times
+    in a row, or at MAX_MISS_RATE after MIN_CHECKS checks, the breaker trips: the crawl
+    stops reading pages and raises SelectorCircuitOpen with the report of the selectors.
+
+    The checks are named after what is checked: "wait" for a browser wait (see
+    WaitStats), "cards" for the cards of a listing page, "link" for the url of an offer
+    in its card, "detail" for the fields of the page of an offer.
+
+    Recording never raises, it is safe in the finally of a wait or under a broad except:
+    the crawl looks at `tripped` between two pages.
+
+    site: name of the site, used in the logs and the report
+
+    enabled: false to only count, the breaker never trips (see ENABLED)
+    """
+
+    def __init__(self, site: str, enabled: bool | None = None):
+        self.site = site
+        self.enabled = ENABLED if enabled is None else enabled
+        self.tripped_by = None
+        self.tripped_at = None
+        self._lock = threading.Lock()
+        self._selectors = {}
+
+    @property
+    def tripped(self) -> bool:
+        return self.tripped_by is not None
+
+    def record(self, check: str, selector: str, hit: bool, url: str | None = None):
+        """Counts a check of the selector, trips the breaker when the selector keeps missing
+
+        url: page the selector was checked on, kept for the last miss
+        """
+        with self._lock:
+            stats = self._stats(check, selector)
+            stats["checks"] += 1
+            if hit:
+                stats["streak"] = 0
+                return
+            stats["misses"] += 1
+            stats["streak"] += 1
+            if url:
+                stats["last_miss_url"] = url
+            tripped = self._trip(check, selector, stats)
+        if tripped:
+            self._log_trip()
+
+    def merge(self, report: dict):
+        """Adds the checks of the report of another crawl of the site, e.g. a subtask of
+        a split crawl, and trips the breaker like `record`. The streak of a selector goes
+        on when the other crawl only missed it"""
+        tripped = False
+        with self._lock:
+            for other in report["selectors"]:
+                stats = self._stats(other["check"], other["selector"])
+                stats["checks"] += other["checks"]
+                stats["misses"] += other["misses"]
+                if other["streak"] == other["checks"]:
+                    stats["streak"] += other["streak"]
+                else:
+                    stats["streak"] = other["streak"]
+                stats["last_miss_url"] = (
+                    other["last_miss_url"] or stats["last_miss_url"]
+                )
+                tripped |= self._trip(other["check"], other["selector"], stats)
+            if report["tripped"] and not self.tripped and self.enabled:
+                self.tripped_by, self.tripped_at = (
+                    report["tripped_by"],
+                    report["tripped_at"],
+                )
+                tripped = True
+        if tripped:
+            self._log_trip()
+
+    def _stats(self, check, selector) -> dict:
+        return self._selectors.setdefault(
+            (check, selector),
+            {"checks": 0, "misses": 0, "streak": 0, "last_miss_url": None},
+        )
+
+    def _trip(self, check, selector, stats) -> bool:
+        """Trips the breaker if the selector keeps missing, true if it just tripped. Under the lock"""
+        if self.tripped or not self.enabled:
+            return False
+        if stats["streak"] >= MAX_CONSECUTIVE_MISSES:
+            reason = f"{stats['streak']} misses in a row"
+        elif (
+            stats["checks"] >= MIN_CHECKS
+            and stats["misses"] / stats["checks"] >= MAX_MISS_RATE
+        ):
+            reason = f"{stats['misses']} misses in {stats['checks']} checks"
+        else:
+            return False
+        self.tripped_by = {"check": check, "selector": selector, "reason": reason}
+        self.tripped_at = datetime.datetime.now().isoformat(timespec="seconds")
+        return True
+
+    def _log_trip(self):
+        tripped = self.tripped_by
+        logging.error(
+            f"{self.site}: {tripped['check']} '{tripped['selector']}' {tripped['reason']}, "
+            "the layout of the site probably changed: the crawl is aborted"
+        )
+
+    def report(self) -> dict:
+        """Structured report of the crawl: the selector tripping the breaker if any, and
+        the checks, misses, miss rate, current streak and last missing page of each selector"""
+        with self._lock:
+            selectors = [
+                {
+                    "check": check,
+                    "selector": selector,
+                    **stats,
+                    "miss_rate": round(stats["misses"] / stats["checks"], 3),
+                }
+                for (check, selector), stats in self._selectors.items()
+            ]
+            return {
+                "site": self.site,
+                "tripped": self.tripped,
+                "tripped_by": self.tripped_by,
+                "tripped_at": self.tripped_at,
+                "selectors": sorted(selectors, key=lambda s: -s["miss_rate"]),
+            }
+
+    def log_report(self, logger=logging):
+        report = self.report()
+        for stats in report["selectors"]:
+            if stats["misses"]:
+                logger.info(
+                    f"{self.site}: {stats['check']} '{stats['selector']}' missed "
+                    f"{stats['misses']}/{stats['checks']} times"
+                )
+        if report["tripped"]:
+            logger.error(
+                f"{self.site}: selector health report {json.dumps(report, ensure_ascii=False)}"
+            )
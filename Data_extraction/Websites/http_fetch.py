@@ -0,0 +1,371 @@
+import importlib.util
+import logging
+import os
+import queue
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlsplit, urlunsplit
+
+import requests
+from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from data_extraction.Websites import init_driver, quit_driver
+from data_extraction.Websites.browser_profile import apply_profile, page_traffic
+from data_extraction.Websites.proxies import (
+    assign_proxy,
+    proxy_pool,
+    release_proxy,
+    report_proxy,
+)
+from data_extraction.Websites.ratelimit import SITE_DOMAINS, rate_limiter, retry_after
+from data_extraction.Websites.snapshots import save_snapshot
+
+# How each site's listing pages are fetched by default: "http" downloads the server
+# rendered html with a pooled requests session, "browser" drives Chrome
+SITE_FETCH_MODES = {
+    "rekrute": "http",
+    "emploi": "http",
+    "marocannonces": "http",
+    "bayt": "browser",  # results rendered in javascript behind an anti-bot check
+}
+
+# Text only found in a page when it is rendered properly by the site, a page
+# without it is a challenge or an empty shell that needs the browser
+# (MarocAnnonces has none: the page after the last one is a valid page without offers)
+READY_MARKERS = {
+    "rekrute": "titreJob",
+    "emploi": "card-job",
+}
+
+BLOCKED_STATUS = {403, 429, 503}
+CHALLENGE_MARKERS = (
+    "captcha",
+    "cf-chl",
+    "challenge-platform",
+    "just a moment...",
+    "attention required",
+)
+
+HEADERS = {
+    "User-Agent": (
+        "Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 "
+        "(KHTML, like Gecko) Chrome/136.0.0.0 Safari/537.36"
+    ),
+    "Accept": "text/html,application/xhtml+xml,application/xml;q=0.9,*/*;q=0.8",
+    "Accept-Language": "fr-FR,fr;q=0.9,en;q=0.8",
+}
+
+
+# lxml parses several times faster than the pure python parser, it is used when installed
+HTML_PARSER = "lxml" if importlib.util.find_spec("lxml") else "html.parser"
+
+
+def is_challenge(html: str) -> bool:
+    """True for an anti-bot page (captcha, javascript challenge) served instead of the page"""
+    lowered = html.lower()
+    return any(marker in lowered for marker in CHALLENGE_MARKERS)
+
+
+def parse_html(html: str) -> BeautifulSoup:
+    return BeautifulSoup(html, HTML_PARSER)
+
+
+def node_text(node) -> str:
+    """Text of an html node with collapsed whitespace, close to the browser innerText of the card fields"""
+    return " ".join(node.get_text(" ").split()) if node is not None else ""
+
+
+def block_text(node) -> str:
+    """Text of an html node keeping one line per block, close to the browser innerText of a multi-line field"""
+    if node is None:
+        return ""
+    lines = (" ".join(line.split()) for line in node.get_text("\n").splitlines())
+    return "\n".join(line for line in lines if line)
+
+
+# Server receiving every request in place of the sites, e.g. the mock sites of the
+# benchmarks (SCRAPER_ORIGIN=http://127.0.0.1:8765). The site stays in the Host header
+ORIGIN = os.environ.get("SCRAPER_ORIGIN")
+
+
+class OriginAdapter(HTTPAdapter):
+    """Transport sending the requests to another origin with the same path and query, like curl --resolve
+
+    origin: scheme and address of the server, e.g. "http://127.0.0.1:8765"
+    """
+
+    def __init__(self, origin: str, **kwargs):
+        self.origin = urlsplit(origin)
+        super().__init__(**kwargs)
+
+    def send(self, request, **kwargs):
+        parts = urlsplit(request.url)
+        request.headers["Host"] = parts.netloc
+        request.url = urlunsplit(
+            (self.origin.scheme, self.origin.netloc, parts.path, parts.query, "")
+        )
+        return super().send(request, **kwargs)
+
+
+def proxy_urls(proxy) -> dict:
+    """proxies setting of a requests session going through the "host:port" proxy, direct if None"""
+    return {"http": f"http://{proxy}", "https": f"http://{proxy}"} if proxy else {}
+
+
+def make_session(pool_size=8, retries=2, proxy=None):
+    """Returns a requests session keeping up to pool_size connections alive per host
+
+    proxy: "host:port" of the HTTP proxy of the session, direct connection if None
+    """
+    session = requests.Session()
+    session.headers.update(HEADERS)
+    session.proxies.update(proxy_urls(proxy))
+    options = dict(
+        pool_connections=pool_size,
+        pool_maxsize=pool_size,
+        max_retries=Retry(
+            total=retries,
+            backoff_factor=0.5,
+            status_forcelist=[500, 502, 504],
+            allowed_methods=["GET"],
+        ),
+    )
+    adapter = OriginAdapter(ORIGIN, **options) if ORIGIN else HTTPAdapter(**options)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+
+def browser_state(driver) -> dict:
+    """Cookies, user agent and proxy of the browser, see `session_from_browser`.
+    Plain json, a split crawl hands it to its subtasks instead of opening the site again"""
+    return {
+        "cookies": driver.get_cookies(),
+        "user_agent": driver.execute_script("return navigator.userAgent"),
+        "proxy": getattr(driver, "proxy", None),
+    }
+
+
+def session_from_browser(browser: dict, pool_size=8):
+    """Returns a session sending the cookies and user agent of a browser (see `browser_state`),
+    to download pages of a site the browser already went through (anti-bot and consent cookies).
+    The session goes through the proxy of the browser, the cookies belong to its address"""
+    session = make_session(pool_size, proxy=browser["proxy"])
+    session.headers["User-Agent"] = browser["user_agent"]
+    for cookie in browser["cookies"]:
+        session.cookies.set(
+            cookie["name"],
+            cookie["value"],
+            domain=cookie.get("domain"),
+            path=cookie.get("path", "/"),
+        )
+    return session
+
+
+def session_from_driver(driver, pool_size=8):
+    """Returns a session sending the cookies and user agent of the driver, see `session_from_browser`"""
+    return session_from_browser(browser_state(driver), pool_size)
+
+
+def _new_stats() -> dict:
+    return {"pages": 0, "seconds": 0.0, "bytes": 0, "blocked": 0}
+
+
+class PageFetcher:
+    """Fetches the listing pages of a site over plain HTTP and falls back to the browser.
+
+    The first page that is blocked (403/429/503, captcha) or comes back without the
+    site's ready marker switches the fetcher to browser mode for the rest of the run.
+    A request that fails (connection error, timeout) only fails its page: the browser
+    would not reach the site either.
+    The driver is only started when the browser is actually needed. Every page, in
+    both modes, waits for a slot of the site's domain in the shared rate limiter.
+    The driver gets the browser profile of the site (see browser_profile), the bytes
+    its pages download are reported with their time.
+    With SCRAPER_PROXIES=1 the session and the driver of a fetcher share a proxy of the
+    pool, replaced when the pool evicts it.
+
+    site: key of the site in SITE_FETCH_MODES
+
+    mode: "http" or "browser", defaults to the site configuration
+
+    driver: driver leased by the caller, it is not quit by `close`
+
+    lease_driver: function returning a driver leased by the caller, called the first time
+    the browser is needed instead of starting one. The driver is not quit by `close`.
+    The fetchers spawned by this one lease their drivers the same way, a fetcher starts
+    its own when the function raises queue.Empty (every leased driver busy)
+    """
+
+    def __init__(
+        self,
+        site: str,
+        mode: str | None = None,
+        driver=None,
+        timeout=20,
+        lease_driver=None,
+    ):
+        self.site = site
+        self.domain = SITE_DOMAINS.get(site, site)
+        self.mode = mode or SITE_FETCH_MODES.get(site, "browser")
+        self.timeout = timeout
+        self.proxy = assign_proxy()
+        self.session = make_session(proxy=self.proxy)
+        self._driver = driver
+        self._lease_driver = lease_driver
+        self._own_driver = False
+        self._profiled = False
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self._stats = {}
+
+    @property
+    def use_http(self) -> bool:
+        return self.mode == "http"
+
+    @property
+    def driver(self):
+        with self._lock:
+            if self._driver is None and self._lease_driver is not None:
+                logging.info(f"{self.site}: leasing a browser")
+                try:
+                    self._driver = self._lease_driver()
+                except queue.Empty:
+                    logging.info(f"{self.site}: no leased browser free")
+            if self._driver is None:
+                logging.info(f"{self.site}: starting the browser")
+                self._driver = init_driver(proxy=self.proxy)
+                self._own_driver = True
+            if not self._profiled:
+                apply_profile(self._driver, self.site)
+                self._profiled = True
+                # The traffic of a leased driver before this fetcher is not its own
+                page_traffic(self._driver)
+            return self._driver
+
+    def spawn(self):
+        """Returns a new fetcher for the same site and mode, with its own session and driver.
+        The pages it loads are counted with the pages of this fetcher."""
+        fetcher = PageFetcher(
+            self.site,
+            mode=self.mode,
+            timeout=self.timeout,
+            lease_driver=self._lease_driver,
+        )
+        fetcher._stats_lock, fetcher._stats = self._stats_lock, self._stats
+        return fetcher
+
+    def fall_back(self, reason: str):
+        if self.use_http:
+            logging.warning(f"{self.site}: switching to the browser, {reason}")
+        self.mode = "browser"
+
+    def fetch_html(self, url: str, kind="listing"):
+        """Downloads the page over HTTP. Returns None when the page needs the browser, the fetcher is then in browser mode.
+        Raises requests.RequestException when the request fails, the caller retries the page (see crawler.with_retries)
+
+        kind: "listing" or "detail", how the page is filed in the snapshot store
+        """
+        if not self.use_http:
+            return None
+        with self.timed("http") as slot:
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException:
+                slot.failed()
+                self.report_proxy(False)
+                raise
+            html = response.text
+            self.count_bytes("http", len(response.content))
+            blocked = response.status_code in BLOCKED_STATUS
+            challenge = is_challenge(html)
+            if blocked or challenge:
+                slot.throttled(retry_after(response))
+            self.report_proxy(
+                not (blocked or challenge), response.elapsed.total_seconds()
+            )
+        if blocked:
+            self.fall_back(f"HTTP {response.status_code} for {url}")
+            return None
+        if challenge:
+            self.fall_back(f"anti-bot challenge on {url}")
+            return None
+        marker = READY_MARKERS.get(self.site)
+        if response.ok and marker and marker not in html:
+            self.fall_back(f"{url} needs javascript")
+            return None
+        save_snapshot(self.site, kind, url, html)
+        return html
+
+    def report_proxy(self, ok: bool, latency=None):
+        """Records the outcome of a request on the proxy of the session, replaced once evicted"""
+        if self.proxy is None:
+            return
+        report_proxy(self.proxy, ok, latency)
+        if not ok and not proxy_pool().is_alive(self.proxy):
+            release_proxy(self.proxy)
+            self.proxy = assign_proxy()
+            self.session.proxies.clear()
+            self.session.proxies.update(proxy_urls(self.proxy))
+            logging.info(f"{self.site}: session now using proxy {self.proxy}")
+
+    @contextmanager
+    def timed(self, mode: str):
+        """Counts one page fetched with the given mode, its duration and, for the browser,
+        the bytes it downloaded. Holds a slot of the rate limiter during the fetch and
+        yields it, see `RateLimiter.slot`"""
+        if mode == "browser" and self._driver is not None:
+            # Drops the traffic of the navigation outside the timed pages (search forms)
+            page_traffic(self._driver)
+        start = time.perf_counter()
+        try:
+            with rate_limiter().slot(self.domain) as slot:
+                yield slot
+        finally:
+            received = blocked = 0
+            if mode == "browser" and self._driver is not None:
+                received, blocked = page_traffic(self._driver)
+            with self._stats_lock:
+                stats = self._stats.setdefault(mode, _new_stats())
+                stats["pages"] += 1
+                stats["seconds"] += time.perf_counter() - start
+                stats["bytes"] += received
+                stats["blocked"] += blocked
+
+    def count_bytes(self, mode: str, received: int):
+        """Adds the bytes of a page downloaded outside of the browser"""
+        with self._stats_lock:
+            self._stats.setdefault(mode, _new_stats())["bytes"] += received
+
+    def summary(self) -> dict:
+        with self._stats_lock:
+            return {
+                mode: dict(
+                    stats,
+                    pages_per_second=stats["pages"] / stats["seconds"],
+                    seconds_per_page=stats["seconds"] / stats["pages"],
+                    bytes_per_page=stats["bytes"] / stats["pages"],
+                )
+                for mode, stats in self._stats.items()
+                if stats["seconds"]
+            }
+
+    def log_report(self, logger=logging):
+        for mode, stats in self.summary().items():
+            logger.info(
+                f"{self.site}: {stats['pages']} pages in {mode} mode, "
+                f"{stats['pages_per_second']:.2f} pages/s, "
+                f"{stats['seconds_per_page']:.2f}s and "
+                f"{stats['bytes_per_page'] / 1024:.0f} KB per page"
+                + (f", {stats['blocked']} requests blocked" if stats["blocked"] else "")
+            )
+        rate_limiter().log_report(self.domain, logger)
+
+    def close(self):
+        self.session.close()
+        release_proxy(self.proxy)
+        if self._own_driver and self._driver is not None:
+            quit_driver(self._driver)
@@ -0,0 +1,108 @@
+import datetime
+import logging
+import threading
+
+from data_extraction.Websites.url_index import normalize_url
+
+# Format of the publication date shown on the listing cards of a site, only these
+# sites have a watermark (Bayt and MarocAnnonces show the date on the job page only)
+LISTING_DATE_FORMATS = {
+    "rekrute": "%d/%m/%Y",
+    "emploi": "%Y-%m-%d",
+}
+
+
+class EarlyStop:
+    """Stops the pagination of an incremental crawl once it reaches the offers collected by the previous runs.
+
+    The result pages are sorted newest first, the crawl stops after `known_streak`
+    consecutive cards already in the url index, after a page whose cards are all in
+    the index, or after a page whose cards were all published before the watermark of
+    the site (newest publication date seen by the previous runs).
+
+    url_index: the url index of the scraper, its source selects the date format
+
+    known_streak: number of consecutive known cards ending the crawl
+
+    use_watermark: also stop on the publication date watermark when the site has one
+
+    enabled: false for a full crawl, the cards are still observed to move the watermark
+
+    fresh: normalized urls collected by the current run (e.g. by another search keyword of the crawl),
+    they are in the url index but do not count as known
+    """
+
+    def __init__(
+        self, url_index, known_streak=20, use_watermark=True, enabled=True, fresh=None
+    ):
+        self.url_index = url_index
+        self.fresh = fresh if fresh is not None else set()
+        self.known_streak = known_streak
+        self.enabled = enabled
+        self.date_format = LISTING_DATE_FORMATS.get(url_index.source)
+        self.watermark = (
+            url_index.get_watermark() if use_watermark and self.date_format else None
+        )
+        self.newest = None
+        self.streak = 0
+        self.reason = None
+        self._lock = threading.Lock()
+
+    @property
+    def stopped(self) -> bool:
+        return self.reason is not None
+
+    def parse_date(self, text):
+        try:
+            return datetime.datetime.strptime(
+                text.strip()[:10], self.date_format
+            ).date()
+        except (AttributeError, TypeError, ValueError):
+            return None
+
+    def observe(self, cards: list) -> bool:
+        """Records the cards of a result page before they are filtered, in page order.
+        Returns true when the crawl should stop after this page.
+
+        cards: dictionaries with the job_url and, when shown on the listing, the publication_date
+        """
+        with self._lock:
+            dates = []
+            if self.date_format:
+                dates = [
+                    self.parse_date(card.get("publication_date")) for card in cards
+                ]
+                dates = [date for date in dates if date]
+            if dates and (self.newest is None or max(dates) > self.newest):
+                self.newest = max(dates)
+            if not self.enabled or self.stopped or not cards:
+                return self.stopped
+
+            # A card without a link (missing on the listing) tells nothing about the page
+            urls = [card.get("job_url") for card in cards if card.get("job_url")]
+            known = [
+                url in self.url_index and normalize_url(url) not in self.fresh
+                for url in urls
+            ]
+            for is_known in known:
+                self.streak = self.streak + 1 if is_known else 0
+            if known and all(known):
+                self.reason = "every offer of the page is already collected"
+            elif self.streak >= self.known_streak:
+                self.reason = f"{self.streak} consecutive offers already collected"
+            elif (
+                self.watermark
+                and len(dates) == len(cards)
+                and max(dates) < self.watermark
+            ):
+                self.reason = f"every offer of the page is older than {self.watermark}"
+            if self.reason:
+                logging.info(
+                    f"{self.url_index.source}: incremental stop, {self.reason}"
+                )
+            return self.stopped
+
+    def save(self):
+        """Moves the watermark of the site to the newest publication date seen by this run"""
+        if self.newest and (self.watermark is None or self.newest > self.watermark):
+            self.url_index.set_watermark(self.newest)
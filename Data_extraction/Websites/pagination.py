@@ -0,0 +1,117 @@
+import logging
+import queue
+import threading
+import time
+
+from data_extraction.Websites.ratelimit import RateLimiter
+
+_domain_slots = {}
+_domain_lock = threading.Lock()
+
+
+def domain_slots(domain: str) -> threading.BoundedSemaphore:
+    """Returns the semaphore limiting the concurrent page loads on the domain.
+
+    Its size is the max_concurrency of the rate limiter policy of the domain: the
+    maximum number of pages loaded at the same time by one process, shared by all
+    the crawls running in it (e.g. the threads of a Celery worker)"""
+    with _domain_lock:
+        if domain not in _domain_slots:
+            _domain_slots[domain] = threading.BoundedSemaphore(
+                RateLimiter.policy(domain)["max_concurrency"]
+            )
+        return _domain_slots[domain]
+
+
+def crawl_pages(
+    domain: str,
+    pages: list,
+    extract,
+    workers=1,
+    shared=None,
+    open_worker=None,
+    close_worker=None,
+    stop=None,
+):
+    """Splits the pages of a site between several workers, each with its own driver or fetcher.
+
+    The workers pull the pages from a common queue so a slow page never holds back
+    the others. `extract` is expected to accept the new offers through the url index
+    of the site: `UrlIndex.add` is atomic, an offer listed on two pages is only kept
+    by the first worker that adds it. Returns the offers in page order.
+
+    domain: host of the site, the page loads are capped by `domain_slots`
+
+    pages: the pages to crawl, page numbers or urls as expected by `extract`
+
+    extract: function (worker, page) returning the new offers of the page
+
+    workers: number of concurrent workers, at most one per page
+
+    shared: driver or fetcher already opened by the caller, used by the first worker and not closed
+
+    open_worker: function creating the driver or fetcher of an additional worker
+
+    close_worker: function releasing what `open_worker` created
+
+    stop: function returning true once the remaining pages are not needed (incremental
+    crawl), the pages already being loaded are finished
+    """
+    workers = max(1, min(workers, len(pages)))
+    if shared is None and open_worker is None:
+        raise ValueError("crawl_pages needs a shared worker or an open_worker function")
+    if open_worker is None:
+        workers = 1
+
+    todo = queue.Queue()
+    for position, page in enumerate(pages):
+        todo.put((position, page))
+    results = [None] * len(pages)
+    slots = domain_slots(domain)
+
+    def run(number):
+        own = not (number == 0 and shared is not None)
+        try:
+            worker = open_worker() if own else shared
+        except Exception as e:
+            logging.error(f"{domain}: worker {number} could not start: {e}")
+            return
+        try:
+            while stop is None or not stop():
+                try:
+                    position, page = todo.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    with slots:
+                        results[position] = extract(worker, page)
+                except Exception as e:
+                    logging.exception(f"{domain}: page {page} failed: {e}")
+                    results[position] = []
+        finally:
+            if own and close_worker is not None:
+                close_worker(worker)
+
+    start = time.perf_counter()
+    threads = [
+        threading.Thread(target=run, args=(number,), name=f"{domain}-{number}")
+        for number in range(workers)
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    missed = [page for page, result in zip(pages, results) if result is None]
+    if missed and stop is not None and stop():
+        logging.info(f"{domain}: crawl stopped early, {len(missed)} pages skipped")
+    elif missed:
+        logging.warning(f"{domain}: {len(missed)} pages not crawled, no worker left")
+    logging.info(
+        f"{domain}: {len(pages) - len(missed)} pages crawled by {workers} workers "
+        f"in {elapsed:.1f}s ({(len(pages) - len(missed)) / elapsed:.2f} pages/s)"
+        if elapsed
+        else f"{domain}: no page crawled"
+    )
+    return [offer for result in results if result for offer in result]
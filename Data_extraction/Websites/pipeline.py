@@ -0,0 +1,146 @@
+import logging
+import queue
+import threading
+import time
+
+# Put on the queue once per consumer when the producer is done
+_DONE = object()
+
+
+class PipelineStats:
+    """Queue depth and throughput of a listing/detail pipeline"""
+
+    def __init__(self, site: str, queue_size: int, report_every=20):
+        self.site = site
+        self.queue_size = queue_size
+        self.report_every = report_every
+        self.queued = 0
+        self.processed = 0
+        self.kept = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.depth_total = 0
+        self.start = time.perf_counter()
+        self.producer_seconds = None
+        self._lock = threading.Lock()
+
+    def record_put(self, depth: int):
+        with self._lock:
+            self.queued += 1
+            self.max_depth = max(self.max_depth, depth)
+
+    def record_done(self, kept: bool, depth: int, failed=False):
+        with self._lock:
+            self.processed += 1
+            self.kept += kept
+            self.failed += failed
+            self.depth_total += depth
+            report = self.processed % self.report_every == 0
+        if report:
+            logging.info(
+                f"{self.site}: {self.processed}/{self.queued} details processed, "
+                f"queue depth {depth}/{self.queue_size}, "
+                f"{self.processed / self.elapsed():.2f} details/s"
+            )
+
+    def elapsed(self) -> float:
+        return max(time.perf_counter() - self.start, 1e-9)
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {
+                "queued": self.queued,
+                "processed": self.processed,
+                "kept": self.kept,
+                "failed": self.failed,
+                "max_queue_depth": self.max_depth,
+                "mean_queue_depth": self.depth_total / self.processed
+                if self.processed
+                else 0.0,
+                "producer_seconds": self.producer_seconds,
+                "seconds": self.elapsed(),
+                "details_per_second": self.processed / self.elapsed(),
+            }
+
+    def log_report(self, logger=logging):
+        summary = self.summary()
+        logger.info(
+            f"{self.site}: {summary['kept']} offers kept out of {summary['processed']} details, "
+            f"{summary['details_per_second']:.2f} details/s, "
+            f"queue depth max {summary['max_queue_depth']} / mean {summary['mean_queue_depth']:.1f}"
+            + (f", {summary['failed']} failed" if summary["failed"] else "")
+        )
+
+
+def run_pipeline(
+    site: str,
+    produce,
+    consume,
+    workers: list,
+    sink=None,
+    queue_size=50,
+    stats=None,
+):
+    """Runs the listing pages and the detail pages of a site at the same time.
+
+    The producer runs in the calling thread and pushes the items it finds on a bounded
+    queue, it blocks while the queue is full so the listing never runs far ahead of
+    the details. One consumer thread per worker pops the items, the records they return
+    are written to the sink as they come. An item whose consume or write raises is logged
+    and counted as failed, its consumer goes on draining the queue. Returns the records in
+    completion order.
+
+    produce: function (put) calling put(item) for every item found on the listing pages
+
+    consume: function (worker, item) returning the record of the item, None to drop it
+
+    workers: the driver or fetcher of each consumer, opened by the caller
+
+    sink: NdjsonSink receiving the records, see `open_sink`
+
+    queue_size: maximum number of items waiting for a consumer
+
+    stats: PipelineStats to fill, a new one is created by default
+    """
+    items = queue.Queue(maxsize=queue_size)
+    stats = stats or PipelineStats(site, queue_size)
+    records = []
+    records_lock = threading.Lock()
+
+    def put(item):
+        items.put(item)
+        stats.record_put(items.qsize())
+
+    def run_consumer(worker):
+        while True:
+            item = items.get()
+            if item is _DONE:
+                return
+            failed = False
+            try:
+                record = consume(worker, item)
+                if record is not None and sink is not None:
+                    sink.write(record)
+            except Exception as e:
+                logging.exception(f"{site}: detail failed for {item}: {e}")
+                record, failed = None, True
+            if record is not None:
+                with records_lock:
+                    records.append(record)
+            stats.record_done(record is not None, items.qsize(), failed)
+
+    consumers = [
+        threading.Thread(target=run_consumer, args=(worker,), name=f"{site}-detail-{n}")
+        for n, worker in enumerate(workers)
+    ]
+    for consumer in consumers:
+        consumer.start()
+    try:
+        produce(put)
+    finally:
+        stats.producer_seconds = stats.elapsed()
+        for _ in consumers:
+            items.put(_DONE)
+        for consumer in consumers:
+            consumer.join()
+    return records
@@ -0,0 +1,268 @@
+"""Pool of the HTTP proxies of checked_proxies.txt, ranked by health.
+
+    python -m data_extraction.Websites.proxies [--write]
+
+checks every proxy of the file and prints the live ones from best to worst, --write
+keeps only the live ones in the file. The scrapers use the pool when SCRAPER_PROXIES=1.
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import threading
+import time
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+PROXY_FILE = os.path.join(os.path.dirname(current_dir), "checked_proxies.txt")
+
+# Off by default, the drivers and sessions then connect directly
+ENABLED = os.environ.get("SCRAPER_PROXIES", "0") == "1"
+
+# A proxy is checked by opening an HTTPS tunnel to a scraped site, as the scrapers do
+CHECK_TARGET = ("www.rekrute.com", 443)
+CHECK_TIMEOUT = 8
+CHECK_CONCURRENCY = 50
+RECHECK_SECONDS = 600
+MAX_FAILURES = 3  # consecutive failed requests evicting a proxy until its next check
+LATENCY_SMOOTHING = 0.3  # weight of the last latency in the moving average
+
+
+def load_proxies(path=PROXY_FILE) -> list:
+    """host:port lines of the file, blank lines and comments skipped"""
+    with open(path, encoding="utf-8") as f:
+        lines = (line.strip() for line in f)
+        return [line for line in lines if line and not line.startswith("#")]
+
+
+async def check_proxy(proxy: str, target=CHECK_TARGET, timeout=CHECK_TIMEOUT):
+    """Opens a CONNECT tunnel through the proxy, returns its latency in seconds or None if it fails"""
+    host, port = proxy.rsplit(":", 1)
+    start = time.perf_counter()
+    writer = None
+    try:
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(host, int(port)), timeout
+        )
+        writer.write(
+            f"CONNECT {target[0]}:{target[1]} HTTP/1.1\r\n"
+            f"Host: {target[0]}:{target[1]}\r\n\r\n".encode()
+        )
+        await writer.drain()
+        status = await asyncio.wait_for(reader.readline(), timeout)
+        if status.split()[1:2] != [b"200"]:
+            return None
+        return time.perf_counter() - start
+    except (OSError, ValueError, asyncio.TimeoutError):
+        return None
+    finally:
+        if writer is not None:
+            writer.close()
+
+
+class ProxyHealth:
+    """Track record of a proxy, from the health checks and the requests of the scrapers"""
+
+    def __init__(self, proxy: str):
+        self.proxy = proxy
+        self.successes = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None
+        self.assigned = 0
+        self.evicted = False
+
+    @property
+    def score(self) -> float:
+        """Smoothed success rate divided by the latency, higher is better"""
+        rate = (self.successes + 1) / (self.successes + self.failures + 2)
+        latency = self.latency if self.latency is not None else CHECK_TIMEOUT
+        return rate / (1 + latency)
+
+    def record(self, ok: bool, latency=None):
+        if ok:
+            self.successes += 1
+            self.consecutive_failures = 0
+        else:
+            self.failures += 1
+            self.consecutive_failures += 1
+        if latency is not None:
+            self.latency = (
+                latency
+                if self.latency is None
+                else LATENCY_SMOOTHING * latency
+                + (1 - LATENCY_SMOOTHING) * self.latency
+            )
+
+
+class ProxyPool:
+    """Proxies shared by the drivers and HTTP sessions of a process, chosen by health.
+
+    A proxy failing its health check is evicted, as is a proxy whose last `max_failures`
+    requests failed. The evicted proxies are checked again with the others every
+    RECHECK_SECONDS (see `start_rechecks`) and come back once they pass.
+
+    proxies: "host:port" of the proxies
+
+    target: (host, port) the health checks open a tunnel to
+    """
+
+    def __init__(self, proxies: list, max_failures=MAX_FAILURES, target=CHECK_TARGET):
+        self.max_failures = max_failures
+        self.target = target
+        self.health = {proxy: ProxyHealth(proxy) for proxy in proxies}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    @classmethod
+    def from_file(cls, path=PROXY_FILE, **kwargs):
+        return cls(load_proxies(path), **kwargs)
+
+    async def _check_many(self, proxies, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+
+        async def check(proxy):
+            async with semaphore:
+                return await check_proxy(proxy, self.target)
+
+        return await asyncio.gather(*(check(proxy) for proxy in proxies))
+
+    def check(self, proxies=None, concurrency=CHECK_CONCURRENCY) -> int:
+        """Checks the proxies (all by default) concurrently and records the results.
+        Returns the number of live proxies"""
+        proxies = list(proxies or self.health)
+        start = time.perf_counter()
+        latencies = asyncio.run(self._check_many(proxies, concurrency))
+        for proxy, latency in zip(proxies, latencies):
+            self.record(proxy, latency is not None, latency, checked=True)
+        alive = len(self.alive())
+        logging.info(
+            f"Proxies: {alive}/{len(self.health)} alive after checking {len(proxies)} "
+            f"in {time.perf_counter() - start:.1f}s"
+        )
+        return alive
+
+    def record(self, proxy: str, ok: bool, latency=None, checked=False):
+        """Records a request made through the proxy, or a health check if checked"""
+        with self._lock:
+            health = self.health.get(proxy)
+            if health is None:
+                return
+            health.record(ok, latency)
+            if checked and ok and health.evicted:
+                health.evicted = False
+                logging.info(f"Proxy {proxy} is back")
+            elif (
+                not health.evicted
+                and not ok
+                and (checked or health.consecutive_failures >= self.max_failures)
+            ):
+                health.evicted = True
+                if not checked:
+                    logging.warning(
+                        f"Proxy {proxy} evicted after {health.consecutive_failures} failures"
+                    )
+
+    def is_alive(self, proxy: str) -> bool:
+        health = self.health.get(proxy)
+        return health is not None and not health.evicted
+
+    def alive(self) -> list:
+        """Live proxies, best first"""
+        with self._lock:
+            ranked = sorted(
+                (health for health in self.health.values() if not health.evicted),
+                key=lambda health: health.score,
+                reverse=True,
+            )
+        return [health.proxy for health in ranked]
+
+    def assign(self):
+        """Proxy for a new driver or session, drawn at random weighted by score and less
+        likely the more drivers and sessions already use it. None if every proxy is dead"""
+        with self._lock:
+            candidates = [h for h in self.health.values() if not h.evicted]
+            if not candidates:
+                return None
+            weights = [h.score / (1 + h.assigned) for h in candidates]
+            health = random.choices(candidates, weights=weights)[0]
+            health.assigned += 1
+            return health.proxy
+
+    def release(self, proxy: str):
+        """The driver or session using the proxy is closed"""
+        with self._lock:
+            health = self.health.get(proxy)
+            if health is not None and health.assigned:
+                health.assigned -= 1
+
+    def start_rechecks(self, interval=RECHECK_SECONDS):
+        """Checks every proxy again every interval seconds in a background thread"""
+        if self._thread is not None:
+            return
+
+        def run():
+            while not self._stop.wait(interval):
+                try:
+                    self.check()
+                except Exception as e:
+                    logging.warning(f"Proxy check failed: {e}")
+
+        self._thread = threading.Thread(target=run, name="proxy-checks", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+def proxy_pool() -> ProxyPool:
+    """Pool shared by the scrapers of the process, loaded and checked on first use"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProxyPool.from_file()
+            _pool.check()
+            _pool.start_rechecks()
+        return _pool
+
+
+def assign_proxy():
+    """Proxy for a new driver or session, None when the proxies are disabled or all dead"""
+    if not ENABLED:
+        return None
+    return proxy_pool().assign()
+
+
+def release_proxy(proxy):
+    if ENABLED and proxy:
+        proxy_pool().release(proxy)
+
+
+def report_proxy(proxy, ok: bool, latency=None):
+    """Records the outcome of a request made through the proxy, if any"""
+    if ENABLED and proxy:
+        proxy_pool().record(proxy, ok, latency)
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Check the proxies of the pool")
+    parser.add_argument(
+        "--write", action="store_true", help="keep only the live proxies in the file"
+    )
+    args = parser.parse_args()
+
+    pool = ProxyPool.from_file()
+    pool.check()
+    alive = pool.alive()
+    for proxy in alive:
+        print(f"{proxy:<24}{pool.health[proxy].latency:.2f}s")
+    if args.write:
+        with open(PROXY_FILE, "w", encoding="utf-8") as f:
+            f.writelines(f"{proxy}\n" for proxy in alive)
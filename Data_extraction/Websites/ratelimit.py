@@ -0,0 +1,363 @@
+import logging
+import os
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+
+import redis
+
+# Shared by the Celery workers and the scrapers started by hand, the limits of a
+# domain apply to all of them. Without Redis each process keeps its own limits
+REDIS_URL = os.environ.get("SCRAPER_REDIS_URL", "redis://redis:6379/0")
+KEY_PREFIX = "scraper:ratelimit"
+
+SITE_DOMAINS = {
+    "rekrute": "www.rekrute.com",
+    "emploi": "www.emploi.ma",
+    "marocannonces": "www.marocannonces.com",
+    "bayt": "www.bayt.com",
+}
+
+# Starting concurrency and delay between two requests of each domain, for all the
+# workers together. The controller moves them between min_delay and max_concurrency
+# as the site answers, an answer slower than target_latency (seconds) is a sign of load
+DOMAIN_POLICIES = {
+    "www.rekrute.com": {
+        "concurrency": 4,
+        "max_concurrency": 8,
+        "delay": 0.5,
+        "min_delay": 0.1,
+        "target_latency": 3.0,
+    },
+    "www.emploi.ma": {
+        "concurrency": 4,
+        "max_concurrency": 8,
+        "delay": 0.5,
+        "min_delay": 0.1,
+        "target_latency": 3.0,
+    },
+    "www.marocannonces.com": {
+        "concurrency": 2,
+        "max_concurrency": 4,
+        "delay": 1.0,
+        "min_delay": 0.25,
+        "target_latency": 4.0,
+    },
+    # Anti-bot protection, the site is approached slowly
+    "www.bayt.com": {
+        "concurrency": 2,
+        "max_concurrency": 4,
+        "delay": 2.0,
+        "min_delay": 0.5,
+        "target_latency": 6.0,
+    },
+}
+DEFAULT_POLICY = {
+    "concurrency": 2,
+    "max_concurrency": 4,
+    "delay": 1.0,
+    "min_delay": 0.25,
+    "target_latency": 4.0,
+}
+
+MAX_DELAY = 60.0
+DELAY_STEP = 0.05  # removed from the delay after each fast answer
+POLL_SECONDS = 0.1  # wait before retrying when every slot of the domain is taken
+LEASE_SECONDS = 300  # a slot not released by then (killed worker) is taken back
+STATE_SECONDS = 86400  # the state of an idle domain is forgotten after a day
+
+
+def adjust(state: dict, policy: dict, outcome: str, latency: float) -> dict:
+    """New concurrency and delay of a domain after a request, additive increase and multiplicative decrease
+
+    outcome: "ok", "throttled" (429/403/captcha) or "error" (network failure, which says
+    nothing about the load of the site and leaves the state unchanged)
+    """
+    limit, delay = state["limit"], state["delay"]
+    if outcome == "throttled":
+        limit = max(1.0, limit / 2)
+        delay = min(MAX_DELAY, delay * 2)
+    elif outcome == "ok" and latency > policy["target_latency"]:
+        limit = max(1.0, limit * 0.8)
+        delay = min(MAX_DELAY, delay * 1.25)
+    elif outcome == "ok":
+        limit = min(policy["max_concurrency"], limit + 1 / limit)
+        delay = max(policy["min_delay"], delay - DELAY_STEP)
+    return {"limit": limit, "delay": delay}
+
+
+class LocalBackend:
+    """State of the domains kept in the process, used when Redis is not reachable"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._states = {}
+        self._leases = {}
+
+    def _state(self, domain, policy):
+        return self._states.setdefault(
+            domain,
+            {
+                "limit": float(policy["concurrency"]),
+                "delay": policy["delay"],
+                "next_at": 0.0,
+            },
+        )
+
+    def try_acquire(self, domain, policy, lease) -> float:
+        with self._lock:
+            now = time.time()
+            state = self._state(domain, policy)
+            leases = self._leases.setdefault(domain, {})
+            for expired in [key for key, expiry in leases.items() if expiry < now]:
+                del leases[expired]
+            if len(leases) >= int(state["limit"]):
+                return POLL_SECONDS
+            if now < state["next_at"]:
+                return state["next_at"] - now
+            leases[lease] = now + LEASE_SECONDS
+            state["next_at"] = now + state["delay"]
+            return 0.0
+
+    def release(self, domain, policy, lease, update):
+        with self._lock:
+            self._leases.get(domain, {}).pop(lease, None)
+            state = self._state(domain, policy)
+            state.update(update(state, time.time()))
+
+    def state(self, domain, policy) -> dict:
+        with self._lock:
+            return dict(self._state(domain, policy))
+
+
+# Takes a slot of the domain when one is free and its delay has passed, in one step so
+# that two workers never take the last slot. Returns the seconds to wait otherwise
+ACQUIRE_SCRIPT = """
+local t = redis.call("TIME")
+local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+redis.call("ZREMRANGEBYSCORE", KEYS[2], "-inf", now)
+local state = redis.call("HMGET", KEYS[1], "limit", "delay", "next_at")
+local limit = tonumber(state[1]) or tonumber(ARGV[3])
+local delay = tonumber(state[2]) or tonumber(ARGV[4])
+local next_at = tonumber(state[3]) or 0
+if redis.call("ZCARD", KEYS[2]) >= math.floor(limit) then
+    return ARGV[5]
+end
+if now < next_at then
+    return tostring(next_at - now)
+end
+redis.call("ZADD", KEYS[2], now + tonumber(ARGV[2]), ARGV[1])
+redis.call("HSET", KEYS[1], "limit", tostring(limit), "delay", tostring(delay), "next_at", tostring(now + delay))
+redis.call("EXPIRE", KEYS[1], ARGV[6])
+redis.call("EXPIRE", KEYS[2], ARGV[6])
+return "0"
+"""
+
+
+class RedisBackend:
+    """State of the domains in Redis: a hash with the concurrency, the delay and the time of
+    the next request, and a sorted set of the slots in use with their expiry"""
+
+    def __init__(self, client: redis.Redis):
+        self.client = client
+        self._acquire = client.register_script(ACQUIRE_SCRIPT)
+
+    @staticmethod
+    def keys(domain):
+        return f"{KEY_PREFIX}:{domain}", f"{KEY_PREFIX}:{domain}:leases"
+
+    def try_acquire(self, domain, policy, lease) -> float:
+        return float(
+            self._acquire(
+                keys=self.keys(domain),
+                args=[
+                    lease,
+                    LEASE_SECONDS,
+                    policy["concurrency"],
+                    policy["delay"],
+                    POLL_SECONDS,
+                    STATE_SECONDS,
+                ],
+            )
+        )
+
+    def _read(self, client, key, policy):
+        limit, delay, next_at = client.hmget(key, "limit", "delay", "next_at")
+        return {
+            "limit": float(limit or policy["concurrency"]),
+            "delay": float(delay or policy["delay"]),
+            "next_at": float(next_at or 0.0),
+        }
+
+    def release(self, domain, policy, lease, update):
+        key, leases = self.keys(domain)
+        self.client.zrem(leases, lease)
+
+        def apply(pipe):
+            seconds, microseconds = pipe.time()
+            changes = update(
+                self._read(pipe, key, policy), seconds + microseconds / 1e6
+            )
+            pipe.multi()
+            pipe.hset(
+                key, mapping={name: str(value) for name, value in changes.items()}
+            )
+            pipe.expire(key, STATE_SECONDS)
+
+        # Retried when another worker changes the state of the domain in the meantime
+        self.client.transaction(apply, key)
+
+    def state(self, domain, policy) -> dict:
+        return self._read(self.client, self.keys(domain)[0], policy)
+
+
+class Slot:
+    """Request in flight on a domain, the caller reports how the site answered"""
+
+    def __init__(self):
+        self.outcome = "ok"
+        self.retry_after = None
+
+    def throttled(self, retry_after=None):
+        """The site refused the request (429/403, captcha), retry_after in seconds if it said when to come back"""
+        self.outcome = "throttled"
+        self.retry_after = retry_after
+
+    def failed(self):
+        self.outcome = "error"
+
+
+class RateLimiter:
+    """Politeness scheduler of the scrapers, one controller per domain.
+
+    Every request takes a slot of its domain: it waits while as many requests as the
+    current concurrency are in flight, and until the delay since the previous request
+    has passed. Fast answers raise the concurrency by 1/concurrency and lower the delay
+    by DELAY_STEP, refused requests halve the concurrency and double the delay, slow
+    answers lower the concurrency and raise the delay by a quarter.
+
+    backend: LocalBackend or RedisBackend holding the state of the domains
+    """
+
+    def __init__(self, backend=None):
+        self.backend = backend or LocalBackend()
+        self._lock = threading.Lock()
+        self._stats = {}
+
+    @staticmethod
+    def policy(domain: str) -> dict:
+        return DOMAIN_POLICIES.get(domain, DEFAULT_POLICY)
+
+    def _call(self, method: str, domain: str, *args):
+        try:
+            return getattr(self.backend, method)(domain, self.policy(domain), *args)
+        except redis.RedisError as e:
+            logging.warning(
+                f"Rate limiter: Redis unavailable ({e}), limits kept in this process from now on"
+            )
+            self.backend = LocalBackend()
+            return getattr(self.backend, method)(domain, self.policy(domain), *args)
+
+    def _count(self, domain: str, name: str, value=1):
+        with self._lock:
+            stats = self._stats.setdefault(
+                domain, {"requests": 0, "throttled": 0, "waited": 0.0}
+            )
+            stats[name] += value
+
+    @contextmanager
+    def slot(self, domain: str):
+        """Waits for a slot of the domain and holds it during the request.
+        An exception raised by the request counts as a network failure."""
+        lease = uuid.uuid4().hex
+        start = time.perf_counter()
+        while (wait := self._call("try_acquire", domain, lease)) > 0:
+            time.sleep(min(wait, 5.0))
+        self._count(domain, "waited", time.perf_counter() - start)
+        self._count(domain, "requests")
+
+        slot = Slot()
+        start = time.perf_counter()
+        try:
+            yield slot
+        except Exception:
+            slot.failed()
+            raise
+        finally:
+            latency = time.perf_counter() - start
+            if slot.outcome == "throttled":
+                self._count(domain, "throttled")
+                logging.warning(
+                    f"{domain}: request refused, slowing down"
+                    + (f" for {slot.retry_after}s" if slot.retry_after else "")
+                )
+
+            def update(state, now):
+                changes = adjust(state, self.policy(domain), slot.outcome, latency)
+                if slot.retry_after:
+                    changes["next_at"] = max(state["next_at"], now + slot.retry_after)
+                return changes
+
+            self._call("release", domain, lease, update)
+
+    def state(self, domain: str) -> dict:
+        """Current concurrency and delay of the domain"""
+        return self._call("state", domain)
+
+    def log_report(self, domain: str, logger=logging):
+        with self._lock:
+            stats = dict(self._stats.get(domain, {}))
+        if not stats:
+            return
+        state = self.state(domain)
+        logger.info(
+            f"{domain}: {stats['requests']} requests, {stats['throttled']} refused, "
+            f"{stats['waited']:.1f}s waiting for a slot, "
+            f"concurrency {state['limit']:.1f}, delay {state['delay']:.2f}s"
+        )
+
+
+def connect_backend():
+    """Redis backend when the server answers, local backend otherwise"""
+    try:
+        client = redis.Redis.from_url(
+            REDIS_URL, socket_connect_timeout=1, socket_timeout=5
+        )
+        client.ping()
+        return RedisBackend(client)
+    except redis.RedisError as e:
+        logging.warning(
+            f"Rate limiter: Redis unreachable at {REDIS_URL} ({e}), limits kept in this process"
+        )
+        return LocalBackend()
+
+
+_limiter = None
+_limiter_lock = threading.Lock()
+
+
+def rate_limiter() -> RateLimiter:
+    """Limiter shared by the scrapers of the process, connected on first use"""
+    global _limiter
+    with _limiter_lock:
+        if _limiter is None:
+            _limiter = RateLimiter(connect_backend())
+        return _limiter
+
+
+def reset_limiter(backend=None) -> RateLimiter:
+    """Replaces the limiter of the process, by one keeping its limits in the process by default.
+    For the benchmarks, whose requests must not share the limits of the real sites"""
+    global _limiter
+    with _limiter_lock:
+        _limiter = RateLimiter(backend)
+        return _limiter
+
+
+def retry_after(response):
+    """Seconds given by the Retry-After header of a response, None when absent or a date"""
+    try:
+        return float(response.headers.get("Retry-After"))
+    except (TypeError, ValueError):
+        return None
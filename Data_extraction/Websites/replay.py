@@ -0,0 +1,139 @@
+"""Re-extracts the offers from the html snapshots of the scrapers, without a browser.
+
+    python -m data_extraction.Websites.replay --site bayt --since 2025-01-01 --workers 8
+
+The offers are written to scraping_output/replay/replay_<site>.json, one offer per job
+url (the most recent fetch wins), so a fixed parser can rebuild the history of a site.
+"""
+
+import argparse
+import datetime
+import logging
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from data_extraction.Websites import MarocAnn, Rekrute, bayt, emploi, validate_many
+from data_extraction.Websites.snapshots import SNAPSHOT_DIR, SnapshotStore, load_object
+from data_extraction.Websites.storage import NdjsonSink, segments_dir
+
+REPLAY_DIR = os.path.join(os.path.dirname(SNAPSHOT_DIR), "replay")
+
+
+def replay_rekrute_listing(url, html, fetched_at):
+    return [Rekrute.build_offer(card) for card in Rekrute.parse_listing(html)]
+
+
+def replay_emploi_listing(url, html, fetched_at):
+    return [emploi.build_job(card) for card in emploi.parse_listing(html)]
+
+
+def replay_bayt_detail(url, html, fetched_at):
+    card = bayt.parse_detail(html)
+    if not card["titre"]:
+        return []
+    # Relative dates ("3 days ago") count from the fetch of the page, not from the replay
+    offer = bayt.build_job_details(card, datetime.datetime.fromisoformat(fetched_at))
+    offer["job_url"] = url
+    return [offer]
+
+
+def replay_marocannonces_detail(url, html, fetched_at):
+    offer = MarocAnn.parse_detail(html)
+    if offer is None:
+        return []
+    offer["job_url"] = url
+    return [offer]
+
+
+# Pages holding the offers of each site, the Bayt and MarocAnnonces listings only hold links
+REPLAYERS = {
+    ("rekrute", "listing"): replay_rekrute_listing,
+    ("emploi", "listing"): replay_emploi_listing,
+    ("bayt", "detail"): replay_bayt_detail,
+    ("marocannonces", "detail"): replay_marocannonces_detail,
+}
+
+
+def replay_snapshot(root, snapshot):
+    """Runs the parser of a snapshot, executed in the worker processes"""
+    site, kind, url, fetched_at, digest = snapshot
+    try:
+        html = load_object(root, digest)
+        return site, fetched_at, REPLAYERS[site, kind](url, html, fetched_at), None
+    except Exception as e:
+        return site, fetched_at, [], f"{url} ({fetched_at}): {e}"
+
+
+def replay(site=None, since=None, until=None, workers=None, root=SNAPSHOT_DIR):
+    """Re-extracts the offers of the snapshots in parallel and writes one dataset per site.
+    Returns the number of offers written per site.
+
+    site: only replay this site, by default all of them
+
+    since, until: ISO dates bounding the fetch time of the snapshots
+
+    workers: number of processes, one per core by default
+    """
+    with SnapshotStore(root) as store:
+        snapshots = [
+            snapshot
+            for snapshot in store.query(site=site, since=since, until=until)
+            if (snapshot[0], snapshot[1]) in REPLAYERS
+        ]
+    logging.info(f"Replaying {len(snapshots)} snapshots")
+
+    # Most recent offer of each url, the snapshots come oldest first
+    latest = {}
+    errors = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        results = executor.map(
+            partial(replay_snapshot, root),
+            snapshots,
+            chunksize=max(1, len(snapshots) // (4 * (workers or os.cpu_count() or 1))),
+        )
+        for snapshot_site, fetched_at, offers, error in results:
+            if error:
+                errors += 1
+                logging.warning(f"Replay failed for {error}")
+            for offer in offers:
+                # Collected when the page was fetched, not when it is replayed
+                offer["collect_date"] = fetched_at
+                latest[snapshot_site, offer.get("job_url")] = offer
+
+    counts = {}
+    os.makedirs(REPLAY_DIR, exist_ok=True)
+    for replay_site in [site] if site else sorted({key[0] for key in REPLAYERS}):
+        path = os.path.join(REPLAY_DIR, f"replay_{replay_site}.json")
+        # A replay replaces the previous one, even when no snapshot of the site is left
+        shutil.rmtree(segments_dir(path), ignore_errors=True)
+        if os.path.isfile(path):
+            os.remove(path)
+        offers = [offer for key, offer in latest.items() if key[0] == replay_site]
+        counts[replay_site] = len(offers)
+        if not offers:
+            logging.info(f"{replay_site}: no offer replayed")
+            continue
+        invalid = sum(1 for errors_of in validate_many(offers) if errors_of)
+        with NdjsonSink(path, batch_size=1000) as sink:
+            sink.write_many(offers)
+        logging.info(
+            f"{replay_site}: {len(offers)} offers replayed to {path}, {invalid} invalid"
+        )
+    if errors:
+        logging.warning(f"{errors} snapshots could not be replayed")
+    return counts
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(message)s")
+    parser = argparse.ArgumentParser(
+        description="Re-extract the offers from the html snapshots"
+    )
+    parser.add_argument("--site", choices=sorted({site for site, _ in REPLAYERS}))
+    parser.add_argument("--since", help="first fetch date, e.g. 2025-01-01")
+    parser.add_argument("--until", help="fetch date excluded, e.g. 2025-06-01")
+    parser.add_argument("--workers", type=int, help="number of processes")
+    args = parser.parse_args()
+    replay(args.site, args.since, args.until, args.workers)
@@ -0,0 +1,88 @@
+import re
+
+
+def _labels(groups: dict) -> dict:
+    """Key of each label, a key has one label or a list of them"""
+    return {
+        label: key
+        for key, labels in groups.items()
+        for label in ([labels] if isinstance(labels, str) else labels)
+    }
+
+
+def _pattern(template: str, labels: dict, flags: int):
+    """Compiles the template with the labels as alternatives of its label group, None without labels"""
+    if not labels:
+        return None
+    return re.compile(template.format("|".join(map(re.escape, labels))), flags)
+
+
+class SectionParser:
+    """Splits the text of a job page into sections and reads its labelled fields.
+
+    The headers, fields and line labels of a site are compiled into one pattern each
+    when the parser is created, so a parser is built once per site at import time and
+    each text is scanned once per pattern.
+
+    headers: section key -> header variants. A line starting with a variant opens the
+    section, the first line of the text never does. The text of a section starts with
+    its header line, a repeated section keeps its last occurrence
+
+    fields: field key -> label. The value of "label : value", the first occurrence wins
+
+    line_labels: field key -> label. The value is the line following a line equal to the label
+
+    intro: key of the text before the first header
+
+    flags: re flags of the patterns, e.g. re.IGNORECASE
+    """
+
+    def __init__(
+        self, headers=None, fields=None, line_labels=None, intro="intro", flags=0
+    ):
+        self.intro = intro
+        header_labels = _labels(headers or {})
+        field_labels = _labels(fields or {})
+        line_labels = _labels(line_labels or {})
+        self._headers = _pattern(r"\n(?=(?P<label>{}))", header_labels, flags)
+        self._fields = _pattern(
+            r"(?P<label>{})\s*:\s*(?P<value>.+)", field_labels, flags
+        )
+        self._lines = _pattern(
+            r"^(?P<label>{})\n(?P<value>.*)$", line_labels, flags | re.MULTILINE
+        )
+        # Key of a matched label, looked up lowercased since the patterns may ignore the case
+        self._keys = {
+            label.lower(): key
+            for label, key in (header_labels | field_labels | line_labels).items()
+        }
+
+    def sections(self, text: str) -> dict:
+        """Text of each section, stripped, starting with the intro"""
+        parsed = {}
+        key, start = self.intro, 0
+        if self._headers is not None:
+            for match in self._headers.finditer(text):
+                parsed[key] = text[start : match.start()].strip()
+                key = self._keys[match.group("label").lower()]
+                start = match.end()
+        parsed[key] = text[start:].strip()
+        return parsed
+
+    def fields(self, text: str) -> dict:
+        """Value of the first occurrence of each field and line label found in the text"""
+        found = {}
+        for pattern in (self._fields, self._lines):
+            if pattern is None:
+                continue
+            for match in pattern.finditer(text):
+                label, value = match.group("label", "value")
+                found.setdefault(self._keys[label.lower()], value.strip())
+        return found
+
+    def parse(self, text: str) -> dict:
+        return {"sections": self.sections(text), "fields": self.fields(text)}
+
+    def parse_many(self, texts) -> list:
+        """Parses a batch of texts, for the replay of snapshots and the benchmarks"""
+        return [self.parse(text) for text in texts]
@@ -0,0 +1,151 @@
+import datetime
+import gzip
+import hashlib
+import logging
+import os
+import sqlite3
+import threading
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+SNAPSHOT_DIR = os.path.join(
+    os.path.dirname(current_dir), "scraping_output", "snapshots"
+)
+
+# Set SCRAPER_SNAPSHOTS=0 to crawl without keeping the html of the pages
+ENABLED = os.environ.get("SCRAPER_SNAPSHOTS", "1") != "0"
+
+
+def object_path(root: str, digest: str) -> str:
+    return os.path.join(root, "objects", digest[:2], digest[2:] + ".html.gz")
+
+
+def load_object(root: str, digest: str) -> str:
+    """Reads the html stored under the hash, without opening the manifest"""
+    with open(object_path(root, digest), "rb") as f:
+        return gzip.decompress(f.read()).decode("utf-8")
+
+
+class SnapshotStore:
+    """Compressed, content-addressed store of the html pages fetched by the scrapers.
+
+    Each page is gzipped under the sha256 of its html, a page fetched several times
+    without change is stored once. The manifest (sqlite) records every fetch: site,
+    kind of page ("listing" or "detail"), url, fetch time and the hash of its html.
+
+    root: directory of the store, the objects and the manifest live under it
+    """
+
+    def __init__(self, root: str = SNAPSHOT_DIR):
+        self.root = root
+        os.makedirs(os.path.join(root, "objects"), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(
+            os.path.join(root, "manifest.sqlite3"), timeout=30, check_same_thread=False
+        )
+        # Several worker processes may write to the manifest at the same time
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS snapshots (
+                site TEXT NOT NULL,
+                kind TEXT NOT NULL,
+                url TEXT NOT NULL,
+                fetched_at TEXT NOT NULL,
+                sha256 TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            "CREATE INDEX IF NOT EXISTS snapshots_site ON snapshots (site, kind, fetched_at)"
+        )
+        self._conn.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def object_path(self, digest: str) -> str:
+        return object_path(self.root, digest)
+
+    def save(self, site: str, kind: str, url: str, html: str, fetched_at=None) -> str:
+        """Stores the html of a fetched page and returns its hash"""
+        data = html.encode("utf-8")
+        digest = hashlib.sha256(data).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(gzip.compress(data, compresslevel=6, mtime=0))
+            os.replace(tmp_path, path)
+        fetched_at = fetched_at or datetime.datetime.now().isoformat(timespec="seconds")
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT INTO snapshots VALUES (?, ?, ?, ?, ?)",
+                (site, kind, url, fetched_at, digest),
+            )
+        return digest
+
+    def load(self, digest: str) -> str:
+        return load_object(self.root, digest)
+
+    def query(self, site=None, kind=None, since=None, until=None) -> list:
+        """Returns the fetches matching the filters as (site, kind, url, fetched_at, sha256) tuples, oldest first
+
+        since, until: ISO dates or datetimes bounding the fetch time
+        """
+        clauses, params = [], []
+        for clause, value in (
+            ("site = ?", site),
+            ("kind = ?", kind),
+            ("fetched_at >= ?", since),
+            ("fetched_at < ?", until),
+        ):
+            if value:
+                clauses.append(clause)
+                params.append(value)
+        where = f"WHERE {' AND '.join(clauses)}" if clauses else ""
+        with self._lock:
+            return self._conn.execute(
+                f"SELECT site, kind, url, fetched_at, sha256 FROM snapshots {where} "
+                "ORDER BY fetched_at",
+                params,
+            ).fetchall()
+
+    def close(self):
+        self._conn.close()
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def default_store() -> SnapshotStore:
+    """Store shared by the scrapers of the process, opened on first use"""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = SnapshotStore()
+        return _store
+
+
+def save_snapshot(site: str, kind: str, url: str, html: str):
+    """Keeps the html of a fetched page, a failure is logged and never stops the crawl"""
+    if not ENABLED or not html:
+        return
+    try:
+        default_store().save(site, kind, url, html)
+    except Exception as e:
+        logging.warning(f"Snapshot of {url} not saved: {e}")
+
+
+def save_page_source(site: str, kind: str, url: str, driver):
+    """Keeps the html of the page currently displayed by the driver"""
+    if not ENABLED:
+        return
+    try:
+        html = driver.page_source
+    except Exception as e:
+        logging.warning(f"Snapshot of {url} not saved: {e}")
+        return
+    save_snapshot(site, kind, url, html)
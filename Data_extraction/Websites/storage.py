@@ -0,0 +1,175 @@
+import datetime
+import itertools
+import json
+import logging
+import os
+import threading
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+OUTPUT_DIR = os.path.join(os.path.dirname(current_dir), "scraping_output")
+
+SEGMENT_SUFFIX = ".ndjson"
+
+
+def segments_dir(dataset_path: str) -> str:
+    """Returns the directory holding the ndjson segments of a dataset.
+
+    A dataset is addressed by the path of its historical json file, e.g
+    scraping_output/offres_emploi_bayt.json, its segments are stored next to it
+    in scraping_output/offres_emploi_bayt/
+    """
+    return os.path.splitext(dataset_path)[0]
+
+
+def list_datasets(directory: str = OUTPUT_DIR) -> list:
+    """Returns the paths of all the datasets found in the directory, legacy json files and segment folders alike"""
+    names = set()
+    for entry in os.listdir(directory):
+        full = os.path.join(directory, entry)
+        if entry.lower().endswith(".json") and os.path.isfile(full):
+            names.add(entry)
+        elif os.path.isdir(full) and any(
+            f.endswith(SEGMENT_SUFFIX) for f in os.listdir(full)
+        ):
+            names.add(entry + ".json")
+    return [os.path.join(directory, name) for name in sorted(names)]
+
+
+def _salvage_json_array(text: str, path: str) -> list:
+    """Recovers the offers of a json array that no longer parses (e.g. left with merge conflict markers).
+    Every object starting at the beginning of a line is decoded on its own, broken ones are skipped.
+    """
+    decoder = json.JSONDecoder()
+    records, seen = [], set()
+    position = 0
+    while (position := text.find("{", position)) != -1:
+        line_start = text.rfind("\n", 0, position) + 1
+        if text[line_start:position].strip():
+            position += 1
+            continue
+        try:
+            record, end = decoder.raw_decode(text, position)
+        except json.JSONDecodeError:
+            position += 1
+            continue
+        key = json.dumps(record, sort_keys=True, ensure_ascii=False)
+        if key not in seen:
+            seen.add(key)
+            records.append(record)
+        position = end
+    logging.warning(f"{path} is not valid json, {len(records)} offers salvaged")
+    return records
+
+
+def _read_legacy(path: str) -> list:
+    with open(path, "r", encoding="utf-8") as js_file:
+        text = js_file.read()
+    if not text.strip():
+        return []
+    try:
+        data = json.loads(text)
+    except json.JSONDecodeError:
+        return _salvage_json_array(text, path)
+    return data if isinstance(data, list) else [data]
+
+
+def read_dataset(dataset_path: str):
+    """Iterates over all the offers of a dataset: the legacy json array first, then the ndjson segments in write order.
+
+    dataset_path: path of the json file of the dataset, it does not need to exist
+    """
+    if os.path.isfile(dataset_path):
+        yield from _read_legacy(dataset_path)
+    directory = segments_dir(dataset_path)
+    if not os.path.isdir(directory):
+        return
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith(SEGMENT_SUFFIX):
+            continue
+        with open(os.path.join(directory, name), "r", encoding="utf-8") as segment:
+            for line_number, line in enumerate(segment, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield json.loads(line)
+                except json.JSONDecodeError:
+                    logging.error(f"Invalid line {line_number} in segment {name}")
+
+
+class NdjsonSink:
+    """Append-only writer of a dataset. Records are buffered and written as immutable ndjson segments,
+    each segment is written to a temporary file, fsynced then renamed so readers never see a partial write.
+
+    dataset_path: path of the json file of the dataset (see `segments_dir`)
+
+    batch_size: number of records per segment, i.e. how many records share one fsync
+
+    on_flush: function called with the records of each segment once it is on disk
+    """
+
+    _sequence = itertools.count()
+
+    def __init__(self, dataset_path: str, batch_size: int = 100, on_flush=None):
+        self.dataset_path = dataset_path
+        self.directory = segments_dir(dataset_path)
+        self.batch_size = batch_size
+        self.on_flush = on_flush
+        self.written = 0
+        self._buffer = []
+        self._lock = threading.Lock()
+        os.makedirs(self.directory, exist_ok=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def write(self, record: dict):
+        """Buffers the record. A record without collect_date is stamped with the time it is written,
+        the relative publication dates are counted from it (see dates.normalize_date)"""
+        record.setdefault(
+            "collect_date", datetime.datetime.now().isoformat(timespec="seconds")
+        )
+        with self._lock:
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def write_many(self, records):
+        for record in records:
+            self.write(record)
+
+    def flush(self):
+        """Writes the buffered records as a new segment"""
+        with self._lock:
+            records, self._buffer = self._buffer, []
+            if not records:
+                return
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M%S_%f")
+            name = f"{timestamp}-{os.getpid()}-{next(self._sequence):06d}"
+            tmp_path = os.path.join(self.directory, f".{name}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as segment:
+                for record in records:
+                    segment.write(json.dumps(record, ensure_ascii=False) + "\n")
+                segment.flush()
+                os.fsync(segment.fileno())
+            os.replace(tmp_path, os.path.join(self.directory, name + SEGMENT_SUFFIX))
+            self._fsync_directory()
+            self.written += len(records)
+        if self.on_flush is not None:
+            self.on_flush(records)
+
+    def close(self):
+        self.flush()
+
+    def _fsync_directory(self):
+        # Makes the rename itself durable, not supported on windows
+        if not hasattr(os, "O_DIRECTORY"):
+            return
+        fd = os.open(self.directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
@@ -0,0 +1,156 @@
+import datetime
+import logging
+import os
+import sqlite3
+import threading
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+current_dir = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_INDEX_PATH = os.path.join(
+    os.path.dirname(current_dir), "scraping_output", "url_index.sqlite3"
+)
+
+# Query parameters that only track the visit and never identify an offer
+TRACKING_PARAMS = ("utm_", "xtor", "fbclid", "gclid")
+
+
+def normalize_url(job_url: str) -> str:
+    """Returns the canonical form of a job url used as the index key.
+
+    The scheme and host are lower-cased, the fragment, tracking parameters and
+    trailing slash are dropped and the remaining query parameters are sorted.
+    """
+    if not job_url:
+        return ""
+    parts = urlsplit(job_url.strip())
+    query = sorted(
+        (key, value)
+        for key, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith(TRACKING_PARAMS)
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urlunsplit(
+        (parts.scheme.lower(), parts.netloc.lower(), path, urlencode(query), "")
+    )
+
+
+class UrlIndex:
+    """On-disk index of the job urls already collected, shared by all the scrapers.
+
+    The whole table is loaded once in memory so membership checks are O(1), new
+    urls are kept pending until `commit` is called (usually right after the
+    offers have been saved) so that a crash never marks unsaved offers as seen.
+
+    source: the name of the website using the index, recorded with the urls it adds.
+    An url is a single key across the sources: `url in index` and `add` both see the
+    urls collected by every scraper.
+
+    path: location of the sqlite database
+    """
+
+    def __init__(self, source: str, path: str = DEFAULT_INDEX_PATH):
+        self.source = source
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS job_urls (
+                url TEXT PRIMARY KEY,
+                source TEXT NOT NULL,
+                first_seen TEXT NOT NULL
+            )"""
+        )
+        self._conn.execute(
+            """CREATE TABLE IF NOT EXISTS watermarks (
+                source TEXT PRIMARY KEY,
+                published TEXT NOT NULL
+            )"""
+        )
+        self._conn.commit()
+        self._urls = dict(self._conn.execute("SELECT url, source FROM job_urls"))
+        self._pending = []
+
+    def __contains__(self, job_url):
+        key = normalize_url(job_url)
+        with self._lock:
+            return key in self._urls
+
+    def __len__(self):
+        """Number of urls collected by the source, pending ones included"""
+        with self._lock:
+            (saved,) = self._conn.execute(
+                "SELECT COUNT(*) FROM job_urls WHERE source = ?", (self.source,)
+            ).fetchone()
+            return saved + len(self._pending)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def add(self, job_url: str) -> bool:
+        """Marks the url as collected. Returns false if it was already in the index"""
+        key = normalize_url(job_url)
+        if not key:
+            return False
+        with self._lock:
+            if key in self._urls:
+                return False
+            self._urls[key] = self.source
+            self._pending.append(
+                (
+                    key,
+                    self.source,
+                    datetime.datetime.now().isoformat(timespec="seconds"),
+                )
+            )
+        return True
+
+    def seed(self, offers: list) -> int:
+        """Adds the urls of already saved offers, used to build the index from the old json files"""
+        added = sum(self.add(offer.get("job_url", "")) for offer in offers)
+        self.commit()
+        if added:
+            logging.info(f"Url index seeded with {added} urls for {self.source}")
+        return added
+
+    def get_watermark(self):
+        """Returns the newest publication date collected for the source by the previous runs, None if unknown"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT published FROM watermarks WHERE source = ?", (self.source,)
+            ).fetchone()
+        return datetime.date.fromisoformat(row[0]) if row else None
+
+    def set_watermark(self, published: datetime.date):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO watermarks VALUES (?, ?)",
+                (self.source, published.isoformat()),
+            )
+
+    def commit(self, job_urls=None):
+        """Writes the pending urls to disk in a single transaction
+
+        job_urls: only write these urls (offers just saved), the others stay pending
+        """
+        with self._lock:
+            if job_urls is None:
+                pending, self._pending = self._pending, []
+            else:
+                keys = {normalize_url(job_url) for job_url in job_urls}
+                pending = [entry for entry in self._pending if entry[0] in keys]
+                self._pending = [
+                    entry for entry in self._pending if entry[0] not in keys
+                ]
+            if pending:
+                with self._conn:
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO job_urls VALUES (?, ?, ?)", pending
+                    )
+
+    def close(self):
+        self.commit()
+        self._conn.close()
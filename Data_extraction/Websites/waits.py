@@ -0,0 +1,78 @@
+import logging
+import threading
+import time
+
+from selenium.common.exceptions import TimeoutException
+from selenium.webdriver.support.ui import WebDriverWait
+
+
+class WaitStats:
+    """Counts the explicit waits of a scraper and the time they cost, per label.
+    The stats of a site module are shared by its crawls: each crawl starts with `reset`.
+
+    site: name of the scraper, used in the report
+
+    health: SelectorHealth of the running crawl, told about every wait (set by the crawl engine)
+    """
+
+    def __init__(self, site: str):
+        self.site = site
+        self.health = None
+        self._lock = threading.Lock()
+        self._labels = {}
+
+    def record(self, label: str, seconds: float, timed_out: bool):
+        with self._lock:
+            stats = self._labels.setdefault(
+                label, {"waits": 0, "timeouts": 0, "seconds": 0.0}
+            )
+            stats["waits"] += 1
+            stats["timeouts"] += timed_out
+            stats["seconds"] += seconds
+        health = self.health
+        if health is not None:
+            health.record("wait", label, not timed_out)
+
+    def reset(self):
+        """Forgets the waits recorded so far"""
+        with self._lock:
+            self._labels = {}
+
+    def total_seconds(self) -> float:
+        return sum(stats["seconds"] for stats in self._labels.values())
+
+    def summary(self) -> dict:
+        with self._lock:
+            return {label: dict(stats) for label, stats in self._labels.items()}
+
+    def log_report(self, logger=logging):
+        logger.info(
+            f"{self.site}: {self.total_seconds():.1f} seconds spent in explicit waits"
+        )
+        for label, stats in sorted(
+            self.summary().items(), key=lambda item: -item[1]["seconds"]
+        ):
+            logger.info(
+                f"{self.site}: wait '{label}' x{stats['waits']}, "
+                f"{stats['timeouts']} timeouts, {stats['seconds']:.1f} seconds"
+            )
+
+
+def wait_until(
+    driver, condition, timeout: float, stats: WaitStats = None, label="wait"
+):
+    """Explicit wait to be used only at page-ready points, the time spent is recorded in stats.
+    Raises TimeoutException like WebDriverWait.until.
+
+    label: name of the wait in the report, usually the awaited selector
+    """
+    start = time.perf_counter()
+    timed_out = False
+    try:
+        return WebDriverWait(driver, timeout).until(condition)
+    except TimeoutException:
+        timed_out = True
+        raise
+    finally:
+        if stats is not None:
+            stats.record(label, time.perf_counter() - start, timed_out)
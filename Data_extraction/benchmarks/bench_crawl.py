@@ -0,0 +1,274 @@
+"""End-to-end benchmark of the crawl of each site, offline against the mock job sites.
+
+Usage (from the project root):
+    python -m data_extraction.benchmarks.bench_crawl [--sites rekrute bayt] [--pages 10]
+        [--latency 0.05] [--jitter 0.02] [--throttle-rate 0.05] [--layout-fault-rate 0.02]
+        [--policy open|site]
+
+The real adapters run through the crawl engine against mock_sites.MockSites: HTTP
+fetcher, rate limiter, workers, detail pipeline, url index, checkpoint and dataset, the
+last three in a temporary directory. Chrome is not started: the search forms Rekrute
+and Bayt fill in the browser are replaced by the search urls of the mock, and a page
+the scrapers would open in the browser is downloaded again, its ready selector looked
+up in the html instead of waited for.
+
+Reports the pages and offers per second and the p50/p99 latency of a page, waiting for
+the rate limiter included. "--policy site" keeps the politeness limits of the real
+sites, "open" (default) lifts them to measure the scrapers themselves. The selector
+that tripped the breaker of a site, if any, is shown (see health.SelectorHealth). Without
+faults, a site collecting fewer offers than the mock lists fails the benchmark.
+"""
+
+import argparse
+import logging
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from data_extraction.Websites import (
+    MarocAnn,
+    Rekrute,
+    bayt,
+    emploi,
+    http_fetch,
+    ratelimit,
+    snapshots,
+)
+from data_extraction.Websites.crawler import RETRIES, SiteAdapter, crawl
+from data_extraction.Websites.health import SelectorCircuitOpen
+from data_extraction.Websites.http_fetch import parse_html
+
+from .mock_sites import MockSites
+
+# Limits of every domain with --policy open
+OPEN_POLICY = {
+    "concurrency": 16,
+    "max_concurrency": 16,
+    "delay": 0.0,
+    "min_delay": 0.0,
+    "target_latency": 30.0,
+}
+
+
+class Clock:
+    """Durations of the pages fetched by the workers of a crawl"""
+
+    def __init__(self):
+        self.samples = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def measure(self):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            with self._lock:
+                self.samples.append(time.perf_counter() - start)
+
+    def percentile(self, q: int) -> float:
+        if len(self.samples) < 2:
+            return self.samples[0] if self.samples else 0.0
+        return statistics.quantiles(self.samples, n=100)[q - 1]
+
+
+class Offline:
+    """Adapter of a site running against the mock sites, its pages timed by `clock`"""
+
+    pages = 10
+    clock = None
+
+    def browse(self, fetcher, url, ready=None, kind="listing"):
+        # No browser in the benchmark: the page is downloaded as the browser would show it,
+        # without the checks of the HTTP mode, and its ready selector counted like a wait
+        for _ in range(RETRIES + 1):
+            with fetcher.timed("browser") as slot:
+                response = fetcher.session.get(url, timeout=fetcher.timeout)
+                if response.status_code in http_fetch.BLOCKED_STATUS:
+                    slot.throttled(http_fetch.retry_after(response))
+                    continue
+            found = ready is None or parse_html(response.text).select_one(ready)
+            if self.wait_stats is not None:
+                self.wait_stats.record(ready or "page", 0.0, not found)
+            return response.text if found else None
+        return None
+
+    def fetch_listing(self, fetcher, keyword, page):
+        with self.clock.measure():
+            return super().fetch_listing(fetcher, keyword, page)
+
+    def fetch_detail(self, fetcher, card):
+        with self.clock.measure():
+            return self.detail_page(fetcher, card)
+
+    def detail_page(self, fetcher, card):
+        return super().fetch_detail(fetcher, card)
+
+
+class BenchRekrute(Offline, Rekrute.RekruteAdapter):
+    def list_pages(self, fetcher, cursor, keyword):
+        # Urls of the pagination select the browser reads after the search
+        return [
+            f"/fr/offres.html?s=1&p={page}&o=1" for page in range(1, self.pages + 1)
+        ]
+
+
+class BenchEmploi(Offline, emploi.EmploiAdapter):
+    pass
+
+
+class BenchMarocAnn(Offline, MarocAnn.MarocAnnAdapter):
+    pass
+
+
+class BenchBayt(Offline, bayt.BaytAdapter):
+    def __init__(self):
+        super().__init__(detail_workers=0)
+
+    def open(self, fetcher, cursor):
+        # Neither search form nor cookie banner, the search pages are those of the mock
+        self.main_pages = cursor.setdefault("main_pages", {})
+
+    def list_pages(self, fetcher, cursor, keyword):
+        slug = keyword.replace(" ", "-")
+        self.main_pages[keyword] = f"https://www.bayt.com/en/morocco/jobs/{slug}-jobs/"
+        return list(range(1, self.pages + 1))
+
+    def detail_page(self, fetcher, card):
+        return SiteAdapter.fetch_detail(self, fetcher, card)
+
+
+BENCH_ADAPTERS = {
+    "rekrute": BenchRekrute,
+    "emploi": BenchEmploi,
+    "marocannonces": BenchMarocAnn,
+    "bayt": BenchBayt,
+}
+
+
+def run_site(site, mock, args, directory):
+    """Crawls the site on the mock, returns the row of the report"""
+    adapter = BENCH_ADAPTERS[site]()
+    adapter.pages, adapter.clock, adapter.output_directory = (
+        args.pages,
+        Clock(),
+        directory,
+    )
+    ratelimit.reset_limiter()
+    start = time.perf_counter()
+    breaker = ""
+    try:
+        offers = crawl(
+            adapter,
+            fetch_mode="http",
+            workers=args.workers,
+            detail_workers=args.detail_workers,
+            incremental=False,
+            keywords=args.keywords,
+        )
+    except SelectorCircuitOpen as e:
+        offers = e.offers
+        breaker = (
+            f"{e.report['tripped_by']['check']} '{e.report['tripped_by']['selector']}'"
+        )
+    seconds = time.perf_counter() - start
+    pages = len(adapter.clock.samples)
+    served = {
+        status: sum(
+            count
+            for (host_site, _, code), count in mock.counts.items()
+            if host_site == site and code == status
+        )
+        for status in (429, "layout fault")
+    }
+    return {
+        "site": site,
+        "pages": pages,
+        "offers": len(offers),
+        "expected": args.pages * mock.offers_per_page(site),
+        "seconds": seconds,
+        "pages_per_second": pages / seconds,
+        "offers_per_second": len(offers) / seconds,
+        "p50_ms": adapter.clock.percentile(50) * 1000,
+        "p99_ms": adapter.clock.percentile(99) * 1000,
+        "throttled": served[429],
+        "layout_faults": served["layout fault"],
+        "breaker": breaker,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "--sites",
+        nargs="+",
+        choices=sorted(BENCH_ADAPTERS),
+        default=sorted(BENCH_ADAPTERS),
+    )
+    parser.add_argument(
+        "--pages", type=int, default=10, help="listing pages per search"
+    )
+    parser.add_argument("--keywords", nargs="+", default=["data"])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--detail-workers", type=int, default=4)
+    parser.add_argument(
+        "--latency", type=float, default=0.02, help="seconds per answer"
+    )
+    parser.add_argument("--jitter", type=float, default=0.0, help="mean extra seconds")
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--layout-fault-rate", type=float, default=0.0)
+    parser.add_argument("--policy", choices=["open", "site"], default="open")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--verbose", action="store_true", help="show the crawl logs")
+    args = parser.parse_args()
+    if not args.verbose:
+        # Also the validation errors, the fixtures of MarocAnnonces list their extras
+        logging.disable(logging.ERROR)
+
+    snapshots.ENABLED = False
+    if args.policy == "open":
+        for domain in ratelimit.SITE_DOMAINS.values():
+            ratelimit.DOMAIN_POLICIES[domain] = OPEN_POLICY
+
+    mock = MockSites(
+        pages=args.pages,
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        layout_fault_rate=args.layout_fault_rate,
+        seed=args.seed,
+    )
+    rows = []
+    with mock, tempfile.TemporaryDirectory(prefix="bench_crawl_") as directory:
+        http_fetch.ORIGIN = mock.url
+        print(
+            f"mock sites on {mock.url}: {args.pages} pages per search, latency "
+            f"{args.latency}s + {args.jitter}s, 429 {args.throttle_rate:.0%}, "
+            f"layout faults {args.layout_fault_rate:.0%}, policy {args.policy}"
+        )
+        print(
+            f"{'site':<15}{'pages':>7}{'offers':>14}{'seconds':>9}{'pages/s':>9}"
+            f"{'offers/s':>10}{'p50 ms':>9}{'p99 ms':>9}{'429':>6}{'faults':>8}  breaker"
+        )
+        for site in args.sites:
+            row = run_site(site, mock, args, directory)
+            rows.append(row)
+            print(
+                f"{site:<15}{row['pages']:>7}{row['offers']:>7}/{row['expected']:<6}"
+                f"{row['seconds']:>9.2f}{row['pages_per_second']:>9.1f}"
+                f"{row['offers_per_second']:>10.1f}{row['p50_ms']:>9.1f}"
+                f"{row['p99_ms']:>9.1f}{row['throttled']:>6}{row['layout_faults']:>8}  {row['breaker']}"
+            )
+
+    faults = args.throttle_rate or args.layout_fault_rate
+    failed = [row["site"] for row in rows if row["offers"] < row["expected"]]
+    if failed and not faults:
+        print(f"FAILED offers missing for {', '.join(failed)}")
+    sys.exit(1 if failed and not faults else 0)
+
+
+if __name__ == "__main__":
+    main()
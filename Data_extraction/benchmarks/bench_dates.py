@@ -0,0 +1,178 @@
+"""Benchmark of the normalization of the publication dates of the offers.
+
+Usage (from the project root):
+    python -m data_extraction.benchmarks.bench_dates [--repeat 5] [--scale 20]
+
+The dates are those of the scraped datasets plus the relative dates Bayt shows, repeated
+`scale` times to the size of a processing run. They are normalized by the previous
+implementation of the processing scripts (one chain of regexes and strptime per record),
+by dates.normalize_date per record and by dates.normalize_dates on the whole column.
+A past date the previous implementation read and the engine reads differently fails the benchmark.
+"""
+
+import argparse
+import datetime
+import logging
+import re
+import sys
+import time
+
+import pandas as pd
+
+from data_extraction.Websites import load_json
+from data_extraction.Websites.dates import normalize_date, normalize_dates
+
+MONTHS = {
+    "janvier": 1,
+    "février": 2,
+    "mars": 3,
+    "avril": 4,
+    "mai": 5,
+    "juin": 6,
+    "juillet": 7,
+    "août": 8,
+    "septembre": 9,
+    "octobre": 10,
+    "novembre": 11,
+    "décembre": 12,
+    "january": 1,
+    "february": 2,
+    "march": 3,
+    "april": 4,
+    "may": 5,
+    "june": 6,
+    "july": 7,
+    "august": 8,
+    "september": 9,
+    "october": 10,
+    "november": 11,
+    "december": 12,
+}
+MONTHS.update({k[:3]: v for k, v in MONTHS.items()})
+
+DATASETS = [
+    "offres_emploi_bayt.json",
+    "offres_marocannonces.json",
+    "offres_emploi_emploi.json",
+    "offres_emploi_rekrute.json",
+]
+
+
+def legacy_normalize_date(s):
+    # Previous implementation of gemini process/process_gemini.py, relative to the processing time
+    if not s or not isinstance(s, str):
+        return None
+    key = s.strip().lower()
+    today = datetime.datetime.now()
+    if "aujourd" in key or "today" in key:
+        return today.strftime("%Y-%m-%d")
+    if "hier" in key or "yesterday" in key:
+        return (today - datetime.timedelta(days=1)).strftime("%Y-%m-%d")
+    match_relative = re.search(
+        r"(\d+)\s+(jour|jours|day|days|semaine|semaines|week|weeks|mois|month|months)\s+ago",
+        key,
+    )
+    if match_relative:
+        num = int(match_relative.group(1))
+        unit = match_relative.group(2)
+        if "jour" in unit or "day" in unit:
+            return (today - datetime.timedelta(days=num)).strftime("%Y-%m-%d")
+        elif "semaine" in unit or "week" in unit:
+            return (today - datetime.timedelta(weeks=num)).strftime("%Y-%m-%d")
+        elif "mois" in unit or "month" in unit:
+            return (today - datetime.timedelta(days=num * 30)).strftime("%Y-%m-%d")
+    formats = [
+        "%Y-%m-%d",
+        "%d-%m-%Y",
+        "%d/%m/%Y",
+        "%Y/%m/%d",
+        "%b %d, %Y",
+        "%B %d, %Y",
+        "%d %b %Y",
+        "%d %B %Y",
+    ]
+    for fmt in formats:
+        try:
+            return datetime.datetime.strptime(s, fmt).strftime("%Y-%m-%d")
+        except ValueError:
+            pass
+    match_month_time = re.match(r"(\d{1,2})\s+([A-Za-z]+)(-\d{1,2}:\d{2})?", s)
+    if match_month_time:
+        day = int(match_month_time.group(1))
+        month_num = MONTHS.get(match_month_time.group(2).lower())
+        if month_num:
+            try:
+                return datetime.datetime(today.year, month_num, day).strftime(
+                    "%Y-%m-%d"
+                )
+            except ValueError:
+                pass
+    return None
+
+
+def dataset_dates():
+    """Publication dates of the datasets, and the relative dates shown by Bayt"""
+    dates = [
+        offer.get("publication_date")
+        for name in DATASETS
+        for offer in load_json(name)
+        if isinstance(offer, dict)
+    ]
+    dates += [f"{n} days ago" for n in range(1, 30)] + ["yesterday", "today"]
+    return dates
+
+
+def measure(label, function, dates, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = list(function(dates))
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<30} {len(dates) / best:>12.0f} dates/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--scale", type=int, default=20)
+    args = parser.parse_args()
+    logging.disable(logging.WARNING)
+
+    dates = dataset_dates() * args.scale
+    print(f"{len(dates)} dates, {len(set(map(str, dates)))} distinct")
+    expected = measure(
+        "legacy", lambda d: [legacy_normalize_date(x) for x in d], dates, args.repeat
+    )
+    per_record = measure(
+        "normalize_date", lambda d: [normalize_date(x) for x in d], dates, args.repeat
+    )
+    column = measure(
+        "normalize_dates (column)",
+        lambda d: normalize_dates(pd.Series(d)),
+        dates,
+        args.repeat,
+    )
+
+    # The previous implementation put the dates without a year in the current year, even
+    # after today: the engine takes the last occurrence, those differences are the fix
+    today = datetime.date.today().isoformat()
+    mismatches = {
+        (text, old, new)
+        for text, old, new in zip(dates, expected, per_record)
+        if old is not None and old <= today and old != new
+    }
+    mismatches |= {
+        (text, new, vectorized)
+        for text, new, vectorized in zip(dates, per_record, column)
+        if new != vectorized
+    }
+    recovered = sum(1 for old, new in zip(expected, per_record) if old is None and new)
+    print(f"{recovered} dates read by the engine only")
+    for text, old, new in sorted(mismatches, key=str):
+        print(f"FAILED {text!r}: {old} != {new}")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
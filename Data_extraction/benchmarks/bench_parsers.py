@@ -0,0 +1,98 @@
+"""Benchmark of the html parsers of the sites, on the pages saved in benchmarks/fixtures.
+
+Usage (from the project root):
+    python -m data_extraction.benchmarks.bench_parsers [--repeat 20] [--parser lxml]
+
+The fixtures are named <site>_<kind>_*.html, kind being "listing" or "detail", and
+reproduce the markup the parsers read on each site. expected.json holds the number of
+records each fixture must give, a parser change that loses records fails the benchmark.
+To add a real page, copy it from the snapshot store (see snapshots.load_object).
+"""
+
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+from data_extraction.Websites import MarocAnn, Rekrute, bayt, emploi, http_fetch
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Records of a page: the offers of a listing, the offer of a detail page, or the
+# links of a listing when the site only shows them (Bayt, MarocAnnonces)
+PARSERS = {
+    ("rekrute", "listing"): lambda html: [
+        Rekrute.build_offer(card) for card in Rekrute.parse_listing(html)
+    ],
+    ("emploi", "listing"): lambda html: [
+        emploi.build_job(card) for card in emploi.parse_listing(html)
+    ],
+    ("bayt", "listing"): bayt.parse_listing,
+    ("bayt", "detail"): lambda html: [bayt.build_job_details(bayt.parse_detail(html))],
+    ("marocannonces", "listing"): MarocAnn.parse_listing,
+    ("marocannonces", "detail"): lambda html: [
+        offer for offer in [MarocAnn.parse_detail(html)] if offer is not None
+    ],
+}
+
+
+def load_fixtures(site, kind):
+    pages = {}
+    for path in sorted(glob.glob(os.path.join(FIXTURES_DIR, f"{site}_{kind}*.html"))):
+        with open(path, encoding="utf-8") as f:
+            pages[os.path.basename(path)] = f.read()
+    return pages
+
+
+def measure(parse, pages, repeat):
+    """Best time over `repeat` runs of the parser on every page, and the records of each page"""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        counts = {name: len(parse(html)) for name, html in pages.items()}
+        best = min(best, time.perf_counter() - start)
+    return best, counts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument(
+        "--parser",
+        choices=["html.parser", "lxml"],
+        default=http_fetch.HTML_PARSER,
+        help=f"tree builder of BeautifulSoup, {http_fetch.HTML_PARSER} by default",
+    )
+    args = parser.parse_args()
+    http_fetch.HTML_PARSER = args.parser
+
+    with open(os.path.join(FIXTURES_DIR, "expected.json"), encoding="utf-8") as f:
+        expected = json.load(f)
+
+    failures = []
+    print(f"parser: {args.parser}")
+    print(f"{'site':<15}{'kind':<9}{'pages':>6}{'ms/page':>10}{'records/s':>12}")
+    for (site, kind), parse in PARSERS.items():
+        pages = load_fixtures(site, kind)
+        if not pages:
+            continue
+        seconds, counts = measure(parse, pages, args.repeat)
+        records = sum(counts.values())
+        print(
+            f"{site:<15}{kind:<9}{len(pages):>6}{1000 * seconds / len(pages):>10.2f}"
+            f"{records / seconds:>12.0f}"
+        )
+        failures += [
+            f"{name}: {count} records, {expected[name]} expected"
+            for name, count in counts.items()
+            if name in expected and count != expected[name]
+        ]
+    for failure in failures:
+        print(f"FAILED {failure}")
+    sys.exit(1 if failures else 0)
+
+
+if __name__ == "__main__":
+    main()
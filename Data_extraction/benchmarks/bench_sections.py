@@ -0,0 +1,187 @@
+"""Benchmark of the section parsers of the Bayt and MarocAnnonces job pages.
+
+Usage (from the project root):
+    python -m data_extraction.benchmarks.bench_sections [--repeat 5]
+
+The job page texts are rebuilt from the offers already scraped (the datasets keep the
+sections, not the page text), then parsed by the previous implementations and by the
+shared SectionParser. Any offer parsed differently is reported and fails the benchmark.
+"""
+
+import argparse
+import re
+import sys
+import time
+
+from data_extraction.Websites import MarocAnn, bayt, load_json
+
+
+def legacy_normalize_header(header, header_keywords):
+    header = header.lower().strip()
+    for norm, variations in header_keywords.items():
+        if any(header.startswith(v) for v in variations):
+            return norm
+    return header
+
+
+def legacy_text_segmentation(job_offer_details):
+    # Previous implementation: the split pattern is rebuilt and recompiled for every text
+    header_keywords = {
+        "description": ["Job description", "job description", "description"],
+        "competences": ["Competences", "competences", "skills", "required skills"],
+    }
+    all_keywords = [kw for group in header_keywords.values() for kw in group]
+    regex_pattern = r"\n(?=({}))".format("|".join(map(re.escape, all_keywords)))
+    sections = re.split(regex_pattern, job_offer_details, flags=re.IGNORECASE)
+    parsed_sections = {"intro": sections[0].strip()}
+    for i in range(1, len(sections), 2):
+        header = sections[i]
+        content = sections[i + 1] if i + 1 < len(sections) else ""
+        key = legacy_normalize_header(header, header_keywords)
+        parsed_sections[key] = content.strip()
+    return parsed_sections
+
+
+def legacy_parse_details_text(text):
+    # Previous implementation: one re.search per field and list.index scans of the lines
+    details = {"via": "Maroc_annonces"}
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    text_joined = "\n".join(lines)
+    if len(lines) >= 2:
+        details["titre"] = lines[0]
+        details["region"] = lines[1]
+    for line in lines:
+        if line.startswith("Publiée le:"):
+            details["publication_date"] = line.split("Publiée le:")[1].strip()
+
+    def extract_block(pattern):
+        match = re.search(pattern, text_joined, re.DOTALL)
+        return match.group(1).strip().split("\n") if match else []
+
+    description = re.search(r"Annonce N°:.*\n(.*?)\nMissions :", text_joined, re.DOTALL)
+    if description:
+        details["description"] = description.group(1).strip()
+    missions = extract_block(r"Missions\s*:\s*\n(.*?)\nProfil requis\s*:")
+    profil = extract_block(r"Profil requis\s*:\s*\n(.*?)(Domaine\s*:|$)")
+    details["extra"] = [
+        item.strip("- ").strip() for item in missions + profil if item.strip()
+    ]
+    fields = [
+        "Domaine",
+        "Fonction",
+        "Contrat",
+        "companie",
+        "Salaire",
+        "Niveau_etudes",
+        "Ville",
+    ]
+    for field in fields:
+        match = re.search(rf"{field}\s*:\s*(.+)", text_joined)
+        if match:
+            details[field.lower().replace(" ", "_")] = match.group(1).strip()
+
+    def get_next_line_value(label):
+        try:
+            idx = lines.index(label)
+            return lines[idx + 1] if idx + 1 < len(lines) else None
+        except ValueError:
+            return None
+
+    annonceur = get_next_line_value("Annonceur :")
+    telephone = get_next_line_value("Téléphone :")
+    if annonceur:
+        details["extra"].append(annonceur)
+    if telephone:
+        details["extra"].append(telephone)
+    return details
+
+
+def bayt_texts():
+    """Detail text of the Bayt offers: the sections joined back in page order"""
+    return [
+        "\n".join(
+            [offer.get("intro", "")]
+            + [offer[key] for key in ("description", "competences") if offer.get(key)]
+        )
+        for offer in load_json("offres_emploi_bayt.json")
+    ]
+
+
+def marocannonces_texts():
+    """Detail text of the MarocAnnonces offers, laid out as the div.used-cars block of the page"""
+    texts = []
+    for n, offer in enumerate(load_json("offres_marocannonces.json")):
+        lines = [
+            offer["titre"],
+            offer["region"],
+            f"Publiée le: {offer.get('publication_date', '')}",
+            "Vue: 120 fois",
+            f"Annonce N°: {10128000 + n}",
+            offer.get("description", "Description de l'annonce"),
+            "Missions :",
+            "- Analyser les besoins des équipes métier",
+            "- Développer et maintenir les traitements",
+            "Profil requis :",
+            "- Bac+5 en informatique",
+        ]
+        lines += [
+            f"{label} : {offer[key]}"
+            for label, key in (
+                ("Domaine", "domaine"),
+                ("Fonction", "fonction"),
+                ("Contrat", "contrat"),
+                ("Salaire", "salaire"),
+                ("Ville", "ville"),
+            )
+            if key in offer
+        ]
+        extra = offer.get("extra")
+        if isinstance(extra, str):
+            lines += ["Annonceur :", extra]
+        texts.append("\n".join(lines))
+    return texts
+
+
+def measure(label, function, texts, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        results = function(texts)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<34} {len(texts) / best:>10.0f} texts/s")
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    mismatches = 0
+    for site, texts, legacy, current in (
+        (
+            "bayt",
+            bayt_texts(),
+            legacy_text_segmentation,
+            bayt.text_segmentation_many,
+        ),
+        (
+            "marocannonces",
+            marocannonces_texts(),
+            legacy_parse_details_text,
+            MarocAnn.parse_details_texts,
+        ),
+    ):
+        print(f"{site}: {len(texts)} texts")
+        expected = measure(
+            "  legacy", lambda t: [legacy(x) for x in t], texts, args.repeat
+        )
+        results = measure("  SectionParser (batch)", current, texts, args.repeat)
+        mismatches += sum(1 for a, b in zip(expected, results) if a != b)
+    if mismatches:
+        print(f"FAILED {mismatches} texts parsed differently")
+    sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
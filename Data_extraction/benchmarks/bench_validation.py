@@ -0,0 +1,70 @@
+"""Micro-benchmark of the job offer validation.
+
+Usage (from the project root):
+    python -m data_extraction.benchmarks.bench_validation [--repeat 5]
+"""
+
+import argparse
+import json
+import time
+
+from jsonschema import ValidationError, validate
+
+from data_extraction.Websites import (
+    SCHEMA_PATH,
+    load_json,
+    validate_json,
+    validate_many,
+)
+
+DATASETS = [
+    "offres_emploi_rekrute.json",
+    "offres_emploi_bayt.json",
+    "offres_emploi_emploi.json",
+    "offres_marocannonces.json",
+]
+
+
+def legacy_validate(data):
+    # Previous implementation: the schema is re-read and a validator rebuilt for every offer
+    with open(SCHEMA_PATH) as f:
+        schema = json.load(f)
+    try:
+        validate(data, schema)
+    except ValidationError as e:
+        return e
+
+
+def measure(label, function, offers, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function(offers)
+        best = min(best, time.perf_counter() - start)
+    print(f"{label:<28} {len(offers) / best:>12.0f} offers/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    offers = [offer for dataset in DATASETS for offer in load_json(dataset)]
+    print(f"{len(offers)} offers loaded")
+    measure(
+        "legacy validate",
+        lambda o: [legacy_validate(x) for x in o],
+        offers,
+        args.repeat,
+    )
+    measure(
+        "cached validate_json",
+        lambda o: [validate_json(x) for x in o],
+        offers,
+        args.repeat,
+    )
+    measure("validate_many", validate_many, offers, args.repeat)
+
+
+if __name__ == "__main__":
+    main()
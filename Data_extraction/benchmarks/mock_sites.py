@@ -0,0 +1,282 @@
+"""Local stand-in for the four job sites, serving the pages of benchmarks/fixtures.
+
+Usage (from the project root):
+    python -m data_extraction.benchmarks.mock_sites [--port 8765] [--pages 10] [--latency 0.05]
+
+The scrapers reach it with SCRAPER_ORIGIN=http://127.0.0.1:8765 (see http_fetch.ORIGIN):
+the requests keep the url of the site, the server answers according to the Host header.
+Each site has its own url and pagination structure:
+
+    www.rekrute.com         /fr/offres.html?s=1&p=N&o=1         listing, N from 1
+    www.emploi.ma           /recherche-jobs-maroc/<kw>?page=N   listing, N from 0
+    www.marocannonces.com   /maroc/offres-emploi-b309.html?kw=<kw>&pge=N, then
+                            /maroc/annonce/<id>/<slug>.html     detail
+    www.bayt.com            /en/morocco/jobs/<kw>-jobs/?page=N, then
+                            /en/morocco/jobs/<slug>-<id>/       detail
+
+A listing page is the fixture of the site with its offer ids shifted by page, so every
+page lists new offers. Pages past the last one list no offer. Every keyword is
+answered with the same catalogue. The faults are drawn per request: latency, 429
+answers with a Retry-After, and layout faults that rename the markup the parsers read.
+"""
+
+import argparse
+import os
+import random
+import re
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixtures")
+
+# Offer ids of the fixtures, shifted by PAGE_ID_STEP for each page
+OFFER_IDS = {
+    "rekrute": re.compile(r"(?<=-)18\d{4}(?=\.html)"),
+    "emploi": re.compile(r"\b82\d{5}\b"),
+    "marocannonces": re.compile(r"\b91\d{5}\b"),
+    "bayt": re.compile(r"\b51\d{5}\b"),
+}
+PAGE_ID_STEP = 1000
+
+# Markup renamed by a layout fault, the page then misses what its parser looks for
+LAYOUT_FAULTS = {
+    ("rekrute", "listing"): ("titreJob", "titre-job"),
+    ("emploi", "listing"): ("card-job", "card-offer"),
+    ("marocannonces", "listing"): ('class="holder"', 'class="holder-v2"'),
+    ("marocannonces", "detail"): ("used-cars", "used-cars-v2"),
+    ("bayt", "listing"): ("is-compact", "is-dense"),
+    ("bayt", "detail"): ('id="job_title"', 'id="job-title"'),
+}
+
+EMPTY_PAGE = "<html><head><title>Aucun résultat</title></head><body></body></html>"
+EMPLOI_PAGER = re.compile(r'<ul class="pager">.*?</ul>', re.DOTALL)
+
+# Pages of each host: (path, kind of page, query parameter of the page number, first page)
+ROUTES = {
+    "www.rekrute.com": [(re.compile(r"^/fr/offres\.html$"), "listing", "p", 1)],
+    "www.emploi.ma": [
+        (re.compile(r"^/recherche-jobs-maroc/[^/]+$"), "listing", "page", 0)
+    ],
+    "www.marocannonces.com": [
+        (re.compile(r"^/maroc/offres-emploi-b309\.html$"), "listing", "pge", 1),
+        (re.compile(r"^/maroc/annonce/\d+/[^/]+\.html$"), "detail", None, None),
+    ],
+    "www.bayt.com": [
+        (re.compile(r"^/en/morocco/jobs/[^/]+-jobs/$"), "listing", "page", 1),
+        (re.compile(r"^/en/morocco/jobs/[^/]+-\d+/$"), "detail", None, None),
+    ],
+}
+SITES = {
+    "www.rekrute.com": "rekrute",
+    "www.emploi.ma": "emploi",
+    "www.marocannonces.com": "marocannonces",
+    "www.bayt.com": "bayt",
+}
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding="utf-8") as f:
+        return f.read()
+
+
+class MockSites:
+    """Threaded HTTP server answering for the four sites, started in the background.
+
+    pages: number of listing pages of each search
+
+    latency: seconds added to every answer
+
+    jitter: mean of an exponential delay added on top of latency, for a long tail
+
+    throttle_rate: share of the requests answered 429 with a Retry-After of retry_after seconds
+
+    layout_fault_rate: share of the pages served with a layout fault (see LAYOUT_FAULTS)
+
+    seed: seed of the faults, the same seed draws the same faults for the same requests
+    """
+
+    def __init__(
+        self,
+        host="127.0.0.1",
+        port=0,
+        pages=10,
+        latency=0.0,
+        jitter=0.0,
+        throttle_rate=0.0,
+        retry_after=1,
+        layout_fault_rate=0.0,
+        seed=0,
+    ):
+        self.pages = pages
+        self.latency = latency
+        self.jitter = jitter
+        self.throttle_rate = throttle_rate
+        self.retry_after = retry_after
+        self.layout_fault_rate = layout_fault_rate
+        self.random = random.Random(seed)
+        self.counts = Counter()
+        self._lock = threading.Lock()
+        self.fixtures = {
+            (site, kind): load_fixture(f"{site}_{kind}_1.html")
+            for site, kind in LAYOUT_FAULTS
+            if os.path.exists(os.path.join(FIXTURES_DIR, f"{site}_{kind}_1.html"))
+        }
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def offers_per_page(self, site: str) -> int:
+        """Offers listed by one listing page of the site"""
+        return len(set(OFFER_IDS[site].findall(self.fixtures[site, "listing"])))
+
+    def draw(self):
+        """Delay, 429 and layout fault of a request"""
+        with self._lock:
+            delay = self.latency
+            if self.jitter:
+                delay += self.random.expovariate(1 / self.jitter)
+            return (
+                delay,
+                self.random.random() < self.throttle_rate,
+                self.random.random() < self.layout_fault_rate,
+            )
+
+    def count(self, *key):
+        with self._lock:
+            self.counts[key] += 1
+
+    def page(self, site: str, kind: str, number, fault: bool) -> str:
+        """Html of a page, None when the site has no such page"""
+        html = self.fixtures.get((site, kind))
+        if html is None:
+            return None
+        if kind == "listing":
+            first = 0 if site == "emploi" else 1
+            if not first <= number < first + self.pages:
+                return EMPTY_PAGE
+            offset = (number - first) * PAGE_ID_STEP
+            html = OFFER_IDS[site].sub(lambda m: str(int(m.group()) + offset), html)
+            if site == "emploi":
+                pager = "".join(
+                    f"<li class='pager-item active pagination-numbers'><a href='?page={n}'>{n + 1}</a></li>\n"
+                    for n in range(self.pages)
+                )
+                html = EMPLOI_PAGER.sub(
+                    lambda m: f'<ul class="pager">{pager}</ul>', html
+                )
+        if fault:
+            html = html.replace(*LAYOUT_FAULTS[site, kind])
+        return html
+
+    def _handler(self):
+        mock = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def do_GET(self):
+                host = self.headers.get("Host", "").split(":")[0].lower()
+                parts = urlsplit(self.path)
+                query = parse_qs(parts.query)
+                site = SITES.get(host)
+                for pattern, kind, param, default in ROUTES.get(host, []):
+                    if pattern.match(parts.path):
+                        break
+                else:
+                    mock.count(site, "missing", 404)
+                    return self.answer(404, "<html><body>Not found</body></html>")
+                delay, throttled, fault = mock.draw()
+                time.sleep(delay)
+                if throttled:
+                    mock.count(site, kind, 429)
+                    return self.answer(
+                        429,
+                        "<html><body>Too many requests</body></html>",
+                        {"Retry-After": str(mock.retry_after)},
+                    )
+                try:
+                    number = int(query[param][0]) if param else None
+                except (KeyError, ValueError):
+                    number = default
+                html = mock.page(site, kind, number, fault)
+                if html is None:
+                    mock.count(site, kind, 404)
+                    return self.answer(404, "<html><body>Not found</body></html>")
+                mock.count(site, kind, 200)
+                if fault:
+                    mock.count(site, kind, "layout fault")
+                self.answer(200, html)
+
+            def answer(self, status, html, headers=None):
+                body = html.encode("utf-8")
+                self.send_response(status)
+                self.send_header("Content-Type", "text/html; charset=utf-8")
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self.server.serve_forever, name="mock-sites", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--pages", type=int, default=10)
+    parser.add_argument("--latency", type=float, default=0.0)
+    parser.add_argument("--jitter", type=float, default=0.0)
+    parser.add_argument("--throttle-rate", type=float, default=0.0)
+    parser.add_argument("--layout-fault-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    mock = MockSites(
+        args.host,
+        args.port,
+        pages=args.pages,
+        latency=args.latency,
+        jitter=args.jitter,
+        throttle_rate=args.throttle_rate,
+        layout_fault_rate=args.layout_fault_rate,
+    )
+    print(f"Serving the mock job sites on {mock.url}, Ctrl+C to stop")
+    try:
+        mock.server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        mock.server.server_close()
+        for key, count in sorted(mock.counts.items(), key=str):
+            print(*key, count)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,46 @@
+"""run_site reports a site whose crawl failed, with a failing adapter and no network.
+
+Run from the project root: python -m pytest Data_extraction/tests
+"""
+
+import types
+
+import pytest
+
+from data_extraction.Traitement import main
+from data_extraction.Websites.crawler import SiteAdapter, crawl
+
+
+class FailingAdapter(SiteAdapter):
+    site = "failing"
+    dataset = "offres_emploi_failing.json"
+
+    def list_pages(self, fetcher, cursor, keyword):
+        raise RuntimeError("search form not found")
+
+
+@pytest.fixture
+def failing_site(tmp_path, monkeypatch):
+    """Site "failing" whose main crawls FailingAdapter into tmp_path"""
+    adapter = FailingAdapter()
+    adapter.output_directory = str(tmp_path)
+    module = types.SimpleNamespace(
+        main=lambda **options: crawl(adapter, fetch_mode="http", **options)
+    )
+    monkeypatch.setitem(main.SITE_MODULES, "failing", "failing")
+    monkeypatch.setattr(main.importlib, "import_module", lambda name: module)
+    return adapter
+
+
+def test_crawl_raises_the_error_of_the_adapter(failing_site):
+    with pytest.raises(RuntimeError, match="search form not found"):
+        crawl(failing_site, fetch_mode="http", keywords=["data"])
+
+
+def test_run_site_reports_the_failed_crawl(failing_site):
+    result = main.run_site("failing", keywords=["data"])
+
+    assert result.ok is False
+    assert result.error == "RuntimeError: search form not found"
+    assert result.offers == 0
+    assert result.health_report is None
@@ -3,3 +3,15 @@ result_backend = "redis://redis:6379/0"
 worker_send_task_events = True  # to use flower event monitoring
 events_logfile = "celery.log"
 events_pidfile = "celery.pid"
+
+# Pool of Chrome drivers kept by each worker process (see data_extraction.Websites.driver_pool)
+driver_pool_size = 1
+driver_max_pages = 200  # a driver is restarted after loading this many pages
+driver_max_rss_mb = 1500  # or when the browser uses more memory than this
+# Seconds a crawl worker waits for a driver of the pool before starting its own
+driver_lease_timeout = 10
+
+# Crawls split in subtasks (see tasks.discover_site): pages read by one subtask.
+# An incremental crawl reads the listing pages of a keyword in one subtask
+crawl_pages_per_task = 2  # listing pages of a full crawl
+crawl_details_per_task = 10  # offer pages
@@ -1,14 +1,382 @@
+"""Scraping tasks: the crawl of each site is split in subtasks shared by all the workers.
+
+    rekrute, bayt, emploi, Marocannonce   discovery: opens the searches of the site
+      read_pages x N                        listing pages
+        claim_offers                        chord callback: drops the offers already collected
+          read_offers x M                   detail pages, crawl_details_per_task per task
+            finish_crawl                    chord callback: watermark and selector report
+
+The discovery opens the site once: what its subtasks need (cookies of the browser, dates
+already collected) is passed to them in the cursor, see SiteAdapter.share. A subtask
+leases a driver of its worker only when one of its pages falls back to the browser.
+
+An incremental crawl reads the pages of each keyword in order in one task and stops
+once the offers already collected are reached (see EarlyStop), a full crawl spreads
+them crawl_pages_per_task per task. A site read until its first empty page
+(MarocAnnonces) cannot know its pages up front: its listing is read by the discovery
+task, only its detail pages are shared. The offers are saved by the task reading them,
+a task run again skips those already saved. The pages of a domain are spaced and
+capped by the shared rate limiter (Redis), whatever the number of workers and machines
+running them.
+
+The subtasks watch the selectors of the site (see health.SelectorHealth). A subtask
+tripping the breaker flags the crawl in the result backend: the other subtasks stop
+reading pages, no detail page is dispatched and finish_crawl logs the report.
+split=False runs the whole crawl of a site in one task.
+"""
+
+import datetime
+import itertools
+import json
+import uuid
+from contextlib import ExitStack, contextmanager
+
+from celery import chord
+from celery.signals import worker_process_init, worker_process_shutdown
+
 from celery_app import app
-from data_extraction.Websites import MarocAnn, Rekrute, bayt, emploi
+from data_extraction.Websites import (
+    MarocAnn,
+    Rekrute,
+    bayt,
+    check_duplicate,
+    emploi,
+    open_sink,
+    open_url_index,
+    validate_json,
+)
+from data_extraction.Websites.crawler import (
+    check_details,
+    check_listing,
+    get_adapter,
+    read_details,
+    read_listing_page,
+    site_keywords,
+)
+from data_extraction.Websites.driver_pool import DriverPool
+from data_extraction.Websites.health import SelectorHealth
+from data_extraction.Websites.http_fetch import PageFetcher
+from data_extraction.Websites.incremental import EarlyStop
+from data_extraction.Websites.url_index import normalize_url
+
+# Drivers of the current worker process, created when the process starts
+driver_pool = None
+
+
+@worker_process_init.connect
+def start_driver_pool(**kwargs):
+    global driver_pool
+    driver_pool = DriverPool(
+        size=app.conf.driver_pool_size,
+        max_pages=app.conf.driver_max_pages,
+        max_rss_mb=app.conf.driver_max_rss_mb,
+    )
+    try:
+        driver_pool.warm()
+    except Exception as e:
+        # The drivers will be started on the first lease instead
+        print(f"Impossible de préparer les drivers du worker: {e}")
+
+
+@worker_process_shutdown.connect
+def stop_driver_pool(**kwargs):
+    if driver_pool is not None:
+        driver_pool.close()
+
+
+def driver_lease(leases):
+    """Function leasing a driver of the worker to a PageFetcher, the drivers go back to
+    the pool when leases (an ExitStack) closes. Raises queue.Empty when none is free in
+    time, the fetcher then starts its own"""
+    return lambda: leases.enter_context(
+        driver_pool.lease(timeout=app.conf.driver_lease_timeout)
+    )
+
+
+@contextmanager
+def opened_site(site, cursor, health, discovery=False):
+    """Adapter of the site and its fetcher. The discovery opens the site, a subtask is
+    attached to the cursor of the discovery. A driver of the worker is leased once a page
+    needs the browser, the waits of the pages are recorded in health"""
+    adapter = get_adapter(site)()
+    if adapter.wait_stats is not None:
+        adapter.wait_stats.reset()
+        adapter.wait_stats.health = health
+    with ExitStack() as leases:
+        fetcher = PageFetcher(site, lease_driver=driver_lease(leases))
+        try:
+            if discovery:
+                adapter.open(fetcher, cursor)
+            else:
+                adapter.attach(cursor)
+            yield adapter, fetcher
+        finally:
+            adapter.close()
+            fetcher.close()
+            if adapter.wait_stats is not None:
+                adapter.wait_stats.health = None
+                adapter.wait_stats.log_report(adapter.logger)
+            fetcher.log_report(adapter.logger)
+
+
+def breaker_key(cursor):
+    return f"selector-breaker-{cursor['crawl']}"
+
+
+def trip_crawl(cursor, report):
+    """Flags the crawl of the cursor as aborted by its selector breaker, for all its
+    subtasks. The flag is kept in the result backend until finish_crawl"""
+    app.backend.set(breaker_key(cursor), json.dumps(report))
+
+
+def crawl_tripped(cursor) -> bool:
+    return app.backend.get(breaker_key(cursor)) is not None
+
+
+def chunks(items, size):
+    return [items[i : i + size] for i in range(0, len(items), max(1, size))]
+
+
+def read_search(adapter, fetcher, health, cursor, keyword, pages, full_crawl):
+    """Cards of the listing pages of a keyword read in order, stopped at the offers already
+    collected unless full_crawl (see EarlyStop) and once the selector breaker of the crawl
+    trips. A page that cannot be read is skipped.
+
+    pages: pages of the search, None to read from first_page until an empty page
+    """
+    url_index = open_url_index(adapter.site, adapter.dataset, adapter.output_directory)
+    early_stop = EarlyStop(url_index, enabled=not full_crawl)
+    cards = []
+    try:
+        for page in itertools.count(adapter.first_page) if pages is None else pages:
+            if early_stop.stopped or health.tripped or crawl_tripped(cursor):
+                break
+            try:
+                found = read_listing_page(adapter, fetcher, keyword, page)
+            except Exception as e:
+                print(f"{adapter.site}: page {page} de {keyword!r} non lue: {e}")
+                found = None
+            if found is None and pages is None:
+                break
+            if found is None:
+                continue
+            check_listing(adapter, health, keyword, page, found)
+            if not found and pages is None:
+                break
+            early_stop.observe(found)
+            cards += found
+    finally:
+        url_index.close()
+    if health.tripped:
+        trip_crawl(cursor, health.report())
+    return cards
+
+
+def listing_result(cards, health):
+    """Result of a listing task, merged by claim_offers"""
+    return {"cards": cards, "health": health.report()}
+
+
+def discover_site(site, full_crawl=False, keywords=None):
+    """Opens the searches of the site and dispatches its pages to the subtasks.
+    Returns the id of the task merging the listing pages"""
+    keywords = list(dict.fromkeys(keywords or site_keywords(site)))
+    cursor = {"crawl": uuid.uuid4().hex}
+    health = SelectorHealth(site)
+    with opened_site(site, cursor, health, discovery=True) as (adapter, fetcher):
+        if adapter.pagination != "listed":
+            cards = []
+            for keyword in keywords:
+                cards += read_search(
+                    adapter, fetcher, health, cursor, keyword, None, full_crawl
+                )
+            adapter.share(cursor)
+            print(f"{site}: {len(cards)} offres listées")
+            return claim_offers.delay([listing_result(cards, health)], site, cursor).id
+        searches = [
+            (keyword, adapter.list_pages(fetcher, cursor, keyword))
+            for keyword in keywords
+        ]
+        adapter.share(cursor)
+    print(
+        f"{site}: {sum(len(pages) for _, pages in searches)} pages de résultats à lire"
+    )
+    if full_crawl:
+        size = app.conf.crawl_pages_per_task
+        header = [
+            read_pages.s(site, cursor, keyword, chunk, full_crawl)
+            for keyword, pages in searches
+            for chunk in chunks(pages, size)
+        ]
+    else:
+        # The pages of a keyword are read in order, to stop at the offers already collected
+        header = [
+            read_pages.s(site, cursor, keyword, pages, full_crawl)
+            for keyword, pages in searches
+            if pages
+        ]
+    if not header or health.tripped:
+        # Nothing to read, or the searches already tripped the selector breaker
+        return claim_offers.delay([listing_result([], health)], site, cursor).id
+    return chord(header)(claim_offers.s(site, cursor)).id
+
+
+@app.task(name="read_pages", acks_late=True, reject_on_worker_lost=True)
+def read_pages(site, cursor, keyword, pages, full_crawl=False):
+    """Cards of listing pages of a search of the site and the report of their selectors.
+    The chord always gets the result of the task, pages that cannot be read are skipped"""
+    health = SelectorHealth(site)
+    with opened_site(site, cursor, health) as (adapter, fetcher):
+        cards = read_search(
+            adapter, fetcher, health, cursor, keyword, pages, full_crawl
+        )
+    return listing_result(cards, health)
+
+
+def store_offers(adapter, offers) -> int:
+    """Appends the offers to the dataset of the site and to its url index, returns the
+    number of new ones. An url is committed to the index once its offer is on disk"""
+    url_index = open_url_index(adapter.site, adapter.dataset, adapter.output_directory)
+    sink = open_sink(
+        adapter.dataset,
+        output_directory=adapter.output_directory,
+        on_flush=lambda saved: url_index.commit(offer["job_url"] for offer in saved),
+    )
+    stored = 0
+    try:
+        for offer in offers:
+            # Schema errors are logged, the offers are kept as they always were
+            validate_json(offer)
+            if url_index.add(offer["job_url"]):
+                sink.write(offer)
+                stored += 1
+    finally:
+        sink.close()
+        url_index.close()
+    return stored
+
+
+@app.task(name="claim_offers")
+def claim_offers(results, site, cursor):
+    """Merges the cards of the listing tasks, keeps the offers neither collected yet nor
+    listed twice. Their detail pages are dispatched to read_offers tasks, the offers of a
+    site without detail pages are saved at once. No detail page is dispatched once the
+    selector breaker of the crawl tripped"""
+    adapter = get_adapter(site)()
+    health = SelectorHealth(site)
+    for result in results:
+        health.merge(result["health"])
+    if health.tripped:
+        trip_crawl(cursor, health.report())
+    url_index = open_url_index(site, adapter.dataset, adapter.output_directory)
+    # Newest publication date listed, the watermark of the site once the offers are saved
+    early_stop = EarlyStop(url_index, enabled=False)
+    seen, cards = set(), []
+    try:
+        for result in results:
+            early_stop.observe(result["cards"])
+            for card in result["cards"]:
+                url = card.get("job_url")
+                if (
+                    url
+                    and normalize_url(url) not in seen
+                    and not check_duplicate(url_index, url)
+                ):
+                    seen.add(normalize_url(url))
+                    cards.append(card)
+    finally:
+        url_index.close()
+    print(f"{site}: {len(cards)} nouvelles offres")
+    if early_stop.newest:
+        cursor = {**cursor, "newest": early_stop.newest.isoformat()}
+    listing = {"offers": 0, "health": health.report()}
+    if not adapter.has_details:
+        listing["offers"] = store_offers(adapter, map(adapter.build_offer, cards))
+        return finish_crawl([], site, cursor, listing)
+    if not cards or crawl_tripped(cursor):
+        return finish_crawl([], site, cursor, listing)
+    header = [
+        read_offers.s(site, cursor, chunk)
+        for chunk in chunks(cards, app.conf.crawl_details_per_task)
+    ]
+    return chord(header)(finish_crawl.s(site, cursor, listing)).id
+
+
+@app.task(name="read_offers", acks_late=True, reject_on_worker_lost=True)
+def read_offers(site, cursor, cards):
+    """Completes the offers of the cards with their detail page and saves those the site
+    accepts. An offer whose page could not be read is left to the next crawl. A task run
+    again after its worker died skips the offers already saved"""
+    health = SelectorHealth(site)
+    offers = []
+    with opened_site(site, cursor, health) as (adapter, fetcher):
+        url_index = open_url_index(site, adapter.dataset, adapter.output_directory)
+        try:
+            pending = [card for card in cards if card["job_url"] not in url_index]
+        finally:
+            url_index.close()
+        for card in pending:
+            if health.tripped or crawl_tripped(cursor):
+                break
+            try:
+                details = read_details(adapter, fetcher, card)
+            except Exception as e:
+                print(f"{site}: détails non lus pour {card['job_url']}: {e}")
+                details = None
+            check_details(adapter, health, card, details)
+            if details is None:
+                # Not stored, its url stays out of the index: the next crawl claims it again
+                continue
+            offer = {**card, **details}
+            if adapter.accept(offer):
+                offers.append(offer)
+        stored = store_offers(adapter, offers)
+    if health.tripped:
+        trip_crawl(cursor, health.report())
+    return {"offers": stored, "health": health.report()}
+
+
+@app.task(name="finish_crawl")
+def finish_crawl(results, site, cursor, listing):
+    """Last callback of the crawl of a site: counts the saved offers, moves the watermark
+    of the site (see EarlyStop.save) and logs the report of a tripped selector breaker
+
+    listing: result of claim_offers, the offers it saved and the selectors of the listing
+    """
+    adapter = get_adapter(site)()
+    health = SelectorHealth(site)
+    results = [listing, *results]
+    for result in results:
+        health.merge(result["health"])
+    saved = sum(result["offers"] for result in results)
+    url_index = open_url_index(site, adapter.dataset, adapter.output_directory)
+    try:
+        early_stop = EarlyStop(url_index, enabled=False)
+        if cursor.get("newest"):
+            early_stop.newest = datetime.date.fromisoformat(cursor["newest"])
+        early_stop.save()
+    finally:
+        url_index.close()
+    app.backend.delete(breaker_key(cursor))
+    health.log_report(adapter.logger)
+    print(f"{site}: {saved} offres enregistrées")
+    return {"site": site, "offers": saved, "tripped_by": health.tripped_by}
 
 
 @app.task(
     name="rekrute",
 )
-def rekrute_task():
+def rekrute_task(full_crawl=False, split=True):
     try:
         print("Appel du script rekrute")
-        return Rekrute.main()
+        if split:
+            return discover_site("rekrute", full_crawl)
+        with ExitStack() as leases:
+            return Rekrute.main(
+                incremental=not full_crawl,
+                resume=True,
+                lease_driver=driver_lease(leases),
+            )
     except Exception as e:
         print(f"Exception lors de l'execution du script rekrute: {e} ")
 
@@ -16,10 +384,17 @@ def rekrute_task():
 @app.task(
     name="bayt",
 )
-def bayt_task():
+def bayt_task(full_crawl=False, split=True):
     try:
         print("Appel du script bayt")
-        return bayt.main()
+        if split:
+            return discover_site("bayt", full_crawl)
+        with ExitStack() as leases:
+            return bayt.main(
+                incremental=not full_crawl,
+                resume=True,
+                lease_driver=driver_lease(leases),
+            )
     except Exception as e:
         print(f"Exception lors de l'execution du script bayt: {e} ")
 
@@ -27,10 +402,17 @@ def bayt_task():
 @app.task(
     name="Marocannonce",
 )
-def marocann_task():
+def marocann_task(full_crawl=False, split=True):
     try:
         print("Appel du script maroc annonces")
-        return MarocAnn.main()
+        if split:
+            return discover_site("marocannonces", full_crawl)
+        with ExitStack() as leases:
+            return MarocAnn.main(
+                incremental=not full_crawl,
+                resume=True,
+                lease_driver=driver_lease(leases),
+            )
     except Exception as e:
         print(f"Exception lors de l'execution du script emploi marocann: {e} ")
 
@@ -38,9 +420,16 @@ def marocann_task():
 @app.task(
     name="emploi",
 )
-def emploi_task():
+def emploi_task(full_crawl=False, split=True):
     try:
         print("Appel du script emploi")
-        return emploi.main()
+        if split:
+            return discover_site("emploi", full_crawl)
+        with ExitStack() as leases:
+            return emploi.main(
+                incremental=not full_crawl,
+                resume=True,
+                lease_driver=driver_lease(leases),
+            )
     except Exception as e:
         print(f"Exception lors de l'execution du script emploi: {e} ")
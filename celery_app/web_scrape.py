@@ -1,6 +1,20 @@
+import argparse
+
 from celery_app.tasks import bayt_task, emploi_task, marocann_task, rekrute_task
 
-rekrute_task.delay()
-bayt_task.delay()
-emploi_task.delay()
-marocann_task.delay()
+parser = argparse.ArgumentParser(description="Lance le scraping des sites d'emploi")
+# Par défaut les scrapers s'arrêtent aux offres déjà collectées, un parcours complet
+# de temps en temps permet de rattraper les offres manquées
+parser.add_argument(
+    "--full", action="store_true", help="parcourt toutes les pages de résultats"
+)
+# Par défaut le parcours d'un site est partagé entre les workers (voir tasks.discover_site)
+parser.add_argument(
+    "--no-split",
+    action="store_true",
+    help="chaque site est parcouru en entier par une seule tâche",
+)
+args = parser.parse_args()
+
+for task in (rekrute_task, bayt_task, emploi_task, marocann_task):
+    task.delay(full_crawl=args.full, split=not args.no_split)
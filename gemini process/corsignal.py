@@ -9,9 +9,8 @@ import os
 import json
 import time
 import logging
-import re
 import unicodedata
-from datetime import datetime, timedelta
+from datetime import datetime
 from logging.handlers import RotatingFileHandler
 
 import pandas as pd
@@ -20,6 +19,10 @@ import google.generativeai as genai
 from google.generativeai import types
 import argparse
 
+# Makes the scraping package importable when the script is run from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_extraction.Websites.dates import normalize_dates
+
 # --- UTF-8 console output for Windows
 if sys.platform == "win32":
     sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
@@ -63,16 +66,10 @@ logger.info(f"Gemini API configured. Model: {MODEL}")
 client = genai.GenerativeModel(MODEL)
 
 # --- Normalization Helpers
-MONTHS_FR = {
-    'janvier':1,'février':2,'mars':3,'avril':4,'mai':5,'juin':6,
-    'juillet':7,'août':8,'septembre':9,'octobre':10,'novembre':11,'décembre':12
-}
 MONTHS_EN = {
     'january':1,'february':2,'march':3,'april':4,'may':5,'june':6,
     'july':7,'august':8,'september':9,'october':10,'november':11,'december':12
 }
-MONTHS = {**MONTHS_FR, **MONTHS_EN}
-MONTHS.update({k[:3]:v for k,v in MONTHS.items()})
 
 def normalize_text(s):
     """
@@ -84,53 +81,6 @@ def normalize_text(s):
     return unicodedata.normalize('NFKC', n).lower().strip()
 
 
-def normalize_date(s):
-    """
-    Normalize various date formats to YYYY-MM-DD.
-    Handles 'today', 'yesterday', 'X days/weeks/months ago',
-    timestamps 'YYYY-MM-DD HH:MM:SS', and common formats.
-    """
-    if not s or not isinstance(s, str):
-        return None
-    key = s.strip().lower()
-    today = datetime.now()
-    # relative
-    if 'today' in key or 'aujourd' in key:
-        return today.strftime('%Y-%m-%d')
-    if 'yesterday' in key or 'hier' in key:
-        return (today - timedelta(days=1)).strftime('%Y-%m-%d')
-    m = re.search(r"(\d+)\s+(day|days|jour|jours|week|weeks|semaine|semaines|month|months|mois)\s+ago", key)
-    if m:
-        num,unit = int(m.group(1)), m.group(2)
-        if 'day' in unit or 'jour' in unit:
-            return (today - timedelta(days=num)).strftime('%Y-%m-%d')
-        if 'week' in unit or 'semaine' in unit:
-            return (today - timedelta(weeks=num)).strftime('%Y-%m-%d')
-        return (today - timedelta(days=30*num)).strftime('%Y-%m-%d')
-    # fixed formats
-    formats = [
-        '%Y-%m-%d %H:%M:%S', '%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y',
-        '%Y/%m/%d', '%b %d, %Y', '%B %d, %Y', '%d %b %Y', '%d %B %Y'
-    ]
-    for fmt in formats:
-        try:
-            return datetime.strptime(s, fmt).strftime('%Y-%m-%d')
-        except ValueError:
-            continue
-    # day + month name
-    m2 = re.match(r"(\d{1,2})\s+([A-Za-z]+)", s)
-    if m2:
-        d = int(m2.group(1))
-        mn = m2.group(2).lower()
-        if mn in MONTHS:
-            try:
-                return datetime(today.year, MONTHS[mn], d).strftime('%Y-%m-%d')
-            except ValueError:
-                pass
-    logger.warning(f"Could not parse date: {s}")
-    return None
-
-
 def parse_location(s):
     """
     Parse location string into city, region, country, remote.
@@ -176,15 +126,20 @@ def load_sorsignal_input(path):
                     items.append(json.loads(line))
                 except json.JSONDecodeError:
                     logger.warning(f"Invalid JSON line: {line}")
+    # Relative dates ("3 days ago") count from the collect date of each item, now when missing
+    publication_dates = normalize_dates(
+        pd.Series([it.get('created') or it.get('time_posted') for it in items]),
+        pd.Series([it.get('collect_date') for it in items]),
+    )
     mapped = []
-    for it in items:
+    for it, publication_date in zip(items, publication_dates):
         mapped.append({
             'job_url': it.get('url'),
             'titre': normalize_text(it.get('title')),
             'via': None,
             'contrat': normalize_text(it.get('employment_type')),
             'type_travail': None,
-            'publication_date': normalize_date(it.get('created') or it.get('time_posted')),
+            'publication_date': publication_date,
             'location': parse_location(it.get('location')),
             'description': normalize_text(it.get('description')),
             'company_name': normalize_text(it.get('company_name'))
@@ -1,5 +1,5 @@
 import sys, io, os, json, time, logging, re, unicodedata
-from datetime import datetime, timedelta
+from datetime import datetime
 from logging.handlers import RotatingFileHandler
 import pandas as pd
 from dotenv import load_dotenv
@@ -7,6 +7,11 @@ import google.generativeai as genai
 from google.generativeai import types # Still needed for types.GenerationConfig
 import argparse
 
+# Makes the scraping package importable when the script is run from this folder
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_extraction.Websites.dates import normalize_date, normalize_dates
+from data_extraction.Websites.storage import read_dataset, segments_dir
+
 # --- UTF-8 console output for Windows
 if sys.platform == "win32":
     # Ensure stdout handles UTF-8 characters correctly on Windows
@@ -51,19 +56,6 @@ def load_api_key_and_model():
 client = load_api_key_and_model()
 
 # --- Helper Functions for Data Normalization and Parsing
-MONTHS_FR = {
-    'janvier': 1, 'février': 2, 'mars': 3, 'avril': 4, 'mai': 5, 'juin': 6,
-    'juillet': 7, 'août': 8, 'septembre': 9, 'octobre': 10, 'novembre': 11, 'décembre': 12
-}
-MONTHS_EN = {
-    'january': 1, 'february': 2, 'march': 3, 'april': 4, 'may': 5, 'june': 6,
-    'july': 7, 'august': 8, 'september': 9, 'october': 10, 'november': 11, 'december': 12
-}
-MONTHS = {**MONTHS_FR, **MONTHS_EN}
-# Add abbreviated month names (e.g., 'jan' for 'janvier')
-MONTHS.update({k[:3]:v for k,v in MONTHS.items()})
-
-
 def normalize_text(s: str | None) -> str:
     """
     Normalizes a string by removing accents, converting to ASCII,
@@ -79,61 +71,6 @@ def normalize_text(s: str | None) -> str:
     return unicodedata.normalize('NFKC', n).lower().strip()
 
 
-def normalize_date(s: str | None) -> str | None:
-    """
-    Normalizes a date string to YYYY-MM-DD format. Handles various formats
-    and relative dates (today, yesterday, X days/weeks/months ago).
-    Returns None if the date cannot be parsed into a valid format.
-    """
-    if not s or not isinstance(s, str):
-        return None
-
-    key = s.strip().lower()
-    today = datetime.now()
-
-    # Handle relative dates
-    if 'aujourd' in key or 'today' in key:
-        return today.strftime('%Y-%m-%d')
-    if 'hier' in key or 'yesterday' in key:
-        return (today - timedelta(days=1)).strftime('%Y-%m-%d')
-
-    # Handle "X days/weeks/months ago" patterns
-    match_relative = re.search(r'(\d+)\s+(jour|jours|day|days|semaine|semaines|week|weeks|mois|month|months)\s+ago', key)
-    if match_relative:
-        num = int(match_relative.group(1))
-        unit = match_relative.group(2)
-        if 'jour' in unit or 'day' in unit:
-            return (today - timedelta(days=num)).strftime('%Y-%m-%d')
-        elif 'semaine' in unit or 'week' in unit:
-            return (today - timedelta(weeks=num)).strftime('%Y-%m-%d')
-        elif 'mois' in unit or 'month' in unit:
-            # Approximate months to 30 days for simplicity in date arithmetic
-            return (today - timedelta(days=num * 30)).strftime('%Y-%m-%d')
-
-    # Try common date formats
-    formats = ['%Y-%m-%d', '%d-%m-%Y', '%d/%m/%Y', '%Y/%m/%d', '%b %d, %Y', '%B %d, %Y', '%d %b %Y', '%d %B %Y']
-    for fmt in formats:
-        try:
-            return datetime.strptime(s, fmt).strftime('%Y-%m-%d')
-        except ValueError:
-            pass
-
-    # Handle "DD MonthName-HH:MM" (e.g., '12 May-16:35'), assuming current year
-    match_month_time = re.match(r"(\d{1,2})\s+([A-Za-z]+)(-\d{1,2}:\d{2})?", s)
-    if match_month_time:
-        day = int(match_month_time.group(1))
-        month_name = match_month_time.group(2).lower()
-        month_num = MONTHS.get(month_name)
-        if month_num:
-            try:
-                return datetime(today.year, month_num, day).strftime('%Y-%m-%d')
-            except ValueError: # e.g. 31 February is invalid
-                pass
-
-    logger.warning(f"Could not parse date string: '{s}'. Returning None.")
-    return None
-
-
 def parse_location(s: str | None) -> dict:
     """
     Parses a location string into a structured dictionary {city, region, country, remote}.
@@ -484,7 +421,7 @@ def post_process_gemini_output(parsed_results: list[dict], original_batch_size:
             item['salary_range'] = None # Default to None if salary data is missing or malformed
 
         # 12. publication_date (string: YYYY-MM-DD)
-        item['publication_date'] = normalize_date(item.get('publication_date'))
+        item['publication_date'] = normalize_date(item.get('publication_date'), item.get('collect_date'))
 
         processed_data.append(item) # Add the cleaned and processed item to the list
     
@@ -556,11 +493,11 @@ def main() -> None:
     5. Collects all "data profile" offers and saves them to an Excel file upon completion.
     """
     parser = argparse.ArgumentParser(description='Process job offers using Gemini API.')
-    parser.add_argument('input_file', type=str, help='Path to the input JSON file containing job offers.')
+    parser.add_argument('input_file', type=str, help='Path to the input JSON file (or scraping_output dataset) containing job offers.')
     args = parser.parse_args()
 
     input_file_path = args.input_file
-    if not os.path.exists(input_file_path):
+    if not (os.path.exists(input_file_path) or os.path.isdir(segments_dir(input_file_path))):
         logger.critical(f"Input file not found: {input_file_path}")
         sys.exit(1)
 
@@ -569,8 +506,8 @@ def main() -> None:
 
     # Load raw offers from the input JSON file
     try:
-        with open(input_file_path, "r", encoding="utf-8") as f:
-            raw_offers = json.load(f)
+        # The scrapers append ndjson segments next to the json file, read them as one dataset
+        raw_offers = list(read_dataset(input_file_path))
         logger.info(f"Loaded {len(raw_offers)} offers from {input_file_path}")
     except json.JSONDecodeError as e:
         logger.critical(f"Error decoding JSON from {input_file_path}: {e}")
@@ -579,13 +516,19 @@ def main() -> None:
         logger.critical(f"Error reading file {input_file_path}: {e}")
         sys.exit(1)
 
+    # Publication dates of all the offers at once, relative dates count from the collect date of each offer
+    publication_dates = normalize_dates(
+        pd.Series([offer.get('publication_date') for offer in raw_offers]),
+        pd.Series([offer.get('collect_date') for offer in raw_offers]),
+    )
+
     # Validate and pre-process all offers once before sending to Gemini
     validated_and_preprocessed_offers = []
     for i, offer in enumerate(raw_offers):
         original_offer_copy = offer.copy() # Keep a copy for debugging if preprocessing fails
         try:
             # Apply initial normalization and parsing for some fields
-            offer['publication_date'] = normalize_date(offer.get('publication_date'))
+            offer['publication_date'] = publication_dates[i]
             
             # Replace 'lieu' field with a structured 'location' object
             offer['location'] = parse_location(offer.pop('lieu', None))
@@ -52,7 +52,7 @@ Exemple de sortie (mode démo) :
 ]
 """
 import sys, io, os, json, time, logging, re, unicodedata
-from datetime import datetime, timedelta
+from datetime import datetime
 from logging.handlers import RotatingFileHandler
 from jsonschema import validate, ValidationError
 import pandas as pd
@@ -62,6 +62,10 @@ from google.genai import types
 from geopy.geocoders import Nominatim
 from concurrent.futures import ThreadPoolExecutor, TimeoutError
 
+# Package du scraping importable depuis ce dossier
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from data_extraction.Websites import dates
+
 # UTF-8 console sous Windows
 sys.stdout = io.TextIOWrapper(sys.stdout.buffer, encoding="utf-8", errors="replace")
 
@@ -122,10 +126,6 @@ SYSTEM_PROMPT = (
 )
 
 # Helpers
-MONTHS = {m.lower():i for i,m in enumerate(
-    ['January','February','March','April','May','June','July','August','September','October','November','December'],1)}
-MONTHS.update({k[:3]:v for k,v in MONTHS.items()})
-
 CONTRAT_MAP = {'cdi':'CDI','c.d.i':'CDI','cdd':'CDD','stage':'Stage','freelance':'Freelance'}
 WORKMODE_MAP = {'on-site':'on-site','onsite':'on-site','remote':'remote','hybrid':'hybrid'}
 
@@ -139,21 +139,10 @@ def normalize_job_title(t):
     s = re.sub(r'(développeur|engineer)', 'developer', s)
     return s
 
-def normalize_date(s):
-    if not s or not isinstance(s,str): raise ValueError(f"Invalid date: {s}")
-    key=s.strip().lower(); today=datetime.now()
-    if key in('today','aujourd"hui'): return today.strftime('%Y-%m-%d')
-    if key in('yesterday','hier'):    return (today-timedelta(days=1)).strftime('%Y-%m-%d')
-    try: return datetime.fromisoformat(s).strftime('%Y-%m-%d')
-    except: pass
-    for fmt in ('%d-%m-%Y','%d/%m/%Y'):
-        try: return datetime.strptime(s,fmt).strftime('%Y-%m-%d')
-        except: pass
-    m=re.match(r"(\d{1,2})\s+([A-Za-z]+)-(\d{1,2}:\d{2})",s)
-    if m:
-        d,mon=int(m.group(1)),m.group(2).lower(); mo=MONTHS.get(mon)
-        if mo: return datetime(today.year,mo,d).strftime('%Y-%m-%d')
-    raise ValueError(f"Invalid date format: {s}")
+def normalize_date(s, collect_date=None):
+    d=dates.normalize_date(s, collect_date)
+    if d is None: raise ValueError(f"Invalid date format: {s}")
+    return d
 
 # Geolocation
 geolocator = Nominatim(user_agent="process_gemini")
@@ -240,13 +229,13 @@ def call_gemini(batch):
 def process_offers(path):
     raw=json.load(open(path,encoding='utf-8'))
     # Deduplicate
-    seen={json.dumps(o,sort_keys=True):o for o in raw}
+    seen={json.dumps({k:v for k,v in o.items() if k!='collect_date'},sort_keys=True):o for o in raw}
     raw=list(seen.values())
     valid, errors = [], []
     for o in raw:
         try:
             o['titre']=normalize_job_title(o.get('titre'))
-            o['publication_date']=normalize_date(o.get('publication_date'))
+            o['publication_date']=normalize_date(o.get('publication_date'), o.get('collect_date'))
             o['location']=parse_location(o.get('lieu'))
             o['contrat']=CONTRAT_MAP.get(normalize_text(o.get('contrat')))
             o['type_travail']=WORKMODE_MAP.get(normalize_text(o.get('type_travail')))